@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
-from api.v1.endpoints import agent_190_twilio
+from api.v1.endpoints import agent_190_twilio, history
 
 api_router = APIRouter()
 api_router.include_router(agent_190_twilio.router, prefix='/agent_twilio_190', tags=['Agent Twilio 190'])
+api_router.include_router(history.router, prefix='/history', tags=['History'])
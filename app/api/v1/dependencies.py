@@ -1,16 +1,38 @@
-from fastapi import Depends
+import asyncio
+import logging
+import secrets
+from typing import Optional
+
+import redis.asyncio as redis
+from fastapi import Depends, Header, HTTPException, status
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from dotenv import load_dotenv
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 
-from crud.agents.agent190_modeling import Agent190, RedisSessionManager
+from crud.adapters.admission import AdmissionController
+from crud.adapters.routing_adapter import RoutingLLMAdapter
+from crud.agents.agent190_modeling import Agent190, RedisSessionManager, create_redis_pool
 from crud.features.audio_transcript import CloudUploader
 from crud.features.gemini_vision import GeminiVision
+from crud.features.history_bq import BigQueryStorage
+from crud.features.history_reader import HistoryReader
+from crud.features.history_spool import HistorySpool
+from crud.features.history_writer import HistoryWriter
+from crud.features.transcription import Transcriber, create_transcriber
+from crud.managers.history_manager import HistoryShaper
 from crud.managers.llm_manager import LLMManager
-from crud.tools.tools import Tools
+from crud.managers.session_cache import SessionHistoryCache
+from crud.managers.session_lock import RedisSessionLock
+from crud.tools.get_person_data import lupa_client
+from crud.tools.tools import Tools, parse_timeouts
+from utils.prompts import PROMPT_190
+from utils.timing import configure_tracing, shutdown_tracing
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class Settings(BaseSettings):
     project_id: str
@@ -39,6 +61,75 @@ class Settings(BaseSettings):
     redis_ssl: bool = True
     redis_key_prefix: str = 'session_history:'
     redis_expiry_seconds: int = 86400
+    redis_history_fetch_limit: int = 100
+    redis_compress_threshold_bytes: int = 1024
+    history_token_budget: int = 3000
+    history_min_recent_messages: int = 4
+    session_lock_enabled: bool = True
+    session_lock_lease_seconds: float = 120
+    session_lock_wait_timeout_seconds: float = 60
+    session_lock_grace_seconds: float = 5
+    session_cache_enabled: bool = True
+    session_cache_max_entries: int = 1024
+    session_cache_max_bytes: int = 64 * 1024 * 1024
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 5.0
+    redis_socket_timeout: float = 5.0
+    redis_socket_connect_timeout: float = 5.0
+    redis_health_check_interval: int = 30
+    twilio_early_ack: bool = False
+    speculative_cpf_lookup_enabled: bool = True
+    warmup_on_startup: bool = True
+    llm_providers: str = 'openai:gpt-4o'
+    llm_attempt_timeout_seconds: float = 60
+    llm_hedge_enabled: bool = False
+    llm_hedge_min_samples: int = 20
+    llm_stats_window: int = 100
+    llm_error_rate_threshold: float = 0.5
+    llm_degraded_cooldown_seconds: float = 30
+    llm_max_concurrency: int = 16
+    llm_max_queue: int = 64
+    llm_deadline_seconds: float = 45
+    llm_max_retries: int = 3
+    llm_retry_base_seconds: float = 0.5
+    llm_retry_max_seconds: float = 8
+    tool_timeout_seconds: float = 15
+    tool_timeouts: str = ''
+    twilio_webhook_deadline_seconds: float = 12
+    background_deadline_seconds: float = 60
+    deadline_agent_reserve_seconds: float = 6
+    deadline_min_stage_seconds: float = 1
+    history_dataset_id: str = 'history'
+    history_table_id: str = 'chats'
+    history_table_migrate_on_startup: bool = True
+    history_bq_backend: str = 'write_api'
+    history_append_timeout_seconds: float = 30
+    history_buffer_max_rows: int = 10000
+    history_batch_size: int = 500
+    history_flush_interval_seconds: float = 2.0
+    history_overflow_policy: str = 'drop_oldest'
+    history_drain_timeout_seconds: float = 10
+    history_spool_enabled: bool = True
+    history_spool_dir: str = '/var/tmp/history_spool'
+    history_spool_max_bytes: int = 512 * 1024 * 1024
+    history_spool_segment_bytes: int = 8 * 1024 * 1024
+    history_spool_sync_interval_seconds: float = 1.0
+    history_spool_replay_interval_seconds: float = 10
+    history_api_key: str = ''
+    history_read_cache_ttl_seconds: float = 30
+    history_read_cache_max_entries: int = 256
+    history_query_timeout_seconds: float = 30
+    transcription_backend: str = 'google_web'
+    transcription_language: str = 'pt-BR'
+    transcription_whisper_model: str = 'small'
+    transcription_whisper_compute_type: str = 'int8'
+    transcription_whisper_cpu_threads: int = 0
+    transcription_whisper_workers: int = 1
+    transcription_whisper_beam_size: int = 1
+    transcription_whisper_vad_filter: bool = True
+    transcription_whisper_model_dir: str = ''
+    otel_traces_endpoint: str = ''
+    otel_service_name: str = 'chatbot-190'
 
     model_config = SettingsConfigDict(
         env_file='.env',
@@ -49,75 +140,456 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
+class ClientRegistry:
+    """
+    Mantém os clientes de longa duração da aplicação, criados uma única vez por processo.
+
+    Cada cliente é criado na primeira vez em que é pedido e compartilhado por todas as requisições.
+    `startup` pode aquecer as conexões antes de a aplicação começar a receber tráfego, e `shutdown`
+    encerra o que foi aberto.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._redis_pool: Optional[redis.BlockingConnectionPool] = None
+        self._twilio_client: Optional[Client] = None
+        self._tools: Optional[Tools] = None
+        self._llm_adapter = None
+        self._history_shaper: Optional[HistoryShaper] = None
+        self._cloud_uploader: Optional[CloudUploader] = None
+        self._bq_storage: Optional[BigQueryStorage] = None
+        self._history_writer: Optional[HistoryWriter] = None
+        self._history_reader: Optional[HistoryReader] = None
+        self._gemini_vision: Optional[GeminiVision] = None
+        self._transcriber: Optional[Transcriber] = None
+        self.session_cache: Optional[SessionHistoryCache] = (
+            SessionHistoryCache(
+                max_entries=settings.session_cache_max_entries,
+                max_bytes=settings.session_cache_max_bytes,
+            )
+            if settings.session_cache_enabled
+            else None
+        )
+
+    def override(self, **overrides):
+        """
+        Substitui clientes antes de serem criados (ex.: por dublês locais nos testes de carga).
+
+        Args:
+            **overrides: Instâncias por nome de cliente ('redis_pool', 'twilio_client', 'llm_adapter',
+                'history_shaper', 'cloud_uploader', 'bq_storage', 'history_writer', 'history_reader',
+                'gemini_vision', 'transcriber' ou 'tools').
+
+        Raises:
+            AttributeError: Se algum nome não corresponder a um cliente do registro.
+        """
+        for name, client in overrides.items():
+            if not hasattr(self, f'_{name}'):
+                raise AttributeError(f'Cliente desconhecido: {name}')
+            setattr(self, f'_{name}', client)
+
+    @property
+    def redis_pool(self) -> redis.BlockingConnectionPool:
+        if self._redis_pool is None:
+            self._redis_pool = create_redis_pool(
+                host=self.settings.redis_host,
+                port=self.settings.redis_port,
+                password=self.settings.redis_password,
+                ssl=self.settings.redis_ssl,
+                max_connections=self.settings.redis_max_connections,
+                pool_timeout=self.settings.redis_pool_timeout,
+                socket_timeout=self.settings.redis_socket_timeout,
+                socket_connect_timeout=self.settings.redis_socket_connect_timeout,
+                health_check_interval=self.settings.redis_health_check_interval,
+            )
+        return self._redis_pool
+
+    @property
+    def twilio_client(self) -> Client:
+        if self._twilio_client is None:
+            self._twilio_client = Client(
+                self.settings.account_sid,
+                self.settings.twilio_auth_token,
+                http_client=TwilioHttpClient(pool_connections=True),
+            )
+        return self._twilio_client
+
+    @property
+    def tools(self) -> Tools:
+        if self._tools is None:
+            self._tools = Tools(
+                default_timeout_seconds=self.settings.tool_timeout_seconds,
+                timeouts=parse_timeouts(self.settings.tool_timeouts),
+            )
+        return self._tools
+
+    def _provider_config(self, name: str, model_type: str, model_name: str) -> dict:
+        """
+        Monta a configuração do adaptador de um provedor a partir das configurações da aplicação.
+
+        Cada provedor recebe o seu próprio controle de admissão, que assume as novas tentativas
+        no lugar do SDK.
+
+        Args:
+            name (str): Nome do provedor na lista de roteamento (ex.: 'openai:gpt-4o').
+            model_type (str): Tipo do modelo ('openai', 'anthropic', 'vertexai', ...).
+            model_name (str): Nome do modelo. Se vazio, é usado o padrão da Factory.
+
+        Returns:
+            dict: Configuração aceita por `LLMFactory.create_llm_adapter`.
+        """
+        config = {
+            'temperature': 0.7,
+            'max_retries': 0,
+            'admission': AdmissionController(
+                name=name,
+                max_concurrency=self.settings.llm_max_concurrency,
+                max_queue=self.settings.llm_max_queue,
+                deadline_seconds=self.settings.llm_deadline_seconds,
+                max_retries=self.settings.llm_max_retries,
+                retry_base_seconds=self.settings.llm_retry_base_seconds,
+                retry_max_seconds=self.settings.llm_retry_max_seconds,
+            ),
+        }
+        if model_name:
+            config['model_name'] = model_name
+        api_keys = {
+            'openai': self.settings.openai_api_key,
+            'anthropic': self.settings.anthropic_api_key,
+            'deepseek': self.settings.deepseek_api_key,
+            'maritalk': self.settings.maritalk_api_key,
+        }
+        if model_type in api_keys:
+            config['api_key'] = api_keys[model_type]
+        elif model_type == 'vertexai':
+            config['project'] = self.settings.project_id
+        return config
+
+    @property
+    def llm_adapter(self) -> RoutingLLMAdapter:
+        if self._llm_adapter is None:
+            providers = []
+            for entry in self.settings.llm_providers.split(','):
+                name = entry.strip()
+                model_type, _, model_name = name.partition(':')
+                factory_result = LLMManager().create_adapter(
+                    model_type=model_type, tools=self.tools, **self._provider_config(name, model_type, model_name)
+                )
+                if not factory_result.success:
+                    raise Exception(f'Erro ao criar adaptador LLM: {factory_result.error_message}')
+                providers.append((name, factory_result.data))
+
+            self._llm_adapter = RoutingLLMAdapter(
+                providers=providers,
+                attempt_timeout_seconds=self.settings.llm_attempt_timeout_seconds,
+                hedge_enabled=self.settings.llm_hedge_enabled,
+                hedge_min_samples=self.settings.llm_hedge_min_samples,
+                window_size=self.settings.llm_stats_window,
+                error_rate_threshold=self.settings.llm_error_rate_threshold,
+                degraded_cooldown_seconds=self.settings.llm_degraded_cooldown_seconds,
+            )
+        return self._llm_adapter
+
+    @property
+    def history_shaper(self) -> HistoryShaper:
+        if self._history_shaper is None:
+            self._history_shaper = HistoryShaper(
+                llm_adapter=self.llm_adapter,
+                token_budget=self.settings.history_token_budget,
+                min_recent_messages=self.settings.history_min_recent_messages,
+            )
+        return self._history_shaper
+
+    @property
+    def cloud_uploader(self) -> CloudUploader:
+        if self._cloud_uploader is None:
+            self._cloud_uploader = CloudUploader(bucket_name=self.settings.bucket_name)
+        return self._cloud_uploader
+
+    @property
+    def bq_storage(self) -> BigQueryStorage:
+        if self._bq_storage is None:
+            self._bq_storage = BigQueryStorage(
+                backend=self.settings.history_bq_backend,
+                append_timeout_seconds=self.settings.history_append_timeout_seconds,
+            )
+        return self._bq_storage
+
+    def _history_spool(self) -> Optional[HistorySpool]:
+        if not self.settings.history_spool_enabled:
+            return None
+        try:
+            return HistorySpool(
+                self.settings.history_spool_dir,
+                max_bytes=self.settings.history_spool_max_bytes,
+                segment_max_bytes=self.settings.history_spool_segment_bytes,
+            )
+        except OSError as e:
+            logger.warning(f'Spool do histórico indisponível em {self.settings.history_spool_dir}: {e}')
+            return None
+
+    @property
+    def history_writer(self) -> HistoryWriter:
+        if self._history_writer is None:
+            self._history_writer = HistoryWriter(
+                self.bq_storage,
+                max_buffer_rows=self.settings.history_buffer_max_rows,
+                batch_size=self.settings.history_batch_size,
+                flush_interval_seconds=self.settings.history_flush_interval_seconds,
+                overflow_policy=self.settings.history_overflow_policy,
+                spool=self._history_spool(),
+                sync_interval_seconds=self.settings.history_spool_sync_interval_seconds,
+                replay_interval_seconds=self.settings.history_spool_replay_interval_seconds,
+            )
+        return self._history_writer
+
+    @property
+    def history_reader(self) -> HistoryReader:
+        if self._history_reader is None:
+            self._history_reader = HistoryReader(
+                self.bq_storage,
+                dataset_id=self.settings.history_dataset_id,
+                table_id=self.settings.history_table_id,
+                cache_ttl_seconds=self.settings.history_read_cache_ttl_seconds,
+                cache_max_entries=self.settings.history_read_cache_max_entries,
+                query_timeout_seconds=self.settings.history_query_timeout_seconds,
+            )
+        return self._history_reader
+
+    @property
+    def gemini_vision(self) -> GeminiVision:
+        if self._gemini_vision is None:
+            self._gemini_vision = GeminiVision()
+        return self._gemini_vision
+
+    @property
+    def transcriber(self) -> Transcriber:
+        if self._transcriber is None:
+            config = {'language': self.settings.transcription_language}
+            if self.settings.transcription_backend == 'faster_whisper':
+                config.update(
+                    model_size=self.settings.transcription_whisper_model,
+                    compute_type=self.settings.transcription_whisper_compute_type,
+                    cpu_threads=self.settings.transcription_whisper_cpu_threads,
+                    num_workers=self.settings.transcription_whisper_workers,
+                    beam_size=self.settings.transcription_whisper_beam_size,
+                    vad_filter=self.settings.transcription_whisper_vad_filter,
+                    download_root=self.settings.transcription_whisper_model_dir or None,
+                )
+            self._transcriber = create_transcriber(self.settings.transcription_backend, **config)
+        return self._transcriber
+
+    async def _warmup_redis(self):
+        await redis.Redis(connection_pool=self.redis_pool).ping()
+
+    def _warmup_llm(self):
+        # Compila o agente (prompt, esquema das ferramentas e executor) de cada provedor.
+        self.llm_adapter.warmup(PROMPT_190)
+
+    def _warmup_vertex(self):
+        self.gemini_vision._init_gemini_once()
+
+    async def warmup(self):
+        """
+        Cria os clientes e aquece as conexões em paralelo.
+
+        Falhas são apenas registradas no log: o cliente correspondente volta a ser criado
+        sob demanda na primeira requisição que precisar dele.
+        """
+        steps = {
+            'redis': self._warmup_redis(),
+            'twilio': asyncio.to_thread(lambda: self.twilio_client),
+            'llm': asyncio.to_thread(self._warmup_llm),
+            'vertex': asyncio.to_thread(self._warmup_vertex),
+            'cloud_storage': asyncio.to_thread(lambda: self.cloud_uploader),
+            'bigquery': asyncio.to_thread(lambda: self.bq_storage),
+            # Carrega o modelo de transcrição local (no backend do Google, não faz nada).
+            'transcriber': asyncio.to_thread(lambda: self.transcriber.load()),
+        }
+        results = await asyncio.gather(*steps.values(), return_exceptions=True)
+        for name, result in zip(steps, results, strict=True):
+            if isinstance(result, Exception):
+                logger.warning(f'Falha no aquecimento de {name}: {result}')
+            else:
+                logger.info(f'Aquecimento de {name} concluído')
+
+    async def _migrate_history_table(self):
+        dataset_id, table_id = self.settings.history_dataset_id, self.settings.history_table_id
+        try:
+            storage = await asyncio.to_thread(lambda: self.bq_storage)
+            result = await storage.ensure_table(dataset_id, table_id)
+        except Exception as e:
+            logger.warning(f'Falha ao criar ou migrar a tabela do histórico: {e}')
+            return
+        if not result.success:
+            logger.warning(f'Falha ao criar ou migrar a tabela do histórico: {result.error_message}')
+        elif result.data:
+            logger.info(f'Tabela do histórico atualizada: {", ".join(result.data)}')
+
+    async def startup(self):
+        """
+        Executado na inicialização da aplicação, antes de ela começar a receber requisições.
+        """
+        if self.settings.otel_traces_endpoint:
+            try:
+                configure_tracing(self.settings.otel_traces_endpoint, self.settings.otel_service_name)
+            except Exception as e:
+                logger.warning(f'Falha ao configurar a exportação dos tempos para o OpenTelemetry: {e}')
+        if self.settings.warmup_on_startup:
+            await self.warmup()
+        if self.settings.history_table_migrate_on_startup:
+            await self._migrate_history_table()
+        try:
+            self.history_writer.start()
+        except Exception as e:
+            # O gravador volta a ser criado (e iniciado) no primeiro turno registrado.
+            logger.warning(f'Falha ao iniciar o gravador do histórico: {e}')
+
+    async def shutdown(self):
+        """
+        Encerra as conexões abertas pelos clientes (incluindo o pool do cliente LUPA usado pela
+        ferramenta de consulta de CPF). Executado no desligamento da aplicação.
+
+        O histórico ainda no buffer é gravado no BigQuery antes de o cliente ser fechado.
+        """
+        if self._history_writer is not None:
+            await self._history_writer.aclose(timeout=self.settings.history_drain_timeout_seconds)
+            self._history_writer = None
+        if self._redis_pool is not None:
+            await self._redis_pool.disconnect()
+            self._redis_pool = None
+        if self._twilio_client is not None:
+            session = getattr(self._twilio_client.http_client, 'session', None)
+            if session is not None:
+                session.close()
+            self._twilio_client = None
+        if self._llm_adapter is not None:
+            for adapter in self._llm_adapter.adapters:
+                if getattr(adapter.llm, 'root_async_client', None) is not None:
+                    await adapter.llm.root_async_client.close()
+                if getattr(adapter.llm, 'root_client', None) is not None:
+                    adapter.llm.root_client.close()
+            self._llm_adapter = None
+            # O modelador usa o adaptador encerrado acima.
+            self._history_shaper = None
+        if self._cloud_uploader is not None:
+            self._cloud_uploader.storage_client.close()
+            self._cloud_uploader = None
+        if self._bq_storage is not None:
+            self._bq_storage.close()
+            self._bq_storage = None
+        await lupa_client.aclose()
+        await asyncio.to_thread(shutdown_tracing)
+
+
+clients = ClientRegistry(settings)
+
+
 def get_twilio_client() -> Client:
     """
-    Cria e retorna um cliente da API Twilio.
+    Retorna o cliente da API Twilio compartilhado pela aplicação.
 
     Returns:
         Client: Cliente Twilio inicializado com as credenciais configuradas.
     """
-    return Client(settings.account_sid, settings.twilio_auth_token)
+    return clients.twilio_client
+
+
+def get_redis_pool() -> redis.BlockingConnectionPool:
+    """
+    Retorna o pool de conexões Redis compartilhado pela aplicação, criando-o na primeira chamada.
+
+    Returns:
+        redis.BlockingConnectionPool: Pool de conexões assíncronas com o Redis.
+    """
+    return clients.redis_pool
 
 
 def get_session_manager() -> RedisSessionManager:
     """
     Cria e retorna um gerenciador de sessões Redis.
 
-    Utiliza as configurações de conexão definidas nas variáveis de ambiente
-    para estabelecer uma conexão segura com o Redis.
+    O gerenciador é leve: todas as instâncias compartilham o mesmo pool de conexões
+    assíncronas e o mesmo cache em memória dos históricos, de modo que nenhuma conexão
+    nova é aberta por requisição.
 
     Returns:
         RedisSessionManager: Instância do gerenciador de sessões configurada.
     """
     return RedisSessionManager(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        password=settings.redis_password,
-        ssl=settings.redis_ssl,
+        client=redis.Redis(connection_pool=get_redis_pool()),
         key_prefix=settings.redis_key_prefix,
         expiry_seconds=settings.redis_expiry_seconds,
+        cache=clients.session_cache,
+        compress_threshold=settings.redis_compress_threshold_bytes,
+    )
+
+
+def get_session_lock() -> Optional[RedisSessionLock]:
+    """
+    Cria e retorna a fila por sessão que garante a ordem dos turnos de uma mesma sessão.
+
+    Returns:
+        Optional[RedisSessionLock]: Fila configurada, ou None se desabilitada nas configurações.
+    """
+    if not settings.session_lock_enabled:
+        return None
+    return RedisSessionLock(
+        client=redis.Redis(connection_pool=get_redis_pool()),
+        key_prefix=settings.redis_key_prefix,
+        lease_seconds=settings.session_lock_lease_seconds,
+        wait_timeout_seconds=settings.session_lock_wait_timeout_seconds,
+        grace_seconds=settings.session_lock_grace_seconds,
+        key_ttl_seconds=settings.redis_expiry_seconds,
     )
 
 
 def get_tools() -> Tools:
     """
-    Cria e retorna um conjunto de ferramentas para uso pelos modelos LLM.
+    Retorna o conjunto de ferramentas compartilhado, disponível para os modelos LLM.
 
     Returns:
         Tools: Instância contendo as ferramentas disponíveis.
     """
-    return Tools()
+    return clients.tools
 
 
-def get_llm_adapter(tools: Tools = Depends(get_tools)):
+def get_llm_adapter():
     """
-    Cria e retorna um adaptador LLM usando a API Anthropic Claude.
+    Retorna o adaptador LLM compartilhado pela aplicação.
 
-    Args:
-        tools (Tools): Conjunto de ferramentas a serem disponibilizadas para o modelo.
+    O adaptador roteia as chamadas entre os provedores listados em `llm_providers`
+    (ex.: 'openai:gpt-4o,anthropic:claude-3-5-haiku-20241022'), na ordem de preferência.
+    Ele é criado uma única vez por processo e reutilizado, para que os agentes compilados
+    e as estatísticas de latência sejam aproveitados entre as requisições.
 
     Returns:
-        LangChainLLMAdapter: Adaptador configurado para o modelo Claude.
+        RoutingLLMAdapter: Adaptador configurado com os provedores.
 
     Raises:
         Exception: Se ocorrer um erro na criação do adaptador.
     """
-    llm_manager = LLMManager()
-    factory_result = llm_manager.create_adapter(
-        model_type='openai',
-        tools=tools,
-        # project=settings.project_id,
-        model_name='gpt-4o',
-        temperature=0.7,
-        api_key=settings.openai_api_key,
-    )
-    if not factory_result.success:
-        raise Exception(f'Erro ao criar adaptador LLM: {factory_result.error_message}')
-    return factory_result.data
+    return clients.llm_adapter
+
+
+def get_history_shaper() -> HistoryShaper:
+    """
+    Retorna o modelador de histórico compartilhado pela aplicação.
+
+    Os resumos do histórico são gerados pelo adaptador LLM compartilhado, passando pelo controle
+    de admissão e pelo failover entre provedores.
+
+    Returns:
+        HistoryShaper: Modelador configurado com o orçamento de tokens do histórico.
+    """
+    return clients.history_shaper
 
 
 def get_agent(
-    session_manager: RedisSessionManager = Depends(get_session_manager), llm_adapter=Depends(get_llm_adapter)
+    session_manager: RedisSessionManager = Depends(get_session_manager),
+    llm_adapter=Depends(get_llm_adapter),
+    history_shaper: HistoryShaper = Depends(get_history_shaper),
+    session_lock: Optional[RedisSessionLock] = Depends(get_session_lock),
 ) -> Agent190:
     """
     Cria e retorna uma instância do agente de atendimento 190.
@@ -125,28 +597,82 @@ def get_agent(
     Args:
         session_manager (SessionManager): Gerenciador de sessões para manter histórico.
         llm_adapter: Adaptador para o modelo de linguagem a ser utilizado.
+        history_shaper (HistoryShaper): Modelador que limita o histórico a um orçamento de tokens.
+        session_lock (RedisSessionLock): Fila que ordena os turnos de uma mesma sessão.
 
     Returns:
         Agent190: Instância do agente configurada e pronta para uso.
     """
-    return Agent190(session_manager=session_manager, llm_adapter=llm_adapter)
+    return Agent190(
+        session_manager=session_manager,
+        llm_adapter=llm_adapter,
+        history_limit=settings.redis_history_fetch_limit,
+        history_shaper=history_shaper,
+        session_lock=session_lock,
+        speculative_lookup=settings.speculative_cpf_lookup_enabled,
+    )
 
 
 def get_cloud_uploader() -> CloudUploader:
     """
-    Cria e retorna um uploader para o Google Cloud Storage.
+    Retorna o uploader para o Google Cloud Storage compartilhado pela aplicação.
 
     Returns:
         CloudUploader: Uploader configurado com o bucket especificado nas configurações.
     """
-    return CloudUploader(bucket_name=settings.bucket_name)
+    return clients.cloud_uploader
+
+
+def get_transcriber() -> Transcriber:
+    """
+    Retorna o transcritor de áudio compartilhado pela aplicação, do backend definido em
+    `transcription_backend`.
+
+    Returns:
+        Transcriber: Transcritor de áudio.
+    """
+    return clients.transcriber
 
 
 def get_gemini_vision() -> GeminiVision:
     """
-    Cria e retorna uma instância do serviço de visão computacional Gemini.
+    Retorna o serviço de visão computacional Gemini compartilhado pela aplicação.
+
+    Returns:
+        GeminiVision: Instância do serviço Gemini Vision.
+    """
+    return clients.gemini_vision
+
+
+def get_history_writer() -> HistoryWriter:
+    """
+    Retorna o gravador do histórico no BigQuery compartilhado pela aplicação.
+
+    Returns:
+        HistoryWriter: Instância usada pelo middleware e pelo processamento em segundo plano.
+    """
+    return clients.history_writer
+
+
+def get_history_reader() -> HistoryReader:
+    """
+    Retorna o leitor do histórico no BigQuery compartilhado pela aplicação.
 
     Returns:
-        GeminiVision: Instância do serviço Gemini Vision inicializada.
+        HistoryReader: Instância com o cache de consultas compartilhado pelas requisições.
+    """
+    return clients.history_reader
+
+
+def require_history_api_key(x_api_key: Optional[str] = Header(None)):
+    """
+    Exige a chave de acesso da API de leitura do histórico no cabeçalho `X-API-Key`.
+
+    Raises:
+        HTTPException: 503 se nenhuma chave estiver configurada (API desabilitada) e 401 se a
+            chave enviada estiver ausente ou incorreta.
     """
-    return GeminiVision()
+    if not settings.history_api_key:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Leitura do histórico desativada')
+    if x_api_key is None or not secrets.compare_digest(x_api_key, settings.history_api_key):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Chave de acesso inválida')
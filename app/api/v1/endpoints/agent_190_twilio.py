@@ -1,28 +1,36 @@
 import asyncio
 import logging
-from typing import Optional
+import time
 
 import uuid
+from typing import Optional
 from fastapi import APIRouter, Request, Response, status, Depends, HTTPException
 from twilio.rest import Client
 from twilio.twiml.messaging_response import MessagingResponse
 
+from crud.adapters.admission import BUSY_MESSAGE
 from crud.agents.agent190_modeling import Agent190, RedisSessionManager
 from crud.features.audio_transcript import (
     AudioDownloader,
     AudioConverter,
-    AudioTranscriber,
     CloudUploader,
 )
 from crud.features.gemini_vision import GeminiVision
+from crud.features.history_writer import HistoryWriter
 from crud.features.maps import geocode_reverse
+from crud.features.transcription import Transcriber
+from utils.deadline import Deadline
+from utils.result import Result
+from utils.timing import StageTimings
 
 from api.v1.dependencies import (
     get_twilio_client,
     get_agent,
+    get_history_writer,
     get_gemini_vision,
     get_cloud_uploader,
     get_session_manager,
+    get_transcriber,
     settings,
 )
 
@@ -33,6 +41,13 @@ logging.basicConfig(
 
 router = APIRouter()
 
+# Referências às tarefas em segundo plano, para que não sejam coletadas antes de terminar.
+_background_tasks = set()
+
+# Entradas enviadas ao agente quando a mídia não pôde ser processada dentro do prazo.
+IMAGE_UNAVAILABLE_INPUT = '[O usuário enviou uma imagem, mas não foi possível analisá-la a tempo.]'
+AUDIO_UNAVAILABLE_INPUT = '[O usuário enviou um áudio, mas não foi possível transcrevê-lo a tempo.]'
+
 
 @router.post('/init_session', status_code=status.HTTP_200_OK)
 async def init_session(session_manager: RedisSessionManager = Depends(get_session_manager)):
@@ -49,7 +64,7 @@ async def init_session(session_manager: RedisSessionManager = Depends(get_sessio
     Raises:
         HTTPException: Se não for possível conectar ao Redis.
     """
-    conn_result = session_manager.test_connection()
+    conn_result = await session_manager.test_connection()
     if not conn_result.success:
         raise HTTPException(
             status_code=503,
@@ -64,69 +79,304 @@ async def send_twilio_message(to_number: str, body_text: str, client: Client = D
     """
     Envia mensagem para o usuário via Twilio API (outbound).
 
+    A chamada HTTP do cliente Twilio é síncrona e por isso roda em uma thread separada,
+    sem bloquear o event loop.
+
     Args:
         to_number (str): Número do destinatário no formato 'whatsapp:+55...'
         body_text (str): Texto da mensagem a ser enviada.
         client (Client): Cliente Twilio para envio da mensagem.
     """
     try:
-        message = client.messages.create(body=body_text, from_=settings.twilio_whatsapp_number, to=to_number)
+        message = await asyncio.to_thread(
+            client.messages.create, body=body_text, from_=settings.twilio_whatsapp_number, to=to_number
+        )
         logger.info(f'Mensagem enviada via Twilio: SID={message.sid}')
     except Exception as e:
         logger.exception(f'Falha ao enviar mensagem Twilio: {e}')
 
 
-async def process_audio_in_background(
-    ogg_path: str,
-    from_number: str,
+def classify_message(form_data) -> str:
+    """
+    Identifica o tipo da mensagem recebida do Twilio.
+
+    Args:
+        form_data: Campos do formulário enviado pelo webhook do Twilio.
+
+    Returns:
+        str: 'location', 'audio', 'image', 'unsupported' ou 'text'.
+    """
+    if form_data.get('Latitude') and form_data.get('Longitude'):
+        return 'location'
+    if int(form_data.get('NumMedia', 0)) > 0:
+        media_content_type = form_data.get('MediaContentType0', '').lower()
+        if 'audio' in media_content_type:
+            return 'audio'
+        if 'image' in media_content_type:
+            return 'image'
+        return 'unsupported'
+    return 'text'
+
+
+def _turn_record(user_input: str, response: str, message_type: str) -> dict:
+    return {'user_input': user_input, 'response': response, 'message_type': message_type}
+
+
+def _stage_timeout(deadline: Deadline) -> Optional[float]:
+    """
+    Calcula o tempo limite de uma etapa anterior ao agente.
+
+    Essas etapas não podem consumir o tempo reservado para a resposta do agente, e uma etapa com
+    menos de `deadline_min_stage_seconds` disponíveis nem é iniciada.
+
+    Returns:
+        float: Segundos disponíveis para a etapa, ou None se não houver tempo suficiente.
+    """
+    timeout = deadline.timeout(reserve=settings.deadline_agent_reserve_seconds)
+    return timeout if timeout >= settings.deadline_min_stage_seconds else None
+
+
+def _stage_skipped(stage: str) -> Result:
+    return Result.fail(error_message=f'Prazo insuficiente para {stage}')
+
+
+async def _answer(user_input: str, session_id: str, agent: Agent190, message_type: str, deadline: Deadline) -> dict:
+    if deadline.expired:
+        # Sem tempo para o agente: devolve logo a resposta de ocupado em vez de chamá-lo com prazo zero.
+        logger.warning(f'Prazo esgotado antes da resposta do agente para a sessão {session_id}')
+        return _turn_record(user_input, BUSY_MESSAGE, message_type)
+    agent_result = await agent.generate_text_response(user_input, session_id, deadline=deadline)
+    if not agent_result.success:
+        return _turn_record(user_input, agent_result.error_message, message_type)
+    return _turn_record(user_input, agent_result.data, message_type)
+
+
+async def handle_location_message(form_data, session_id: str, agent: Agent190, deadline: Deadline) -> dict:
+    """
+    Converte a localização recebida em endereço e a envia ao agente.
+
+    Se o endereço não puder ser obtido dentro do prazo, o agente recebe as coordenadas.
+
+    Args:
+        form_data: Campos do formulário enviado pelo webhook do Twilio.
+        session_id (str): ID da sessão para manter contexto da conversa.
+        agent (Agent190): Instância do agente de atendimento.
+        deadline (Deadline): Prazo da requisição.
+
+    Returns:
+        dict: Registro do turno com 'user_input', 'response' e 'message_type'.
+    """
+    latitude = form_data.get('Latitude')
+    longitude = form_data.get('Longitude')
+    timeout = _stage_timeout(deadline)
+    if timeout is None:
+        geocode_result = _stage_skipped('obter o endereço')
+    else:
+        geocode_result = await geocode_reverse(latitude, longitude, timeout=timeout)
+    if geocode_result.success:
+        user_input = f'Localização recebida:\nEndereço: {geocode_result.data}'
+    else:
+        logger.warning(f'Endereço indisponível, usando as coordenadas: {geocode_result.error_message}')
+        user_input = f'Localização recebida:\nCoordenadas: {latitude}, {longitude}'
+
+    return await _answer(user_input, session_id, agent, 'location', deadline)
+
+
+async def handle_image_message(
+    form_data, session_id: str, agent: Agent190, gemini_vision: GeminiVision, deadline: Deadline
+) -> dict:
+    """
+    Descreve a imagem recebida com o Gemini e envia a descrição ao agente.
+
+    Se a imagem não puder ser baixada ou descrita dentro do prazo, o agente é informado de que
+    recebeu uma imagem que não pôde ser analisada.
+
+    Args:
+        form_data: Campos do formulário enviado pelo webhook do Twilio.
+        session_id (str): ID da sessão para manter contexto da conversa.
+        agent (Agent190): Instância do agente de atendimento.
+        gemini_vision (GeminiVision): Serviço de visão computacional.
+        deadline (Deadline): Prazo da requisição.
+
+    Returns:
+        dict: Registro do turno com 'user_input', 'response' e 'message_type'.
+    """
+    timeout = _stage_timeout(deadline)
+    if timeout is None:
+        result = _stage_skipped('baixar a imagem')
+    else:
+        result = await gemini_vision.fetch_image(form_data.get('MediaUrl0'), timeout=timeout)
+    if result.success:
+        timeout = _stage_timeout(deadline)
+        if timeout is None:
+            result = _stage_skipped('descrever a imagem')
+        else:
+            result = await gemini_vision.perform_gemini(result.data, timeout=timeout)
+
+    if result.success:
+        user_input = result.data
+    else:
+        logger.warning(f'Imagem não analisada: {result.error_message}')
+        user_input = IMAGE_UNAVAILABLE_INPUT
+
+    return await _answer(user_input, session_id, agent, 'image', deadline)
+
+
+async def handle_audio_message(
+    form_data,
     session_id: str,
-    send_message_func,
     agent: Agent190,
     cloud_uploader: CloudUploader,
-):
+    transcriber: Transcriber,
+    deadline: Deadline,
+) -> dict:
     """
-    Processa o áudio de forma assíncrona.
+    Baixa, converte, armazena e transcreve o áudio recebido, enviando a transcrição ao agente.
+
+    O armazenamento do áudio é feito em paralelo com a transcrição e não impede a resposta. Se
+    o áudio não puder ser baixado ou transcrito dentro do prazo, o agente é informado de que
+    recebeu um áudio que não pôde ser ouvido.
 
     Args:
-        ogg_path (str): Caminho para o arquivo de áudio OGG baixado.
-        from_number (str): Número do remetente no formato Twilio.
+        form_data: Campos do formulário enviado pelo webhook do Twilio.
         session_id (str): ID da sessão para manter contexto da conversa.
-        send_message_func: Função para enviar mensagens de resposta.
-        agent (Agent190): Instância do agente para processar o texto transcrito.
+        agent (Agent190): Instância do agente de atendimento.
         cloud_uploader (CloudUploader): Uploader para armazenar o arquivo na nuvem.
+        transcriber (Transcriber): Transcritor de áudio.
+        deadline (Deadline): Prazo da requisição.
+
+    Returns:
+        dict: Registro do turno com 'user_input', 'response' e 'message_type'.
     """
-    try:
-        convert_result = await AudioConverter.convert_ogg_to_wav(ogg_path)
-        if not convert_result.success:
-            await send_message_func(from_number, convert_result.error_message)
-            return
+    timeout = _stage_timeout(deadline)
+    if timeout is None:
+        result = _stage_skipped('baixar o áudio')
+    else:
+        result = await AudioDownloader.download_audio(form_data.get('MediaUrl0'), timeout=timeout)
+    if result.success:
+        result = await AudioConverter.convert_ogg_to_wav(result.data)
+
+    if result.success:
+        timeout = _stage_timeout(deadline)
+        if timeout is None:
+            # Sem tempo para transcrever, também não vale armazenar: o áudio não chega ao agente.
+            result = _stage_skipped('transcrever o áudio')
+        else:
+            wav_path = result.data
+            upload_result, result = await asyncio.gather(
+                cloud_uploader.upload_to_cloud_storage(wav_path, folder='audios_wav', timeout=timeout),
+                transcriber.transcribe_audio(wav_path, timeout=timeout),
+            )
+            if not upload_result.success:
+                logger.error(f'Áudio não armazenado: {upload_result.error_message}')
 
-        wav_path = convert_result.data
+    if result.success:
+        user_input = result.data
+    else:
+        logger.warning(f'Áudio não transcrito: {result.error_message}')
+        user_input = AUDIO_UNAVAILABLE_INPUT
 
-        upload_result = await cloud_uploader.upload_to_cloud_storage(wav_path, folder='audios_wav')
-        if not upload_result.success:
-            await send_message_func(from_number, upload_result.error_message)
-            return
+    return await _answer(user_input, session_id, agent, 'audio', deadline)
 
-        transcribe_result = await AudioTranscriber.transcribe_audio(wav_path)
-        if not transcribe_result.success:
-            await send_message_func(from_number, transcribe_result.error_message)
-            return
 
-        user_input = transcribe_result.data
+async def handle_message(
+    form_data,
+    session_id: str,
+    agent: Agent190,
+    gemini_vision: GeminiVision,
+    cloud_uploader: CloudUploader,
+    transcriber: Transcriber,
+    deadline: Deadline,
+) -> dict:
+    """
+    Executa o pipeline completo de uma mensagem, de acordo com o seu tipo.
 
-        agent_result = await agent.generate_text_response(user_input, session_id)
-        if not agent_result.success:
-            await send_message_func(from_number, agent_result.error_message)
-            return
+    Args:
+        form_data: Campos do formulário enviado pelo webhook do Twilio.
+        session_id (str): ID da sessão para manter contexto da conversa.
+        agent (Agent190): Instância do agente de atendimento.
+        gemini_vision (GeminiVision): Serviço de visão computacional.
+        cloud_uploader (CloudUploader): Uploader para armazenar o arquivo na nuvem.
+        transcriber (Transcriber): Transcritor de áudio.
+        deadline (Deadline): Prazo da requisição, repassado a todas as etapas.
 
-        ai_response = agent_result.data
-        logger.info(f'Enviando resposta de áudio processado para sessão {session_id}')
-        await send_message_func(from_number, ai_response)
+    Returns:
+        dict: Registro do turno com 'user_input', 'response' e 'message_type'.
+    """
+    message_type = classify_message(form_data)
+    if message_type == 'location':
+        return await handle_location_message(form_data, session_id, agent, deadline)
+    if message_type == 'audio':
+        return await handle_audio_message(form_data, session_id, agent, cloud_uploader, transcriber, deadline)
+    if message_type == 'image':
+        return await handle_image_message(form_data, session_id, agent, gemini_vision, deadline)
+    if message_type == 'unsupported':
+        return _turn_record('Media inbound - not supported', 'Tipo de mídia não suportado.', message_type)
+    return await _answer(form_data.get('Body', ''), session_id, agent, message_type, deadline)
+
+
+async def process_message_in_background(
+    form_data: dict,
+    from_number: str,
+    session_id: str,
+    received_at: float,
+    send_message_func,
+    agent: Agent190,
+    gemini_vision: GeminiVision,
+    cloud_uploader: CloudUploader,
+    transcriber: Transcriber,
+    history_writer: HistoryWriter,
+    deadline: Deadline,
+    timings: StageTimings,
+):
+    """
+    Processa a mensagem fora do ciclo da requisição e entrega a resposta via API do Twilio.
 
+    Ao final, registra o turno no BigQuery com a resposta efetivamente enviada, a latência
+    medida desde o recebimento do webhook até a entrega e o tempo de cada etapa.
+
+    Args:
+        form_data (dict): Campos do formulário enviado pelo webhook do Twilio.
+        from_number (str): Número do remetente no formato Twilio.
+        session_id (str): ID da sessão para manter contexto da conversa.
+        received_at (float): Instante (time.time()) em que o webhook foi recebido.
+        send_message_func: Função para enviar mensagens de resposta.
+        agent (Agent190): Instância do agente de atendimento.
+        gemini_vision (GeminiVision): Serviço de visão computacional.
+        cloud_uploader (CloudUploader): Uploader para armazenar o arquivo na nuvem.
+        transcriber (Transcriber): Transcritor de áudio.
+        history_writer (HistoryWriter): Gravador do histórico no BigQuery.
+        deadline (Deadline): Prazo da mensagem, contado desde o recebimento do webhook.
+        timings (StageTimings): Tempos das etapas, contados desde o recebimento do webhook.
+    """
+    try:
+        with timings.activate():
+            record = await handle_message(
+                form_data, session_id, agent, gemini_vision, cloud_uploader, transcriber, deadline
+            )
     except Exception as e:
-        logger.exception(f'Erro ao processar áudio: {e}')
-        await send_message_func(from_number, f'Erro ao processar áudio: {str(e)}')
+        logger.exception(f'Erro ao processar mensagem: {e}')
+        record = _turn_record(
+            form_data.get('Body', ''), f'Erro ao processar mensagem: {str(e)}', classify_message(form_data)
+        )
+
+    logger.info(f'Enviando resposta processada em segundo plano para sessão {session_id}')
+    with timings.stage('twilio_send'):
+        await send_message_func(from_number, record['response'])
+    timings.export('predict_twilio_190', {'message_type': record['message_type'], 'early_ack': True})
+
+    store_result = history_writer.enqueue(
+        dataset_id=settings.history_dataset_id,
+        table_id=settings.history_table_id,
+        session_id=session_id,
+        user_input=record['user_input'],
+        response=record['response'],
+        response_time=time.time() - received_at,
+        message_type=record['message_type'],
+        stage_timings=timings.as_dict(),
+    )
+    if not store_result.success:
+        logger.error(store_result.error_message)
 
 
 @router.post('/predict_twilio_190', status_code=status.HTTP_200_OK)
@@ -137,6 +387,8 @@ async def predict_twilio_190(
     agent: Agent190 = Depends(get_agent),
     gemini_vision: GeminiVision = Depends(get_gemini_vision),
     cloud_uploader: CloudUploader = Depends(get_cloud_uploader),
+    transcriber: Transcriber = Depends(get_transcriber),
+    history_writer: HistoryWriter = Depends(get_history_writer),
 ):
     """
     Endpoint que recebe e processa mensagens do WhatsApp via Twilio.
@@ -148,196 +400,61 @@ async def predict_twilio_190(
         agent (Agent190): Instância do agente de atendimento.
         gemini_vision (GeminiVision): Serviço de visão computacional.
         cloud_uploader (CloudUploader): Serviço de upload para nuvem.
+        transcriber (Transcriber): Transcritor de áudio.
+        history_writer (HistoryWriter): Gravador do histórico no BigQuery.
 
     Returns:
         Response: Resposta TwiML formatada para o Twilio.
 
     Note:
         Suporta mensagens de texto, imagem, localização e áudio.
-        Áudio é processado de forma assíncrona.
-        Define `request.state.bq_data` para registrar no BigQuery via middleware.
+        Áudio é sempre processado de forma assíncrona. Com `twilio_early_ack` habilitado,
+        todos os tipos de mensagem são: o webhook responde imediatamente com um TwiML vazio
+        e a resposta é entregue via API do Twilio, sendo registrada no BigQuery ao final.
+        Caso contrário, define `request.state.bq_data` para registrar no BigQuery via middleware.
+
+        O prazo da mensagem começa a contar na entrada do webhook: `twilio_webhook_deadline_seconds`
+        quando a resposta vai no próprio webhook (o Twilio desiste de esperar após 15 segundos) e
+        `background_deadline_seconds` quando ela é entregue pela API. Os tempos de cada etapa
+        (`StageTimings`) contam a partir do mesmo instante e são registrados com o turno.
     """
-    form_data = await request.form()
-    num_media = int(form_data.get('NumMedia', 0))
+    received_at = time.time()
+    timings = StageTimings()
+    form_data = dict(await request.form())
     from_number = form_data.get('From')
     session_id = from_number
 
     resp = MessagingResponse()
-    msg = resp.message()
-
-    latitude = form_data.get('Latitude')
-    longitude = form_data.get('Longitude')
-    user_input: Optional[str] = None
-    agent_response: Optional[str] = None
-    message_type = 'text'
-
-    if latitude and longitude:
-        message_type = 'location'
-        geocode_result = await geocode_reverse(latitude, longitude)
-        if not geocode_result.success:
-            error = f'Erro ao obter endereço: {geocode_result.error_message}'
-            msg.body(error)
-            request.state.bq_data = {
-                'session_id': session_id,
-                'user_input': f'Lat:{latitude}, Lng:{longitude}',
-                'response': error,
-                'message_type': message_type,
-            }
-            return Response(content=str(resp), media_type='application/xml')
-
-        user_input = f'Localização recebida:\nEndereço: {geocode_result.data}'
-        agent_result = await agent.generate_text_response(user_input, session_id)
-        if not agent_result.success:
-            error = agent_result.error_message
-            msg.body(error)
-            request.state.bq_data = {
-                'session_id': session_id,
-                'user_input': user_input,
-                'response': error,
-                'message_type': message_type,
-            }
-            return Response(content=str(resp), media_type='application/xml')
-
-        ai_response = agent_result.data
-        agent_response = ai_response
-        protocol_number = None
-
-        msg.body(agent_response)
-
-        request.state.bq_data = {
-            'session_id': session_id,
-            'user_input': user_input,
-            'response': agent_response,
-            'message_type': message_type,
-            'protocol': protocol_number,
-        }
-        return Response(content=str(resp), media_type='application/xml')
-
-    elif num_media > 0:
-        media_url = form_data.get('MediaUrl0')
-        media_content_type = form_data.get('MediaContentType0', '').lower()
-
-        if 'audio' in media_content_type:
-            message_type = 'audio'
-            download_result = await AudioDownloader.download_audio(media_url)
-            if not download_result.success:
-                msg.body(download_result.error_message)
-                request.state.bq_data = {
-                    'session_id': session_id,
-                    'user_input': 'Audio inbound - download error',
-                    'response': download_result.error_message,
-                    'message_type': message_type,
-                }
-                return Response(content=str(resp), media_type='application/xml')
-
-            asyncio.create_task(
-                process_audio_in_background(
-                    ogg_path=download_result.data,
-                    from_number=from_number,
-                    session_id=session_id,
-                    send_message_func=lambda to, text: send_twilio_message(to, text, twilio_client),
-                    agent=agent,
-                    cloud_uploader=cloud_uploader,
-                )
+    message_type = classify_message(form_data)
+
+    if settings.twilio_early_ack or message_type == 'audio':
+        deadline = Deadline(settings.background_deadline_seconds)
+        task = asyncio.create_task(
+            process_message_in_background(
+                form_data=form_data,
+                from_number=from_number,
+                session_id=session_id,
+                received_at=received_at,
+                send_message_func=lambda to, text: send_twilio_message(to, text, twilio_client),
+                agent=agent,
+                gemini_vision=gemini_vision,
+                cloud_uploader=cloud_uploader,
+                transcriber=transcriber,
+                history_writer=history_writer,
+                deadline=deadline,
+                timings=timings,
             )
-
-            user_input = 'Audio being processed offline'
-            agent_response = 'N/A (will be generated async)'
-
-            request.state.bq_data = {
-                'session_id': session_id,
-                'user_input': user_input,
-                'response': agent_response,
-                'message_type': message_type,
-            }
-            return Response(content=str(resp), media_type='application/xml')
-
-        elif 'image' in media_content_type:
-            message_type = 'image'
-            img_result = await gemini_vision.fetch_image(media_url)
-            if not img_result.success:
-                msg.body(img_result.error_message)
-                request.state.bq_data = {
-                    'session_id': session_id,
-                    'user_input': 'Image inbound - fetch error',
-                    'response': img_result.error_message,
-                    'message_type': message_type,
-                }
-                return Response(content=str(resp), media_type='application/xml')
-
-            gemini_result = await gemini_vision.perform_gemini(img_result.data)
-            if not gemini_result.success:
-                msg.body(gemini_result.error_message)
-                request.state.bq_data = {
-                    'session_id': session_id,
-                    'user_input': 'Image inbound - gemini error',
-                    'response': gemini_result.error_message,
-                    'message_type': message_type,
-                }
-                return Response(content=str(resp), media_type='application/xml')
-
-            user_input = gemini_result.data
-            agent_result = await agent.generate_text_response(user_input, session_id)
-            if not agent_result.success:
-                msg.body(agent_result.error_message)
-                request.state.bq_data = {
-                    'session_id': session_id,
-                    'user_input': user_input,
-                    'response': agent_result.error_message,
-                    'message_type': message_type,
-                }
-                return Response(content=str(resp), media_type='application/xml')
-
-            ai_response = agent_result.data
-            agent_response = ai_response
-            protocol_number = None
-
-            msg.body(agent_response)
-            request.state.bq_data = {
-                'session_id': session_id,
-                'user_input': user_input,
-                'response': agent_response,
-                'message_type': message_type,
-                'protocol': protocol_number,
-            }
-            return Response(content=str(resp), media_type='application/xml')
-
-        else:
-            error = 'Tipo de mídia não suportado.'
-            msg.body(error)
-            request.state.bq_data = {
-                'session_id': session_id,
-                'user_input': 'Media inbound - not supported',
-                'response': error,
-                'message_type': 'unsupported',
-            }
-            return Response(content=str(resp), media_type='application/xml')
-
-    else:
-        message_type = 'text'
-        user_input = form_data.get('Body', '')
-        agent_result = await agent.generate_text_response(user_input, session_id)
-        if not agent_result.success:
-            error = agent_result.error_message
-            msg.body(error)
-            request.state.bq_data = {
-                'session_id': session_id,
-                'user_input': user_input,
-                'response': error,
-                'message_type': message_type,
-            }
-            return Response(content=str(resp), media_type='application/xml')
-
-        ai_response = agent_result.data
-        agent_response = ai_response
-        protocol_number = None
-
-        msg.body(agent_response)
-        request.state.bq_data = {
-            'session_id': session_id,
-            'user_input': user_input,
-            'response': agent_response,
-            'message_type': message_type,
-            'protocol': protocol_number,
-        }
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
         return Response(content=str(resp), media_type='application/xml')
+
+    deadline = Deadline(settings.twilio_webhook_deadline_seconds)
+    with timings.activate():
+        record = await handle_message(
+            form_data, session_id, agent, gemini_vision, cloud_uploader, transcriber, deadline
+        )
+    timings.export('predict_twilio_190', {'message_type': record['message_type'], 'early_ack': False})
+    resp.message(record['response'])
+    request.state.bq_data = {'session_id': session_id, **record, 'stage_timings': timings.as_dict()}
+    return Response(content=str(resp), media_type='application/xml')
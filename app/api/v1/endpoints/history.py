@@ -0,0 +1,70 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from crud.features.history_reader import HistoryReader
+from schemas.history import RecentSessions, SessionHistory
+
+from api.v1.dependencies import get_history_reader, require_history_api_key
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(dependencies=[Depends(require_history_api_key)])
+
+
+@router.get('/sessions', response_model=RecentSessions)
+async def recent_sessions(
+    hours: int = Query(24, ge=1, le=24 * 31, description='Período consultado, em horas.'),
+    limit: int = Query(50, ge=1, le=500, description='Quantidade máxima de sessões.'),
+    reader: HistoryReader = Depends(get_history_reader),
+):
+    """
+    Lista as sessões com mensagens no período, da mais recente para a mais antiga.
+
+    Args:
+        hours (int): Período consultado, em horas (apenas as partições do período são lidas).
+        limit (int): Quantidade máxima de sessões.
+        reader (HistoryReader): Leitor do histórico no BigQuery.
+
+    Returns:
+        RecentSessions: Sessões com o primeiro e o último turno, a quantidade de turnos e os tipos de mensagem.
+
+    Raises:
+        HTTPException: 502 se a consulta ao BigQuery falhar.
+    """
+    result = await reader.recent_sessions(hours=hours, limit=limit)
+    if not result.success:
+        logger.error(result.error_message)
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='Falha ao consultar o histórico')
+    return {'sessions': result.data}
+
+
+@router.get('/sessions/{session_id}', response_model=SessionHistory)
+async def session_history(
+    session_id: str,
+    days: int = Query(7, ge=1, le=90, description='Período consultado, em dias.'),
+    limit: int = Query(200, ge=1, le=1000, description='Quantidade máxima de turnos (os mais recentes).'),
+    reader: HistoryReader = Depends(get_history_reader),
+):
+    """
+    Retorna os turnos de uma sessão no período, do mais antigo para o mais recente.
+
+    Args:
+        session_id (str): ID da sessão (número do WhatsApp no formato Twilio, ex.: 'whatsapp:+5586...').
+        days (int): Período consultado, em dias (apenas as partições do período são lidas).
+        limit (int): Quantidade máxima de turnos.
+        reader (HistoryReader): Leitor do histórico no BigQuery.
+
+    Returns:
+        SessionHistory: Turnos da sessão.
+
+    Raises:
+        HTTPException: 502 se a consulta ao BigQuery falhar e 404 se a sessão não tiver turnos no período.
+    """
+    result = await reader.session_history(session_id, days=days, limit=limit)
+    if not result.success:
+        logger.error(result.error_message)
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail='Falha ao consultar o histórico')
+    if not result.data:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Sessão sem mensagens no período')
+    return {'session_id': session_id, 'turns': result.data}
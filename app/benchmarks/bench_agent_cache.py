@@ -0,0 +1,93 @@
+"""
+Microbenchmark do custo por turno do agente com e sem o cache de compilação do adaptador.
+
+Usa um modelo de chat falso (sem rede) para isolar o overhead de montar o prompt, converter
+o esquema das ferramentas e criar o AgentExecutor a cada mensagem.
+
+Uso (a partir do diretório `app`):
+    python -m benchmarks.bench_agent_cache --turns 200
+"""
+
+import argparse
+import itertools
+import logging
+import statistics
+import time
+from datetime import date
+
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from crud.adapters.adapter import LangChainLLMAdapter
+from crud.tools.tools import Tools
+from utils.prompts import PROMPT_190
+
+
+class FakeToolChatModel(GenericFakeChatModel):
+    """Modelo falso que aceita `bind_tools` e sempre responde com o mesmo texto."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def build_llm():
+    return FakeToolChatModel(messages=itertools.cycle([AIMessage(content='Por favor, informe o seu CPF.')]))
+
+
+def uncached_turn(llm, tools, inputs: dict):
+    """Reproduz o caminho anterior: compila prompt, agente e executor a cada turno."""
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ('system', PROMPT_190),
+            MessagesPlaceholder(variable_name='chat_history'),
+            ('human', '{input}'),
+            MessagesPlaceholder(variable_name='agent_scratchpad'),
+        ]
+    )
+    agent = create_tool_calling_agent(llm=llm, tools=tools.as_list(), prompt=prompt)
+    agent_executor = AgentExecutor(agent=agent, tools=tools.as_list(), verbose=False)
+    return agent_executor.invoke(inputs)
+
+
+def cached_turn(adapter: LangChainLLMAdapter, inputs: dict):
+    """Caminho atual: apenas invoca o executor compilado e mantido pelo adaptador."""
+    agent_executor = adapter._get_agent_executor(PROMPT_190)
+    agent_executor.verbose = False
+    return agent_executor.invoke(inputs)
+
+
+def measure(label: str, turns: int, fn) -> list:
+    fn()
+    timings = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(
+        f'{label:<10} média={statistics.mean(timings):7.3f} ms  '
+        f'p50={timings[len(timings) // 2]:7.3f} ms  p95={timings[int(len(timings) * 0.95)]:7.3f} ms'
+    )
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=200, help='Quantidade de turnos medidos em cada cenário.')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    tools = Tools()
+    llm = build_llm()
+    adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+    inputs = {'input': 'Olá, preciso de ajuda', 'chat_history': [], 'data': date.today()}
+
+    uncached = measure('sem cache', args.turns, lambda: uncached_turn(llm, tools, inputs))
+    cached = measure('com cache', args.turns, lambda: cached_turn(adapter, inputs))
+    print(f'economia por turno: {statistics.mean(uncached) - statistics.mean(cached):.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
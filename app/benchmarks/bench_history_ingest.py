@@ -0,0 +1,240 @@
+"""
+Benchmark da gravação do histórico no BigQuery: Storage Write API x API legada de streaming.
+
+Grava as mesmas linhas pelos dois backends do `BigQueryStorage`, em lotes, como faz o
+`HistoryWriter`, e informa a vazão (linhas/s) e os bytes enviados. A rede é substituída por
+dublês locais, que aguardam um tempo de ida e volta por requisição mais o tempo de transmissão
+dos bytes na banda configurada: o cliente legado serializa o corpo JSON de `insertAll`, e o
+stream do Storage Write API recebe as requisições protobuf (conferindo os offsets como o serviço).
+
+Com `--drop-rate`, parte das confirmações do Storage Write API se perde depois da gravação,
+o que força o reenvio do lote com o mesmo offset; ao final, confere-se que nenhuma linha foi
+gravada em dobro.
+
+Uso (a partir do diretório `app`):
+    python -m benchmarks.bench_history_ingest --rows 20000 --batch-size 500
+    python -m benchmarks.bench_history_ingest --rows 500 --batch-size 1 --rtt 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from google.api_core import exceptions
+from google.cloud import bigquery
+from google.cloud.bigquery_storage_v1 import types
+from google.cloud.bigquery_storage_v1.exceptions import StreamClosedError
+
+from crud.features.history_bq import HISTORY_SCHEMA, BigQueryStorage
+
+WORDS = 'socorro rua casa vizinho viatura endereço ocorrência polícia agora perto centro carro porta'.split()
+
+
+class FakeNetwork:
+    """Simula o custo de cada requisição: ida e volta mais a transmissão dos bytes."""
+
+    def __init__(self, rtt_seconds: float, bandwidth_mbps: float):
+        self.rtt_seconds = rtt_seconds
+        self.bytes_per_second = bandwidth_mbps * 1_000_000 / 8
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def transfer(self, size: int):
+        with self._lock:
+            self.bytes_sent += size
+            self.requests += 1
+        time.sleep(self.rtt_seconds + size / self.bytes_per_second)
+
+
+class FakeBigQueryClient:
+    """Dublê de `bigquery.Client` para a API legada (`insertAll`)."""
+
+    project = 'bench'
+
+    def __init__(self, network: FakeNetwork):
+        self.network = network
+        self.rows = 0
+
+    def get_table(self, table_ref: str) -> bigquery.Table:
+        return bigquery.Table(table_ref, schema=HISTORY_SCHEMA)
+
+    def insert_rows_json(self, table, json_rows, row_ids=None):
+        row_ids = row_ids or [uuid.uuid4().hex for _ in json_rows]
+        body = {'rows': [{'insertId': row_id, 'json': row} for row_id, row in zip(row_ids, json_rows, strict=True)]}
+        self.network.transfer(len(json.dumps(body).encode()))
+        self.rows += len(json_rows)
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeWriteServer:
+    """
+    Lado do serviço do Storage Write API: guarda quantas linhas cada stream já confirmou
+    e confere o offset de cada requisição.
+    """
+
+    def __init__(self, network: FakeNetwork, drop_rate: float = 0.0):
+        self.network = network
+        self.drop_rate = drop_rate
+        self.committed = {}
+        self.dropped_acks = 0
+
+    def append(self, write_stream: str, request) -> Future:
+        future = Future()
+        committed = self.committed.setdefault(write_stream, 0)
+        rows = len(request.proto_rows.rows.serialized_rows)
+        self.network.transfer(types.AppendRowsRequest.pb(request).ByteSize())
+
+        if request.offset < committed:
+            future.set_exception(exceptions.AlreadyExists(f'Offset {request.offset} já gravado'))
+        elif request.offset > committed:
+            future.set_exception(exceptions.OutOfRange(f'Offset {request.offset} além do fim do stream'))
+        else:
+            self.committed[write_stream] = committed + rows
+            if random.random() < self.drop_rate:
+                self.dropped_acks += 1
+                future.set_exception(StreamClosedError('Conexão encerrada antes da confirmação'))
+            else:
+                future.set_result(types.AppendRowsResponse())
+        return future
+
+    @property
+    def rows(self) -> int:
+        return sum(self.committed.values())
+
+
+class FakeAppendRowsStream:
+    """Dublê de `AppendRowsStream`: a primeira requisição leva o esquema do modelo inicial."""
+
+    def __init__(self, server: FakeWriteServer, template):
+        self.server = server
+        self.template = template
+        self._first = True
+
+    def send(self, request) -> Future:
+        if self._first:
+            self._first = False
+            first = types.AppendRowsRequest.pb(self.template).__deepcopy__()
+            first.MergeFrom(types.AppendRowsRequest.pb(request))
+            request = types.AppendRowsRequest.wrap(first)
+        return self.server.append(self.template.write_stream, request)
+
+    def close(self):
+        pass
+
+
+class _Transport:
+    def close(self):
+        pass
+
+
+class FakeWriteClient:
+    """Dublê de `BigQueryWriteClient`: cria os streams do tipo COMMITTED."""
+
+    def __init__(self):
+        self.transport = _Transport()
+        self._streams = 0
+
+    def create_write_stream(self, parent: str, write_stream):
+        self._streams += 1
+        return types.WriteStream(name=f'{parent}/streams/{self._streams}', type_=write_stream.type_)
+
+
+def build_rows(count: int) -> list:
+    rows = []
+    for index in range(count):
+        rows.append(
+            BigQueryStorage.build_row(
+                session_id=f'whatsapp:+5586999{index % 10000:06d}',
+                user_input=' '.join(random.choices(WORDS, k=random.randint(5, 25))),
+                response=' '.join(random.choices(WORDS, k=random.randint(20, 80))),
+                response_time=random.uniform(0.5, 12),
+                message_type=random.choice(['text', 'text', 'text', 'audio', 'image', 'location']),
+            )
+        )
+    return rows
+
+
+async def run_backend(backend: str, rows: list, args) -> dict:
+    network = FakeNetwork(args.rtt, args.bandwidth_mbps)
+    client = FakeBigQueryClient(network)
+    server = FakeWriteServer(network, drop_rate=args.drop_rate)
+    storage = BigQueryStorage(
+        backend=backend,
+        client=client,
+        write_client=FakeWriteClient(),
+        stream_factory=lambda template: FakeAppendRowsStream(server, template),
+    )
+
+    start = time.perf_counter()
+    for first in range(0, len(rows), args.batch_size):
+        batch = rows[first : first + args.batch_size]
+        result = await storage.insert_rows('history', 'chats', batch, row_ids=[uuid.uuid4().hex for _ in batch])
+        if not result.success:
+            raise SystemExit(f'{backend}: {result.error_message}')
+    elapsed = time.perf_counter() - start
+    storage.close()
+
+    written = client.rows if backend == 'legacy' else server.rows
+    if written != len(rows):
+        raise SystemExit(f'{backend}: {written} linhas gravadas de {len(rows)} enviadas')
+    return {
+        'backend': backend,
+        'rows_per_second': len(rows) / elapsed,
+        'bytes_sent': network.bytes_sent,
+        'bytes_per_row': network.bytes_sent / len(rows),
+        'requests': network.requests,
+        'dropped_acks': server.dropped_acks,
+    }
+
+
+async def main_async(args):
+    rows = build_rows(args.rows)
+    results = [await run_backend(backend, rows, args) for backend in ('legacy', 'write_api')]
+
+    print(
+        f'{args.rows} linhas em lotes de {args.batch_size} (rtt {args.rtt * 1000:.0f} ms, {args.bandwidth_mbps} Mbit/s)'
+    )
+    print(f'{"backend":<10} {"linhas/s":>10} {"MB enviados":>12} {"bytes/linha":>12} {"requisições":>12}')
+    for result in results:
+        print(
+            f'{result["backend"]:<10} {result["rows_per_second"]:>10.0f} {result["bytes_sent"] / 1e6:>12.2f} '
+            f'{result["bytes_per_row"]:>12.0f} {result["requests"]:>12}'
+        )
+    legacy, write_api = results
+    print(
+        f'Storage Write API: {write_api["rows_per_second"] / legacy["rows_per_second"]:.2f}x a vazão e '
+        f'{write_api["bytes_sent"] / legacy["bytes_sent"]:.2f}x os bytes da API legada'
+    )
+    if write_api['dropped_acks']:
+        print(f'{write_api["dropped_acks"]} confirmações perdidas reenviadas sem duplicar linhas')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000, help='Linhas gravadas por backend.')
+    parser.add_argument('--batch-size', type=int, default=500, help='Linhas por requisição.')
+    parser.add_argument('--rtt', type=float, default=0.03, help='Tempo de ida e volta por requisição, em segundos.')
+    parser.add_argument('--bandwidth-mbps', type=float, default=100, help='Banda de envio, em Mbit/s.')
+    parser.add_argument(
+        '--drop-rate', type=float, default=0.0, help='Fração das confirmações do Storage Write API perdidas.'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    logging.disable(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Benchmark dos backends de transcrição: fator de tempo real (RTF) e memória.
+
+Transcreve um conjunto de áudios em pt-BR com cada backend configurado e informa o tempo de
+carga, a memória residente depois da carga e o pico, o RTF (tempo de transcrição / duração do
+áudio; abaixo de 1 é mais rápido que o tempo real) e, para os áudios com transcrição de referência,
+a taxa de erro de palavras (WER).
+
+Cada backend roda em um processo próprio, de modo que a memória medida é só a dele. Os áudios são
+convertidos para WAV como no webhook (`AudioConverter`), antes da medição.
+
+O diretório de amostras contém os áudios (.ogg, .opus, .oga, .wav, .flac ou .mp3, ex.: notas de voz
+do WhatsApp ou um recorte do Common Voice pt) e, opcionalmente, a transcrição de referência de
+cada um em um arquivo .txt de mesmo nome.
+
+Uso (a partir do diretório `app`):
+    python -m benchmarks.bench_transcription --samples /dados/amostras_ptbr
+    python -m benchmarks.bench_transcription --samples /dados/amostras_ptbr --backends faster_whisper \\
+        --whisper-models small,medium --compute-types int8,float32
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import soundfile as sf
+
+from crud.features.audio_transcript import AudioConverter
+from crud.features.transcription import TRANSCRIBER_BACKENDS, create_transcriber
+
+AUDIO_EXTENSIONS = ('.ogg', '.opus', '.oga', '.wav', '.flac', '.mp3')
+
+
+def _rss_mb() -> float:
+    # Memória residente atual (Linux); nos demais sistemas, o pico é a única medida disponível.
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _words(text: str) -> list:
+    return re.sub(r'[^\w\s]', ' ', text.lower()).split()
+
+
+def word_errors(reference: str, hypothesis: str) -> tuple:
+    """
+    Calcula a distância de edição entre as palavras da referência e da transcrição.
+
+    Returns:
+        tuple: (erros, palavras da referência).
+    """
+    ref, hyp = _words(reference), _words(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def prepare_samples(directory: str) -> list:
+    """
+    Converte os áudios do diretório para WAV e lê a duração e a referência de cada um.
+
+    Returns:
+        list: Amostras com 'name', 'wav_path', 'seconds' e 'reference' (ou None).
+    """
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if extension.lower() not in AUDIO_EXTENSIONS:
+            continue
+        result = asyncio.run(AudioConverter.convert_ogg_to_wav(os.path.join(directory, name)))
+        if not result.success:
+            print(f'{name}: ignorado ({result.error_message})', file=sys.stderr)
+            continue
+        reference_path = os.path.join(directory, f'{stem}.txt')
+        reference = None
+        if os.path.exists(reference_path):
+            with open(reference_path, encoding='utf-8') as reference_file:
+                reference = reference_file.read().strip()
+        samples.append(
+            {
+                'name': name,
+                'wav_path': result.data,
+                'seconds': sf.info(result.data).duration,
+                'reference': reference,
+            }
+        )
+    return samples
+
+
+def measure_backend(label: str, backend: str, config: dict, samples: list, timeout: float, repeat: int) -> dict:
+    """
+    Carrega o backend e transcreve as amostras. Executado em um processo separado.
+    """
+    stats = {'label': label, 'backend': backend, 'config': config, 'rss_start_mb': _rss_mb()}
+    started_at = time.perf_counter()
+    try:
+        transcriber = create_transcriber(backend, **config)
+        transcriber.load()
+    except Exception as e:
+        stats['error'] = f'Falha ao carregar: {str(e).splitlines()[0]}'
+        return stats
+    stats['load_seconds'] = time.perf_counter() - started_at
+    stats['rss_loaded_mb'] = _rss_mb()
+
+    rtfs, failures, errors, reference_words = [], 0, 0, 0
+    transcribed_seconds = audio_seconds = 0.0
+    for sample in samples:
+        for attempt in range(repeat):
+            started_at = time.perf_counter()
+            result = asyncio.run(transcriber.transcribe_audio(sample['wav_path'], timeout=timeout))
+            elapsed = time.perf_counter() - started_at
+            if not result.success:
+                failures += 1
+                print(f'{label} {sample["name"]}: {result.error_message}', file=sys.stderr)
+                continue
+            rtfs.append(elapsed / sample['seconds'])
+            transcribed_seconds += elapsed
+            audio_seconds += sample['seconds']
+            if attempt == 0 and sample['reference'] is not None:
+                sample_errors, sample_words = word_errors(sample['reference'], result.data)
+                errors += sample_errors
+                reference_words += sample_words
+
+    stats.update(
+        {
+            'transcriptions': len(rtfs),
+            'failures': failures,
+            'audio_seconds': audio_seconds,
+            'rtf': transcribed_seconds / audio_seconds if audio_seconds else float('nan'),
+            'rtf_p50': percentile(rtfs, 0.5),
+            'rtf_p95': percentile(rtfs, 0.95),
+            'wer': errors / reference_words if reference_words else None,
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+    )
+    return stats
+
+
+def backend_runs(args) -> list:
+    """
+    Monta a lista de execuções: uma por backend e, no faster-whisper, uma por modelo e precisão.
+    """
+    runs = []
+    for backend in args.backends.split(','):
+        backend = backend.strip()
+        if backend not in TRANSCRIBER_BACKENDS:
+            raise SystemExit(f'Backend desconhecido: {backend} (opções: {", ".join(TRANSCRIBER_BACKENDS)})')
+        if backend != 'faster_whisper':
+            runs.append((backend, backend, {'language': args.language}))
+            continue
+        for model in args.whisper_models.split(','):
+            for compute_type in args.compute_types.split(','):
+                config = {
+                    'language': args.language,
+                    'model_size': model.strip(),
+                    'compute_type': compute_type.strip(),
+                    'cpu_threads': args.cpu_threads,
+                    'beam_size': args.beam_size,
+                    'vad_filter': not args.no_vad,
+                    'download_root': args.model_dir,
+                }
+                runs.append((f'whisper:{model.strip()}:{compute_type.strip()}', backend, config))
+    return runs
+
+
+def print_results(results: list, samples: list):
+    total_seconds = sum(sample['seconds'] for sample in samples)
+    print(f'{len(samples)} áudios, {total_seconds:.0f} s no total')
+    print(
+        f'{"backend":<26} {"carga (s)":>9} {"RSS (MB)":>9} {"pico (MB)":>9} '
+        f'{"RTF":>6} {"RTF p50":>8} {"RTF p95":>8} {"WER":>6} {"falhas":>7}'
+    )
+    for stats in results:
+        if 'error' in stats:
+            print(f'{stats["label"]:<26} {stats["error"]}')
+            continue
+        rss = stats['rss_loaded_mb'] - stats['rss_start_mb']
+        wer = f'{stats["wer"]:.1%}' if stats['wer'] is not None else '-'
+        print(
+            f'{stats["label"]:<26} {stats["load_seconds"]:>9.1f} {rss:>9.0f} {stats["peak_rss_mb"]:>9.0f} '
+            f'{stats["rtf"]:>6.2f} {stats["rtf_p50"]:>8.2f} {stats["rtf_p95"]:>8.2f} {wer:>6} {stats["failures"]:>7}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', required=True, help='Diretório com os áudios em pt-BR e as referências (.txt).')
+    parser.add_argument('--backends', default=','.join(TRANSCRIBER_BACKENDS), help='Backends separados por vírgula.')
+    parser.add_argument('--language', default='pt-BR')
+    parser.add_argument('--whisper-models', default='small', help='Modelos do faster-whisper, separados por vírgula.')
+    parser.add_argument('--compute-types', default='int8', help='Precisões do faster-whisper, separadas por vírgula.')
+    parser.add_argument('--cpu-threads', type=int, default=0, help='Threads por transcrição (0 = padrão).')
+    parser.add_argument('--beam-size', type=int, default=1)
+    parser.add_argument('--no-vad', action='store_true', help='Não remove os trechos sem fala.')
+    parser.add_argument('--model-dir', default=None, help='Diretório dos modelos do faster-whisper.')
+    parser.add_argument('--timeout', type=float, default=120, help='Tempo limite de cada transcrição, em segundos.')
+    parser.add_argument('--repeat', type=int, default=1, help='Transcrições de cada áudio.')
+    parser.add_argument('--json', help='Arquivo onde gravar os resultados.')
+    args = parser.parse_args()
+
+    runs = backend_runs(args)
+    samples = prepare_samples(args.samples)
+    if not samples:
+        raise SystemExit(f'Nenhum áudio em {args.samples}')
+
+    results = []
+    try:
+        for label, backend, config in runs:
+            # Um processo novo por backend: a memória de um modelo não contamina a medida do seguinte.
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results.append(
+                    executor.submit(
+                        measure_backend, label, backend, config, samples, args.timeout, args.repeat
+                    ).result()
+                )
+    finally:
+        for sample in samples:
+            os.remove(sample['wav_path'])
+
+    print_results(results, samples)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'args': vars(args), 'results': results}, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Teste de carga offline do webhook `predict_twilio_190`.
+
+Sobe a aplicação FastAPI no próprio processo (sem servidor HTTP nem rede), com dublês locais
+para todas as dependências externas: modelo de chat falso registrado no `LLMFactory` (latência
+e chamadas de ferramenta configuráveis), Redis em memória, Twilio, BigQuery, Cloud Storage,
+Gemini, Google Maps, transcrição de áudio e API LUPA. Reproduz uma mistura configurável de
+mensagens de texto, localização, imagem e áudio a uma taxa alvo e informa a vazão e as
+latências p50/p95/p99 por tipo de mensagem.
+
+Duas latências são medidas por mensagem: `ack`, até a resposta HTTP do webhook, e `resposta`,
+até a resposta chegar ao usuário (no TwiML ou, para as processadas em segundo plano, no envio
+pela API do Twilio).
+
+Requer `fakeredis[lua]` além das dependências da aplicação.
+
+Uso (a partir do diretório `app`):
+    python -m benchmarks.load_twilio --rate 20 --duration 30 --mix text=70,location=10,image=10,audio=10
+    python -m benchmarks.load_twilio --rate 50 --llm-latency 1.2 --early-ack --json resultado.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+WEBHOOK_PATH = '/api/v1/agent_twilio_190/predict_twilio_190'
+
+MESSAGE_TYPES = ('text', 'location', 'image', 'audio')
+
+TEXT_MESSAGES = (
+    'Olá, preciso de ajuda',
+    'Estão brigando na frente da minha casa',
+    'Roubaram meu celular agora há pouco na parada de ônibus',
+    'Tem um carro suspeito parado na rua há horas',
+    'Meu vizinho está com som alto desde ontem',
+)
+
+# Valores fictícios para as configurações obrigatórias, usados apenas se não estiverem definidas.
+_REQUIRED_ENV = {
+    'PROJECT_ID': 'load-test',
+    'LOCATION': 'us-central1',
+    'LANGSMITH_ENDPOINT': 'http://localhost',
+    'LANGSMITH_PROJECT': 'load-test',
+    'LANGSMITH_API_KEY': 'load-test',
+    'ACCOUNT_SID': 'ACload-test',
+    'TWILIO_AUTH_TOKEN': 'load-test',
+    'OPENAI_API_KEY': 'load-test',
+    'MARITALK_API_KEY': 'load-test',
+    'ANTHROPIC_API_KEY': 'load-test',
+    'DEEPSEEK_API_KEY': 'load-test',
+    'XAI_API_KEY': 'load-test',
+    'USERAUDIO': 'load-test',
+    'PASSWORD': 'load-test',
+    'GOOGLE_MAPS_API_KEY': 'load-test',
+    'BASE_URL': 'http://lupa.local',
+    'LUPA_API_KEY': 'load-test',
+    'REDIS_HOST': 'localhost',
+    'REDIS_PASSWORD': 'load-test',
+}
+
+
+def parse_mix(value: str) -> dict:
+    """
+    Converte a mistura de tipos de mensagem ('text=70,audio=10,...') em pesos por tipo.
+    """
+    mix = {}
+    for entry in value.split(','):
+        message_type, _, weight = entry.strip().partition('=')
+        if message_type not in MESSAGE_TYPES:
+            raise argparse.ArgumentTypeError(f'Tipo de mensagem inválido: {message_type}')
+        mix[message_type] = float(weight or 1)
+    return mix
+
+
+def random_cpf(found: bool = True) -> str:
+    """
+    Gera um CPF válido. Os terminados em '00' são tratados como não localizados pelo dublê da LUPA.
+    """
+    while True:
+        digits = [random.randint(0, 9) for _ in range(9)]
+        for length in (9, 10):
+            total = sum(digit * weight for digit, weight in zip(digits, range(length + 1, 1, -1), strict=True))
+            digits.append(total * 10 % 11 % 10)
+        cpf = ''.join(map(str, digits))
+        if len(set(cpf)) > 1 and cpf.endswith('00') != found:
+            return f'{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}'
+
+
+def build_form(message_type: str, from_number: str, cpf_ratio: float) -> dict:
+    """
+    Monta os campos do formulário que o Twilio envia ao webhook para o tipo de mensagem.
+    """
+    form = {'From': from_number, 'To': 'whatsapp:+14155238886', 'NumMedia': '0', 'Body': ''}
+    if message_type == 'text':
+        form['Body'] = random.choice(TEXT_MESSAGES)
+        if random.random() < cpf_ratio:
+            form['Body'] = f'Meu CPF é {random_cpf(found=random.random() < 0.9)}'
+    elif message_type == 'location':
+        form['Latitude'] = f'{-5.09 + random.uniform(-0.05, 0.05):.6f}'
+        form['Longitude'] = f'{-42.80 + random.uniform(-0.05, 0.05):.6f}'
+    else:
+        content_type = 'image/jpeg' if message_type == 'image' else 'audio/ogg'
+        form.update(
+            NumMedia='1', MediaContentType0=content_type, MediaUrl0=f'http://media.local/{message_type}/{time.time()}'
+        )
+    return form
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def install_standins(clients, args):
+    """
+    Substitui os clientes do registro e as funções do endpoint pelos dublês locais.
+
+    Returns:
+        tuple: Registro de entregas do Twilio e dublê do BigQuery.
+    """
+    from api.v1.endpoints import agent_190_twilio
+    from benchmarks import standins
+    from crud.adapters.admission import AdmissionController
+    from crud.adapters.factory import LLMFactory
+    from crud.adapters.routing_adapter import RoutingLLMAdapter
+    from crud.tools.get_person_data import lupa_client
+
+    latencies = standins.StubLatencies(
+        twilio=args.twilio_latency,
+        bigquery=args.bigquery_latency,
+        cloud_storage=args.storage_latency,
+        gemini=args.gemini_latency,
+        maps=args.maps_latency,
+        transcription=args.transcription_latency,
+        lupa=args.lupa_latency,
+    )
+    deliveries = standins.DeliveryLog()
+    bq_storage = standins.StubBigQueryStorage(latencies.bigquery, failure_rate=args.bigquery_failure_rate)
+
+    factory_result = LLMFactory.create_llm_adapter(
+        'fake',
+        clients.tools,
+        latency_seconds=args.llm_latency,
+        latency_jitter_seconds=args.llm_jitter,
+        tool_call_probability=args.tool_call_probability,
+        admission=AdmissionController(
+            name='fake',
+            max_concurrency=clients.settings.llm_max_concurrency,
+            max_queue=clients.settings.llm_max_queue,
+            deadline_seconds=clients.settings.llm_deadline_seconds,
+        ),
+    )
+    if not factory_result.success:
+        raise SystemExit(factory_result.error_message)
+
+    clients.override(
+        redis_pool=standins.fake_redis_pool(),
+        twilio_client=standins.StubTwilioClient(latencies.twilio, deliveries),
+        llm_adapter=RoutingLLMAdapter(providers=[('fake', factory_result.data)]),
+        cloud_uploader=standins.StubCloudUploader(latencies.cloud_storage),
+        bq_storage=bq_storage,
+        gemini_vision=standins.StubGeminiVision(latencies.gemini),
+    )
+    lupa_client.transport = standins.lupa_transport(latencies.lupa)
+
+    agent_190_twilio.geocode_reverse = standins.stub_geocode_reverse(latencies.maps)
+    downloader, transcriber = standins.stub_audio_pipeline(latencies.transcription, standins.write_sample_audio())
+    agent_190_twilio.AudioDownloader = downloader
+    clients.override(transcriber=transcriber)
+    return deliveries, bq_storage
+
+
+async def send_message(client, deliveries, index: int, message_type: str, form: dict, background: bool, args):
+    """
+    Envia uma mensagem ao webhook e mede as latências de confirmação e de resposta.
+    """
+    from benchmarks.standins import current_request
+
+    request_id = f'msg-{index}'
+    current_request.set(request_id)
+    delivery = deliveries.expect(request_id) if background else None
+    sample = {'type': message_type, 'ack': None, 'reply': None, 'error': None, 'body': None}
+
+    started_at = time.perf_counter()
+    try:
+        response = await client.post(WEBHOOK_PATH, data=form)
+        sample['ack'] = time.perf_counter() - started_at
+        if response.status_code != 200:
+            sample['error'] = f'HTTP {response.status_code}'
+            return sample
+        if background:
+            delivered_at, sample['body'] = await asyncio.wait_for(delivery, timeout=args.reply_timeout)
+            sample['reply'] = delivered_at - started_at
+        else:
+            sample['reply'] = sample['ack']
+            sample['body'] = ET.fromstring(response.text).findtext('Message')
+    except asyncio.TimeoutError:
+        sample['error'] = 'sem resposta'
+    except Exception as e:
+        sample['error'] = type(e).__name__
+    return sample
+
+
+async def run_load(app, clients, deliveries, args) -> tuple:
+    """
+    Gera a carga em malha aberta: as mensagens são enviadas na taxa alvo, independentemente de
+    as anteriores já terem terminado.
+
+    Returns:
+        tuple: Amostras coletadas e duração total, em segundos.
+    """
+    import httpx
+
+    types, weights = zip(*args.mix.items(), strict=True)
+    total = int(args.rate * args.duration)
+    sessions = [f'whatsapp:+5586{9_0000_0000 + i}' for i in range(args.sessions)]
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://load-test', timeout=None) as client:
+        tasks = []
+        started_at = time.perf_counter()
+        next_at = started_at
+        for index in range(total):
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            message_type = random.choices(types, weights)[0]
+            background = clients.settings.twilio_early_ack or message_type == 'audio'
+            form = build_form(message_type, random.choice(sessions), args.cpf_ratio)
+            tasks.append(
+                asyncio.create_task(send_message(client, deliveries, index, message_type, form, background, args))
+            )
+            interval = random.expovariate(args.rate) if args.arrival == 'poisson' else 1 / args.rate
+            next_at += interval
+
+        samples = await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started_at
+    return samples, elapsed
+
+
+def summarize(samples: list, elapsed: float, degraded_prefixes: tuple) -> dict:
+    """
+    Agrupa as amostras por tipo de mensagem.
+    """
+    groups = {message_type: [s for s in samples if s['type'] == message_type] for message_type in MESSAGE_TYPES}
+    groups['total'] = samples
+
+    summary = {}
+    for name, group in groups.items():
+        if not group:
+            continue
+        completed = [s for s in group if s['error'] is None]
+        acks = [s['ack'] * 1000 for s in group if s['ack'] is not None]
+        replies = [s['reply'] * 1000 for s in completed]
+        summary[name] = {
+            'sent': len(group),
+            'errors': len(group) - len(completed),
+            'degraded': sum(1 for s in completed if (s['body'] or '').startswith(degraded_prefixes)),
+            'throughput': len(completed) / elapsed,
+            'ack_ms': {q: percentile(acks, p) for q, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+            'reply_ms': {q: percentile(replies, p) for q, p in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))},
+        }
+    return summary
+
+
+def print_summary(summary: dict, elapsed: float, bq_rows: int, bq_batches: int):
+    print(f'\nduração: {elapsed:.1f} s  linhas no BigQuery: {bq_rows} (em {bq_batches} lotes)')
+    print(
+        f'{"tipo":<9} {"enviadas":>8} {"erros":>6} {"degrad.":>7} {"msg/s":>7}  '
+        f'{"ack p50/p95/p99 (ms)":>24}  {"resposta p50/p95/p99 (ms)":>27}'
+    )
+    for name, row in summary.items():
+        ack = '/'.join(f'{row["ack_ms"][q]:.0f}' for q in ('p50', 'p95', 'p99'))
+        reply = '/'.join(f'{row["reply_ms"][q]:.0f}' for q in ('p50', 'p95', 'p99'))
+        print(
+            f'{name:<9} {row["sent"]:>8} {row["errors"]:>6} {row["degraded"]:>7} {row["throughput"]:>7.2f}  '
+            f'{ack:>24}  {reply:>27}'
+        )
+
+
+def summarize_stages(stage_timings: list) -> dict:
+    """
+    Calcula os percentis de cada etapa a partir dos tempos registrados com os turnos.
+    """
+    durations = {}
+    for timings in stage_timings:
+        for stage, ms in timings.items():
+            durations.setdefault(stage, []).append(ms)
+    return {
+        stage: {'turns': len(values), 'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95)}
+        for stage, values in sorted(durations.items(), key=lambda item: -percentile(item[1], 0.95))
+    }
+
+
+def print_stages(stages: dict):
+    print(f'\n{"etapa":<16} {"turnos":>7} {"p50 (ms)":>9} {"p95 (ms)":>9}')
+    for stage, row in stages.items():
+        print(f'{stage:<16} {row["turns"]:>7} {row["p50"]:>9.0f} {row["p95"]:>9.0f}')
+
+
+async def main_async(args):
+    for name, value in _REQUIRED_ENV.items():
+        os.environ.setdefault(name, value)
+    os.environ['LANGSMITH_TRACING'] = 'false'
+    os.environ['LANGCHAIN_TRACING_V2'] = 'false'
+
+    from api.v1.dependencies import clients
+    from crud.adapters.admission import BUSY_MESSAGE
+    from main import app
+
+    clients.settings.twilio_early_ack = args.early_ack
+    clients.settings.history_spool_dir = tempfile.mkdtemp(prefix='history_spool_')
+    deliveries, bq_storage = install_standins(clients, args)
+
+    # O AgentExecutor imprime cada passo no stdout; durante a carga isso só atrapalha a leitura.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        async with app.router.lifespan_context(app):
+            samples, elapsed = await run_load(app, clients, deliveries, args)
+            # Aguarda o registro das mensagens processadas em segundo plano; o encerramento da
+            # aplicação grava no BigQuery o que ainda estiver no buffer do histórico.
+            await asyncio.sleep(args.bigquery_latency * 2)
+
+    summary = summarize(samples, elapsed, degraded_prefixes=('Erro', BUSY_MESSAGE))
+    print_summary(summary, elapsed, bq_storage.rows, bq_storage.batches)
+    stages = summarize_stages(bq_storage.stage_timings)
+    print_stages(stages)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(
+                {'args': {k: v for k, v in vars(args).items() if k != 'json'}, 'summary': summary, 'stages': stages},
+                output,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=10, help='Mensagens por segundo.')
+    parser.add_argument('--duration', type=float, default=30, help='Duração da geração de carga, em segundos.')
+    parser.add_argument('--mix', type=parse_mix, default='text=70,location=10,image=10,audio=10')
+    parser.add_argument('--arrival', choices=('uniform', 'poisson'), default='poisson')
+    parser.add_argument('--sessions', type=int, default=200, help='Quantidade de remetentes distintos.')
+    parser.add_argument('--cpf-ratio', type=float, default=0.3, help='Fração das mensagens de texto com CPF.')
+    parser.add_argument('--early-ack', action='store_true', help='Processa todos os tipos em segundo plano.')
+    parser.add_argument('--reply-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', help='Arquivo onde gravar o resumo em JSON.')
+
+    latency = parser.add_argument_group('latências dos dublês (segundos)')
+    latency.add_argument('--llm-latency', type=float, default=0.8)
+    latency.add_argument('--llm-jitter', type=float, default=0.3)
+    latency.add_argument('--tool-call-probability', type=float, default=1.0)
+    latency.add_argument('--twilio-latency', type=float, default=0.15)
+    latency.add_argument('--bigquery-latency', type=float, default=0.05)
+    latency.add_argument(
+        '--bigquery-failure-rate', type=float, default=0.0, help='Fração dos lotes recusados pelo BigQuery.'
+    )
+    latency.add_argument('--storage-latency', type=float, default=0.2)
+    latency.add_argument('--gemini-latency', type=float, default=1.5)
+    latency.add_argument('--maps-latency', type=float, default=0.1)
+    latency.add_argument('--transcription-latency', type=float, default=1.0)
+    latency.add_argument('--lupa-latency', type=float, default=0.3)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    logging.disable(logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Dublês locais das dependências externas usados pelo teste de carga `benchmarks.load_twilio`.
+
+Cada dublê imita a interface do cliente real e apenas aguarda uma latência configurável,
+sem acessar a rede: Twilio, BigQuery, Cloud Storage, Gemini, Google Maps, transcrição de áudio,
+API LUPA (via transporte HTTP local) e Redis (em memória, com `fakeredis`).
+"""
+
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+import httpx
+import numpy as np
+import soundfile as sf
+
+from utils.result import Result
+from utils.timing import timed_stage
+
+# Identificador da mensagem do teste de carga em processamento. Propaga-se da requisição para as
+# tarefas em segundo plano e para as threads, e permite associar a resposta enviada à mensagem.
+current_request: ContextVar[Optional[str]] = ContextVar('bench_current_request', default=None)
+
+
+def _jittered(seconds: float) -> float:
+    return max(random.uniform(0.8, 1.2) * seconds, 0.0)
+
+
+async def _within(latency: float, timeout: Optional[float]) -> bool:
+    """
+    Aguarda a latência do dublê, respeitando o tempo limite recebido da etapa.
+
+    Returns:
+        bool: False se o tempo limite for atingido antes.
+    """
+    try:
+        await asyncio.wait_for(asyncio.sleep(_jittered(latency)), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+class StubLatencies:
+    """
+    Latências médias, em segundos, de cada dublê (com variação de ±20% por chamada).
+    """
+
+    def __init__(
+        self,
+        twilio: float = 0.15,
+        bigquery: float = 0.05,
+        cloud_storage: float = 0.2,
+        gemini: float = 1.5,
+        maps: float = 0.1,
+        transcription: float = 1.0,
+        lupa: float = 0.3,
+    ):
+        self.twilio = twilio
+        self.bigquery = bigquery
+        self.cloud_storage = cloud_storage
+        self.gemini = gemini
+        self.maps = maps
+        self.transcription = transcription
+        self.lupa = lupa
+
+
+class DeliveryLog:
+    """
+    Registra o instante (time.perf_counter()) em que a resposta de cada mensagem foi entregue
+    ao dublê do Twilio.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def expect(self, request_id: str) -> asyncio.Future:
+        """
+        Retorna o futuro resolvido com o instante e o texto da entrega da resposta da mensagem.
+        """
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        with self._lock:
+            self._waiters[request_id] = future
+        return future
+
+    def record(self, request_id: Optional[str], body: str):
+        delivered_at = time.perf_counter()
+        with self._lock:
+            future = self._waiters.pop(request_id, None)
+        if future is not None:
+            self._loop.call_soon_threadsafe(
+                lambda: future.done() or future.set_result((delivered_at, body)),
+            )
+
+
+class _StubMessages:
+    def __init__(self, latency: float, deliveries: DeliveryLog):
+        self.latency = latency
+        self.deliveries = deliveries
+
+    def create(self, body: str, from_: str, to: str):
+        # Chamado em uma thread pelo endpoint, como o cliente real.
+        time.sleep(_jittered(self.latency))
+        self.deliveries.record(current_request.get(), body)
+        return _Sid(f'SM{uuid.uuid4().hex}')
+
+
+class _Sid:
+    def __init__(self, sid: str):
+        self.sid = sid
+
+
+class _Closeable:
+    session = None
+
+    def close(self):
+        pass
+
+
+class StubTwilioClient:
+    """Dublê de `twilio.rest.Client`: `messages.create` aguarda a latência e registra a entrega."""
+
+    def __init__(self, latency: float, deliveries: DeliveryLog):
+        self.messages = _StubMessages(latency, deliveries)
+        self.http_client = _Closeable()
+
+
+class StubBigQueryStorage:
+    """
+    Dublê de `BigQueryStorage` que apenas conta as linhas e os lotes recebidos e guarda os tempos
+    por etapa (`stage_timings`) de cada turno.
+
+    Recusa cada lote com a probabilidade `failure_rate` e, como o BigQuery, ignora as linhas
+    cuja chave de deduplicação já foi recebida.
+    """
+
+    def __init__(self, latency: float, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.batches = 0
+        self.stage_timings = []
+        self._row_ids = set()
+
+    @property
+    def rows(self) -> int:
+        return len(self._row_ids)
+
+    async def insert_rows(self, dataset_id: str, table_id: str, rows: list, row_ids: Optional[list] = None) -> Result:
+        await asyncio.sleep(_jittered(self.latency))
+        if random.random() < self.failure_rate:
+            return Result.fail(error_message='BigQuery indisponível (dublê).')
+        for row_id, row in zip(row_ids or [uuid.uuid4().hex for _ in rows], rows, strict=True):
+            if row_id in self._row_ids:
+                continue
+            self._row_ids.add(row_id)
+            if row.get('stage_timings'):
+                self.stage_timings.append(json.loads(row['stage_timings']))
+        self.batches += 1
+        return Result.ok(data=None)
+
+    async def ensure_table(self, dataset_id: str, table_id: str) -> Result:
+        return Result.ok(data=[])
+
+    def close(self):
+        pass
+
+
+class StubCloudUploader:
+    """Dublê de `CloudUploader`."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.storage_client = _Closeable()
+
+    @timed_stage('audio_upload')
+    async def upload_to_cloud_storage(self, file_path: str, folder: str, timeout: Optional[float] = None) -> Result:
+        if not await _within(self.latency, timeout):
+            return Result.fail(error_message='Tempo esgotado (dublê do Cloud Storage).')
+        return Result.ok(data=f'{folder}/{uuid.uuid1()}')
+
+
+class StubGeminiVision:
+    """Dublê de `GeminiVision`."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def _init_gemini_once(self):
+        pass
+
+    @timed_stage('image_download')
+    async def fetch_image(self, media_url: str, timeout: Optional[float] = None) -> Result:
+        return Result.ok(data=b'\xff\xd8\xff\xe0')
+
+    @timed_stage('gemini')
+    async def perform_gemini(self, image_content: bytes, timeout: Optional[float] = None) -> Result:
+        if not await _within(self.latency, timeout):
+            return Result.fail(error_message='Tempo esgotado (dublê do Gemini).')
+        return Result.ok(data='A imagem mostra um carro com o vidro quebrado estacionado em uma rua.')
+
+
+def stub_geocode_reverse(latency: float):
+    """Cria o dublê de `crud.features.maps.geocode_reverse`."""
+
+    @timed_stage('geocode')
+    async def geocode_reverse(latitude, longitude, timeout: Optional[float] = None) -> Result:
+        if not await _within(latency, timeout):
+            return Result.fail(error_message='Tempo esgotado (dublê do Google Maps).')
+        return Result.ok(data='Av. Frei Serafim, 2280 - Centro, Teresina - PI, 64001-020, Brasil')
+
+    return geocode_reverse
+
+
+def stub_audio_pipeline(latency: float, sample_path: str):
+    """
+    Cria os dublês de download e transcrição de áudio. A conversão OGG → WAV continua sendo a real,
+    feita sobre um áudio de exemplo gerado localmente.
+
+    Returns:
+        tuple: Classe que substitui `AudioDownloader` no endpoint e transcritor a ser registrado
+            no lugar do `Transcriber`.
+    """
+
+    class StubAudioDownloader:
+        @staticmethod
+        @timed_stage('audio_download')
+        async def download_audio(media_url: str, timeout: Optional[float] = None) -> Result:
+            return Result.ok(data=sample_path)
+
+    class StubTranscriber:
+        name = 'stub'
+
+        def load(self):
+            pass
+
+        @timed_stage('transcription')
+        async def transcribe_audio(self, wav_path: str, timeout: Optional[float] = None) -> Result:
+            transcribed = await _within(latency, timeout)
+            # O arquivo WAV convertido não é usado depois da transcrição.
+            os.remove(wav_path)
+            if not transcribed:
+                return Result.fail(error_message='Tempo esgotado (dublê da transcrição).')
+            return Result.ok(data='Tem uma pessoa tentando arrombar a casa do meu vizinho agora.')
+
+    return StubAudioDownloader, StubTranscriber()
+
+
+def write_sample_audio(seconds: float = 5.0, sample_rate: int = 16000) -> str:
+    """
+    Gera um áudio OGG de exemplo (um tom de 440 Hz) e retorna o caminho do arquivo.
+    """
+    samples = np.sin(2 * np.pi * 440 * np.arange(int(seconds * sample_rate)) / sample_rate) * 0.2
+    with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as sample_file:
+        sf.write(sample_file.name, samples, sample_rate, format='OGG')
+        return sample_file.name
+
+
+def lupa_transport(latency: float) -> httpx.MockTransport:
+    """
+    Transporte HTTP local que responde como a API LUPA: CPFs terminados em '00' não são
+    localizados e os demais retornam um cadastro fictício.
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(_jittered(latency))
+        cpf = request.url.params.get('cpf', '')
+        if cpf.endswith('00'):
+            return httpx.Response(404)
+        return httpx.Response(200, json={'cpf': cpf, 'nome': 'Pessoa de Teste', 'situacao': 'REGULAR'})
+
+    return httpx.MockTransport(handler)
+
+
+def fake_redis_pool():
+    """
+    Cria um pool de conexões Redis em memória, com suporte aos scripts Lua da fila por sessão.
+
+    Requer `fakeredis[lua]`, que não faz parte das dependências da aplicação.
+    """
+    try:
+        import fakeredis
+        import redis.asyncio as redis
+    except ImportError as e:
+        raise SystemExit("O teste de carga requer 'fakeredis[lua]': pip install 'fakeredis[lua]'") from e
+
+    return redis.ConnectionPool(connection_class=fakeredis.aioredis.FakeConnection, server=fakeredis.FakeServer())
@@ -1,17 +1,33 @@
 import logging
+from contextlib import nullcontext
+from typing import Optional
 
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.prompts import MessagesPlaceholder
-from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain.agents import AgentExecutor
+from langchain.agents.format_scratchpad.tools import format_to_tool_messages
+from langchain.agents.output_parsers.tools import ToolsAgentOutputParser
+from langchain_core.runnables import RunnablePassthrough
 
 from langchain_openai import ChatOpenAI
 
 # from langchain_ollama import ChatOllama
-# from langchain_anthropic import ChatAnthropic
+from langchain_anthropic import ChatAnthropic
 from langchain_google_vertexai import ChatVertexAI
 from langchain_deepseek import ChatDeepSeek
 from langchain_community.chat_models import ChatMaritalk
+from crud.adapters.admission import (
+    ADMISSION_REJECTED,
+    BUSY_MESSAGE,
+    LOCAL_REJECTION_REASONS,
+    AdmissionController,
+    AdmissionRejected,
+)
+from crud.adapters.callbacks import LLMMetricsHandler, model_label, provider_label
+from utils.prompts import PROMPT_CURRENT_DATE
 from utils.result import Result
+from utils.timing import timed_stage
 
 logging.basicConfig(
     level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler()]
@@ -26,57 +42,215 @@ class LangChainLLMAdapter:
     Esta classe encapsula a lógica de geração de respostas para diferentes
     modelos de linguagem como OpenAI, Anthropic, VertexAI, etc.
 
+    O agente (prompt, esquema das ferramentas e executor) é compilado uma única vez para cada
+    combinação de prompt de sistema e conjunto de ferramentas e reutilizado nos turnos seguintes.
+
+    O prompt de sistema é enviado literalmente e antes de qualquer parte variável (data, histórico),
+    de modo que o prefixo das requisições seja idêntico entre turnos e sessões e possa ser servido
+    do cache de prompts do provedor.
+
     Attributes:
         llm: Instância do modelo LangChain configurado.
         tools: Ferramentas disponíveis para o modelo utilizar.
     """
 
-    def __init__(self, llm, tools):
+    def __init__(self, llm, tools, admission: Optional[AdmissionController] = None):
         """
         Inicializa o adaptador com uma instância do modelo LangChain e um conjunto de ferramentas.
 
         Args:
             llm: Instância do modelo LangChain (ex.: ChatOpenAI, ChatOllama).
-            tools: Instância de Tools (ou similar) que contenha as ferramentas necessárias.
+            tools: Registro de ferramentas (Tools) disponíveis para o modelo.
+            admission (AdmissionController, opcional): Controle de admissão das chamadas ao provedor.
+                Se None, as chamadas não são limitadas.
         """
         self.llm = llm
         self.tools = tools
+        self.admission = admission
+        self._agent_executors = {}
+        self._metrics_handler = LLMMetricsHandler(provider_label(llm), model_label(llm))
 
-    def generate_response(self, input_text: str, chat_history: list, context: dict) -> Result:
+    def _system_prefix(self, system_prompt: str) -> SystemMessage:
         """
-        Gera uma resposta do modelo.
+        Monta a mensagem de sistema fixa, marcada para cache quando o provedor exige marcação explícita.
 
         Args:
-            input_text (str): Texto de entrada do usuário.
-            chat_history (list): Histórico do chat.
-            context (dict): Contexto adicional, como prompts ou data.
+            system_prompt (str): Prompt de sistema do agente, sem variáveis.
 
         Returns:
-            Result: Resultado contendo sucesso ou falha e a resposta gerada.
+            SystemMessage: Mensagem usada como prefixo estável do prompt.
         """
-        try:
+        if isinstance(self.llm, ChatAnthropic):
+            return SystemMessage(
+                content=[{'type': 'text', 'text': system_prompt, 'cache_control': {'type': 'ephemeral'}}]
+            )
+        return SystemMessage(content=system_prompt)
+
+    def _get_agent_executor(self, system_prompt: str) -> AgentExecutor:
+        """
+        Retorna o executor do agente para o prompt de sistema informado, compilando-o na primeira vez.
+
+        Args:
+            system_prompt (str): Prompt de sistema do agente.
+
+        Returns:
+            AgentExecutor: Executor pronto para ser invocado.
+        """
+        tools = self.tools.as_list()
+        cache_key = (system_prompt, tuple(tool.name for tool in tools))
+
+        agent_executor = self._agent_executors.get(cache_key)
+        if agent_executor is None:
             prompt = ChatPromptTemplate.from_messages(
                 [
-                    ('system', context.get('system_prompt', '')),
+                    self._system_prefix(system_prompt),
+                    ('system', PROMPT_CURRENT_DATE),
                     MessagesPlaceholder(variable_name='chat_history'),
                     ('human', '{input}'),
+                    # Chamadas de ferramentas já resolvidas antes do agente (ex.: consulta antecipada de CPF).
+                    MessagesPlaceholder(variable_name='prefetched_steps', optional=True),
                     MessagesPlaceholder(variable_name='agent_scratchpad'),
                 ]
             )
+            # Mesma composição de `create_tool_calling_agent`, com cada chamada ao modelo passando
+            # pelo controle de admissão do provedor.
+            llm_with_tools = self.llm.bind_tools(tools)
+            if self.admission is not None:
+                llm_with_tools = self.admission.wrap(llm_with_tools)
+            agent = (
+                RunnablePassthrough.assign(agent_scratchpad=lambda x: format_to_tool_messages(x['intermediate_steps']))
+                | prompt
+                | llm_with_tools
+                | ToolsAgentOutputParser()
+            )
+            # Sem streaming, a resposta de todos os provedores traz o uso de tokens (incluindo o cache).
+            agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True, stream_runnable=False)
+            self._agent_executors[cache_key] = agent_executor
+
+        return agent_executor
+
+    def warmup(self, system_prompt: str):
+        """
+        Compila antecipadamente o agente para o prompt de sistema informado.
+
+        Args:
+            system_prompt (str): Prompt de sistema do agente.
+        """
+        self._get_agent_executor(system_prompt)
+
+    def _agent_inputs(self, input_text: str, chat_history: list, context: dict) -> dict:
+        return {
+            'input': input_text,
+            'chat_history': chat_history,
+            'data': context.get('date'),
+            'prefetched_steps': context.get('prefetched_messages', []),
+        }
+
+    def _extract_output(self, response: dict) -> str:
+        """
+        Extrai o texto final da resposta do executor, conforme o formato do provedor.
+
+        Args:
+            response (dict): Saída do AgentExecutor.
 
-            agent = create_tool_calling_agent(llm=self.llm, tools=[self.tools.get_person_data_tool], prompt=prompt)
+        Returns:
+            str: Texto da resposta do modelo.
+        """
+        if isinstance(self.llm, (ChatDeepSeek, ChatVertexAI, ChatOpenAI, ChatMaritalk)) or isinstance(
+            response['output'], str
+        ):
+            return response['output']
 
-            agent_executor = AgentExecutor(agent=agent, tools=[self.tools.get_person_data_tool], verbose=True)
+        logger.info(f'Response from model: {response}')
+
+        return response['output'][0]['text']
+
+    def generate_response(self, input_text: str, chat_history: list, context: dict) -> Result:
+        """
+        Gera uma resposta do modelo.
+
+        Args:
+            input_text (str): Texto de entrada do usuário.
+            chat_history (list): Histórico do chat.
+            context (dict): Contexto adicional, como prompts ou data.
+
+        Returns:
+            Result: Resultado contendo sucesso ou falha e a resposta gerada.
+        """
+        try:
+            agent_executor = self._get_agent_executor(context.get('system_prompt', ''))
 
             response = agent_executor.invoke(
-                {'input': input_text, 'chat_history': chat_history, 'data': context.get('date')}
+                self._agent_inputs(input_text, chat_history, context),
+                config={'callbacks': [self._metrics_handler]},
             )
 
-            if isinstance(self.llm, (ChatDeepSeek, ChatVertexAI, ChatOpenAI, ChatMaritalk)):
-                return Result.ok(data=response['output'])
+            return Result.ok(data=self._extract_output(response))
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao gerar resposta: {str(e)}')
+
+    async def asummarize(self, messages: list) -> Result:
+        """
+        Faz uma chamada simples ao modelo, sem o agente e as ferramentas, sob o controle de admissão
+        do provedor (ex.: para resumir o histórico da sessão).
+
+        Args:
+            messages (list): Mensagens LangChain enviadas ao modelo.
+
+        Returns:
+            Result: Resultado contendo o texto gerado ou o erro.
+        """
+        config = {'callbacks': [self._metrics_handler]}
+        try:
+            if self.admission is None:
+                response = await self.llm.ainvoke(messages, config=config)
+            else:
+                with self.admission.turn():
+                    response = await self.admission.run(lambda: self.llm.ainvoke(messages, config=config))
+        except AdmissionRejected as e:
+            logger.warning(f'Resumo não gerado por falta de capacidade: {e}')
+            error_code = ADMISSION_REJECTED if e.reason in LOCAL_REJECTION_REASONS else None
+            return Result.fail(error_message=BUSY_MESSAGE, error_code=error_code)
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao gerar resumo: {str(e)}')
+
+        if isinstance(response.content, str):
+            return Result.ok(data=response.content)
+        # Provedores como a Anthropic devolvem uma lista de blocos de conteúdo.
+        return Result.ok(
+            data=''.join(block.get('text', '') if isinstance(block, dict) else str(block) for block in response.content)
+        )
+
+    @timed_stage('agent')
+    async def agenerate_response(self, input_text: str, chat_history: list, context: dict) -> Result:
+        """
+        Gera uma resposta do modelo de forma assíncrona.
+
+        Usa as APIs assíncronas do LangChain (modelo e ferramentas), de modo que o event loop
+        continua atendendo outras requisições enquanto aguarda o provedor.
+
+        Args:
+            input_text (str): Texto de entrada do usuário.
+            chat_history (list): Histórico do chat.
+            context (dict): Contexto adicional, como prompts ou data.
+
+        Returns:
+            Result: Resultado contendo sucesso ou falha e a resposta gerada.
+        """
+        try:
+            agent_executor = self._get_agent_executor(context.get('system_prompt', ''))
 
-            logger.info(f'Response from model: {response}')
+            with self.admission.turn() if self.admission is not None else nullcontext():
+                response = await agent_executor.ainvoke(
+                    self._agent_inputs(input_text, chat_history, context),
+                    config={'callbacks': [self._metrics_handler]},
+                )
 
-            return Result.ok(data=response['output'][0]['text'])
+            return Result.ok(data=self._extract_output(response))
+        except AdmissionRejected as e:
+            logger.warning(f'Turno não atendido por falta de capacidade: {e}')
+            # 'retries_exhausted' é o provedor recusando as chamadas (ex.: 429), e conta como falha dele.
+            error_code = ADMISSION_REJECTED if e.reason in LOCAL_REJECTION_REASONS else None
+            return Result.fail(error_message=BUSY_MESSAGE, error_code=error_code)
         except Exception as e:
             return Result.fail(error_message=f'Erro ao gerar resposta: {str(e)}')
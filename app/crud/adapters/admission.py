@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from utils.deadline import current_deadline
+from utils.metrics import (
+    LLM_ADMISSION_IN_FLIGHT,
+    LLM_ADMISSION_QUEUE_DEPTH,
+    LLM_ADMISSION_RETRIES,
+    LLM_ADMISSION_WAIT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+BUSY_MESSAGE = (
+    'Estamos com alto volume de atendimentos no momento. Se houver risco imediato, ligue 190. '
+    'Envie sua mensagem novamente em instantes.'
+)
+
+# Código do Result de uma chamada recusada pelo controle de admissão local (fila cheia ou prazo do
+# turno), e não pelo provedor: o roteamento não a conta como falha do provedor.
+ADMISSION_REJECTED = 'admission_rejected'
+LOCAL_REJECTION_REASONS = ('queue_full', 'deadline')
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERROR_NAMES = {'APITimeoutError', 'APIConnectionError', 'TimeoutException', 'ConnectError'}
+
+# Instante (time.monotonic()) limite do turno em andamento, compartilhado pelas chamadas ao modelo do turno.
+_turn_deadline: ContextVar[Optional[float]] = ContextVar('turn_deadline', default=None)
+
+
+class AdmissionRejected(Exception):
+    """
+    Chamada ao modelo recusada por falta de capacidade dentro do prazo do turno.
+
+    Attributes:
+        reason (str): 'queue_full', 'deadline' ou 'retries_exhausted'.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f'Chamada ao modelo recusada: {reason}')
+        self.reason = reason
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    # Formato dos cabeçalhos x-ratelimit-reset-* da OpenAI, ex.: '20ms', '1s', '6m0s'.
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h)', value)
+    if not parts:
+        return None
+    units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Lê o tempo de espera sugerido pelo provedor nos cabeçalhos da resposta de erro.
+
+    Considera `retry-after-ms`, `retry-after` (segundos ou data HTTP) e os cabeçalhos de
+    reinício do limite de taxa da OpenAI.
+
+    Args:
+        error (BaseException): Exceção levantada pelo SDK do provedor.
+
+    Returns:
+        Optional[float]: Segundos a aguardar, ou None se o provedor não informou.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    resets = [
+        _parse_duration(headers[name])
+        for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')
+        if headers.get(name)
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def _retry_reason(error: BaseException) -> Optional[str]:
+    status_code = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status_code in RETRYABLE_STATUS_CODES:
+        return str(status_code)
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return type(error).__name__
+    return None
+
+
+class AdmissionController:
+    """
+    Controle de admissão das chamadas a um provedor de LLM.
+
+    Limita as chamadas simultâneas ao provedor e mantém uma fila de espera limitada. Erros de
+    limite de taxa e falhas transitórias são repetidos com backoff exponencial com jitter,
+    respeitando o `Retry-After` informado pelo provedor (que também pausa as demais chamadas) e o
+    prazo total do turno. Quando não há como atender dentro do prazo, levanta `AdmissionRejected`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 16,
+        max_queue: int = 64,
+        deadline_seconds: float = 45,
+        max_retries: int = 3,
+        retry_base_seconds: float = 0.5,
+        retry_max_seconds: float = 8,
+    ):
+        """
+        Inicializa o controle de admissão.
+
+        Args:
+            name (str): Nome do provedor, usado nos logs e métricas.
+            max_concurrency (int, opcional): Chamadas simultâneas permitidas. Padrão é 16.
+            max_queue (int, opcional): Chamadas que podem aguardar por uma vaga. Padrão é 64.
+            deadline_seconds (float, opcional): Prazo total de um turno, incluindo esperas e
+                novas tentativas. Padrão é 45.
+            max_retries (int, opcional): Novas tentativas após erros transitórios. Padrão é 3.
+            retry_base_seconds (float, opcional): Base do backoff exponencial. Padrão é 0.5.
+            retry_max_seconds (float, opcional): Teto do backoff exponencial. Padrão é 8.
+        """
+        self.name = name
+        self.max_queue = max_queue
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._waiting = 0
+        self._paused_until = 0.0
+
+    @contextmanager
+    def turn(self):
+        """
+        Define o prazo do turno para as chamadas ao modelo feitas dentro do bloco.
+
+        Se já houver um prazo definido (por exemplo, por quem chamou o adaptador), ele é mantido.
+        O prazo do turno nunca ultrapassa o prazo da requisição em andamento.
+        """
+        if _turn_deadline.get() is not None:
+            yield
+            return
+        expires_at = time.monotonic() + self.deadline_seconds
+        request_deadline = current_deadline()
+        if request_deadline is not None:
+            expires_at = min(expires_at, request_deadline.expires_at)
+        token = _turn_deadline.set(expires_at)
+        try:
+            yield
+        finally:
+            _turn_deadline.reset(token)
+
+    def _deadline(self) -> float:
+        return _turn_deadline.get() or time.monotonic() + self.deadline_seconds
+
+    def _reject(self, reason: str, started_at: float):
+        LLM_ADMISSION_WAIT_SECONDS.labels(self.name, reason).observe(time.monotonic() - started_at)
+        logger.warning(f'Chamada ao provedor {self.name} recusada: {reason}')
+        return AdmissionRejected(reason)
+
+    async def _acquire(self, deadline: float):
+        started_at = time.monotonic()
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            raise self._reject('queue_full', started_at)
+
+        self._waiting += 1
+        LLM_ADMISSION_QUEUE_DEPTH.labels(self.name).set(self._waiting)
+        try:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                if time.monotonic() + pause >= deadline:
+                    raise self._reject('deadline', started_at)
+                await asyncio.sleep(pause)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise self._reject('deadline', started_at)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise self._reject('deadline', started_at) from None
+        finally:
+            self._waiting -= 1
+            LLM_ADMISSION_QUEUE_DEPTH.labels(self.name).set(self._waiting)
+
+        LLM_ADMISSION_WAIT_SECONDS.labels(self.name, 'admitted').observe(time.monotonic() - started_at)
+        LLM_ADMISSION_IN_FLIGHT.labels(self.name).inc()
+
+    def _release(self):
+        self._semaphore.release()
+        LLM_ADMISSION_IN_FLIGHT.labels(self.name).dec()
+
+    def _backoff(self, error: BaseException, attempt: int) -> float:
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            return retry_after
+        return random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2**attempt))
+
+    async def run(self, call):
+        """
+        Executa uma chamada ao provedor sob o controle de admissão.
+
+        Args:
+            call: Função sem argumentos que retorna a corrotina da chamada.
+
+        Returns:
+            O retorno da chamada.
+
+        Raises:
+            AdmissionRejected: Se a chamada não puder ser atendida dentro do prazo do turno.
+        """
+        deadline = self._deadline()
+        attempt = 0
+        while True:
+            await self._acquire(deadline)
+            try:
+                return await asyncio.wait_for(call(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                logger.warning(f'Chamada ao provedor {self.name} interrompida pelo prazo do turno')
+                raise AdmissionRejected('deadline') from None
+            except Exception as e:
+                reason = _retry_reason(e)
+                if reason is None:
+                    raise
+                if attempt >= self.max_retries:
+                    raise AdmissionRejected('retries_exhausted') from e
+                delay = self._backoff(e, attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise AdmissionRejected('deadline') from e
+            finally:
+                self._release()
+
+            LLM_ADMISSION_RETRIES.labels(self.name, reason).inc()
+            logger.info(f'Nova tentativa no provedor {self.name} em {delay:.2f}s (motivo: {reason})')
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def wrap(self, runnable) -> RunnableLambda:
+        """
+        Envolve o modelo (já com as ferramentas vinculadas) para que as chamadas assíncronas
+        passem pelo controle de admissão. O caminho síncrono não é controlado.
+
+        Args:
+            runnable: Modelo LangChain com as ferramentas vinculadas.
+
+        Returns:
+            RunnableLambda: Runnable equivalente, a ser usado na composição do agente.
+        """
+
+        def invoke(messages, config):
+            return runnable.invoke(messages, config)
+
+        async def ainvoke(messages, config):
+            return await self.run(lambda: runnable.ainvoke(messages, config))
+
+        return RunnableLambda(invoke, afunc=ainvoke, name='admission_control')
@@ -0,0 +1,142 @@
+import logging
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from utils.metrics import (
+    AGENT_ITERATIONS,
+    LLM_ERRORS,
+    LLM_PROMPT_TOKENS,
+    LLM_REQUEST_SECONDS,
+    LLM_TOKENS,
+    TOOL_CALL_SECONDS,
+)
+from utils.timing import record_stage
+
+logger = logging.getLogger(__name__)
+
+
+def model_label(llm) -> str:
+    """
+    Retorna o nome do modelo usado como rótulo nas métricas.
+
+    Args:
+        llm: Instância do modelo LangChain.
+
+    Returns:
+        str: Nome do modelo (ex.: 'gpt-4o') ou, na falta dele, o nome da classe.
+    """
+    return getattr(llm, 'model_name', None) or getattr(llm, 'model', None) or type(llm).__name__
+
+
+def provider_label(llm) -> str:
+    """
+    Retorna o identificador do provedor do modelo usado como rótulo nas métricas.
+
+    Args:
+        llm: Instância do modelo LangChain.
+
+    Returns:
+        str: Tipo do modelo no LangChain (ex.: 'openai-chat', 'anthropic-chat').
+    """
+    try:
+        return llm._llm_type
+    except Exception:
+        return type(llm).__name__
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Registra as métricas das execuções do agente de um adaptador.
+
+    Mede a latência de cada chamada ao modelo, os tokens de entrada e saída (separando os servidos
+    pelo cache de prompts do provedor), a quantidade de iterações do agente por turno, a duração
+    das chamadas de ferramentas e os erros por etapa e tipo. Cada chamada ao modelo também é
+    registrada como a etapa 'llm' nos tempos do turno em andamento.
+    """
+
+    run_inline = True
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self._started_at = {}
+        self._tool_runs = {}
+        self._agent_steps = {}
+
+    def _elapsed(self, run_id) -> float:
+        started_at = self._started_at.pop(run_id, None)
+        return time.perf_counter() - started_at if started_at is not None else 0.0
+
+    def _error(self, stage: str, error: BaseException):
+        LLM_ERRORS.labels(self.provider, self.model, stage, type(error).__name__).inc()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started_at[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started_at[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        elapsed = self._elapsed(run_id)
+        LLM_REQUEST_SECONDS.labels(self.provider, self.model, 'success').observe(elapsed)
+        record_stage('llm', elapsed)
+
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, 'message', None), 'usage_metadata', None)
+                if not usage:
+                    continue
+
+                input_tokens = usage.get('input_tokens', 0)
+                details = usage.get('input_token_details') or {}
+                cache_read = details.get('cache_read') or 0
+                cache_write = details.get('cache_creation') or 0
+                uncached = max(input_tokens - cache_read - cache_write, 0)
+
+                LLM_TOKENS.labels(self.provider, self.model, 'prompt').inc(input_tokens)
+                LLM_TOKENS.labels(self.provider, self.model, 'completion').inc(usage.get('output_tokens', 0))
+                LLM_PROMPT_TOKENS.labels(self.provider, self.model, 'read').inc(cache_read)
+                LLM_PROMPT_TOKENS.labels(self.provider, self.model, 'write').inc(cache_write)
+                LLM_PROMPT_TOKENS.labels(self.provider, self.model, 'uncached').inc(uncached)
+                logger.info(
+                    f'Tokens de entrada ({self.model}): cache_read={cache_read} '
+                    f'cache_write={cache_write} sem_cache={uncached}'
+                )
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs):
+        elapsed = self._elapsed(run_id)
+        LLM_REQUEST_SECONDS.labels(self.provider, self.model, 'error').observe(elapsed)
+        record_stage('llm', elapsed, 'error')
+        self._error('llm', error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._tool_runs[run_id] = (time.perf_counter(), (serialized or {}).get('name') or kwargs.get('name'))
+
+    def _tool_elapsed(self, run_id) -> tuple:
+        started_at, name = self._tool_runs.pop(run_id, (time.perf_counter(), None))
+        return time.perf_counter() - started_at, name or 'unknown'
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        elapsed, name = self._tool_elapsed(run_id)
+        TOOL_CALL_SECONDS.labels(name, 'success').observe(elapsed)
+
+    def on_tool_error(self, error: BaseException, *, run_id, **kwargs):
+        elapsed, name = self._tool_elapsed(run_id)
+        TOOL_CALL_SECONDS.labels(name, 'error').observe(elapsed)
+        self._error('tool', error)
+
+    def on_agent_action(self, action, *, run_id, **kwargs):
+        # Chamadas de ferramentas feitas na mesma resposta do modelo pertencem à mesma iteração.
+        steps = self._agent_steps.setdefault(run_id, set())
+        message_log = getattr(action, 'message_log', None)
+        steps.add(message_log[-1].id if message_log and message_log[-1].id else len(steps))
+
+    def on_agent_finish(self, finish, *, run_id, **kwargs):
+        AGENT_ITERATIONS.labels(self.provider, self.model).observe(len(self._agent_steps.pop(run_id, ())) + 1)
+
+    def on_chain_error(self, error: BaseException, *, run_id, parent_run_id=None, **kwargs):
+        self._agent_steps.pop(run_id, None)
+        if parent_run_id is None:
+            self._error('agent', error)
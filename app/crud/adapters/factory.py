@@ -6,6 +6,7 @@ from langchain_deepseek import ChatDeepSeek
 from langchain_community.chat_models import ChatMaritalk
 from utils.result import Result
 from crud.adapters.adapter import LangChainLLMAdapter
+from crud.adapters.fake_llm import FakeChatModel
 
 
 class LLMFactory:
@@ -20,9 +21,13 @@ class LLMFactory:
         Cria um adaptador para o modelo especificado com base no tipo e configuração fornecidos.
 
         Args:
-            model_type (str): Tipo de modelo a ser criado ('openai', 'anthropic', 'ollama', 'vertexai')
+            model_type (str): Tipo de modelo a ser criado ('openai', 'anthropic', 'ollama', 'vertexai', ...).
+                'fake' cria um modelo local, sem rede, para testes de carga (ver `FakeChatModel`).
             tools: Instância de ferramentas a serem utilizadas pelo modelo
-            **config: Configurações específicas para o modelo (como api_key, model_name, temperature, etc.)
+            **config: Configurações específicas para o modelo (como api_key, model_name, temperature, etc.).
+                `admission` recebe o controle de admissão do provedor e `max_retries` o número de
+                novas tentativas feitas pelo próprio SDK (OpenAI, Anthropic e DeepSeek). O modelo
+                'fake' aceita `latency_seconds`, `latency_jitter_seconds` e `tool_call_probability`.
 
         Returns:
             Result: Objeto Result contendo o adaptador criado ou uma mensagem de erro
@@ -32,18 +37,20 @@ class LLMFactory:
                 model_name = config.get('model_name', 'gpt-4o')
                 temperature = config.get('temperature', 0.7)
                 api_key = config.get('api_key')
+                max_retries = config.get('max_retries', 2)
 
-                llm = ChatOpenAI(model=model_name, temperature=temperature, api_key=api_key)
-                adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+                llm = ChatOpenAI(model=model_name, temperature=temperature, api_key=api_key, max_retries=max_retries)
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
                 return Result.ok(data=adapter)
 
             elif model_type.lower() == 'anthropic':
                 model_name = config.get('model_name', 'claude-3-5-haiku-20241022')
                 temperature = config.get('temperature', 0.7)
                 api_key = config.get('api_key')
+                max_retries = config.get('max_retries', 2)
 
-                llm = ChatAnthropic(model=model_name, temperature=temperature, api_key=api_key)
-                adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+                llm = ChatAnthropic(model=model_name, temperature=temperature, api_key=api_key, max_retries=max_retries)
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
                 return Result.ok(data=adapter)
 
             elif model_type.lower() == 'ollama':
@@ -51,7 +58,7 @@ class LLMFactory:
                 temperature = config.get('temperature', 0.7)
 
                 llm = ChatOllama(model=model_name, temperature=temperature)
-                adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
                 return Result.ok(data=adapter)
 
             elif model_type.lower() == 'vertexai':
@@ -60,15 +67,16 @@ class LLMFactory:
                 project = config.get('project')
 
                 llm = ChatVertexAI(model=model_name, temperature=temperature, project=project)
-                adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
                 return Result.ok(data=adapter)
             elif model_type.lower() == 'deepseek':
                 model_name = config.get('model_name', 'deepseek-chat')
                 temperature = config.get('temperature', 0.7)
                 api_key = config.get('api_key')
+                max_retries = config.get('max_retries', 2)
 
-                llm = ChatDeepSeek(model=model_name, temperature=temperature, api_key=api_key)
-                adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+                llm = ChatDeepSeek(model=model_name, temperature=temperature, api_key=api_key, max_retries=max_retries)
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
                 return Result.ok(data=adapter)
             elif model_type.lower() == 'maritalk':
                 model_name = config.get('model_name', 'sabia-2-medium')
@@ -76,7 +84,15 @@ class LLMFactory:
                 api_key = config.get('api_key')
 
                 llm = ChatMaritalk(model=model_name, temperature=temperature, api_key=api_key)
-                adapter = LangChainLLMAdapter(llm=llm, tools=tools)
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
+                return Result.ok(data=adapter)
+            elif model_type.lower() == 'fake':
+                llm = FakeChatModel(
+                    latency_seconds=config.get('latency_seconds', 0.5),
+                    latency_jitter_seconds=config.get('latency_jitter_seconds', 0.0),
+                    tool_call_probability=config.get('tool_call_probability', 1.0),
+                )
+                adapter = LangChainLLMAdapter(llm=llm, tools=tools, admission=config.get('admission'))
                 return Result.ok(data=adapter)
             else:
                 return Result.fail(error_message=f"Tipo de modelo '{model_type}' não suportado")
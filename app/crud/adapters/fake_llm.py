@@ -0,0 +1,81 @@
+import asyncio
+import random
+import time
+import uuid
+from typing import Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from crud.tools.get_person_data import find_cpf
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo de chat local, sem rede, para testes de carga e desenvolvimento offline.
+
+    Simula a latência de um provedor e o comportamento do agente 190: quando a última mensagem do
+    usuário traz um CPF válido e a ferramenta `get_person_data` está vinculada, pede a consulta
+    (com a probabilidade `tool_call_probability`); depois do resultado da ferramenta, ou em qualquer
+    outra mensagem, responde com um texto fixo. Informa um uso de tokens aproximado, para que as
+    métricas de tokens também sejam exercitadas.
+
+    Attributes:
+        latency_seconds (float): Latência média de cada chamada.
+        latency_jitter_seconds (float): Variação máxima, para mais ou para menos, da latência.
+        tool_call_probability (float): Probabilidade de pedir a consulta de CPF quando houver um.
+        reply (str): Texto das respostas finais.
+    """
+
+    latency_seconds: float = 0.5
+    latency_jitter_seconds: float = 0.0
+    tool_call_probability: float = 1.0
+    reply: str = 'Entendido. Uma viatura será acionada. Se houver risco imediato, ligue 190.'
+    bound_tools: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-chat'
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={'bound_tools': [tool.name for tool in tools]})
+
+    def _latency(self) -> float:
+        jitter = random.uniform(-self.latency_jitter_seconds, self.latency_jitter_seconds)
+        return max(self.latency_seconds + jitter, 0.0)
+
+    def _tool_call(self, messages: list) -> Optional[dict]:
+        if 'get_person_data' not in self.bound_tools or not messages:
+            return None
+        last = messages[-1]
+        if not isinstance(last, HumanMessage) or random.random() >= self.tool_call_probability:
+            return None
+        cpf = find_cpf(last.content if isinstance(last.content, str) else '')
+        if cpf is None:
+            return None
+        return {'name': 'get_person_data', 'args': {'cpf': cpf}, 'id': f'call_{uuid.uuid4().hex}'}
+
+    def _respond(self, messages: list) -> ChatResult:
+        tool_call = None if messages and isinstance(messages[-1], ToolMessage) else self._tool_call(messages)
+        content = '' if tool_call else self.reply
+        input_tokens = sum(len(str(message.content)) for message in messages) // 4
+        message = AIMessage(
+            content=content,
+            tool_calls=[tool_call] if tool_call else [],
+            id=f'fake_{uuid.uuid4().hex}',
+            usage_metadata={
+                'input_tokens': input_tokens,
+                'output_tokens': len(content) // 4 + 1,
+                'total_tokens': input_tokens + len(content) // 4 + 1,
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._latency())
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return self._respond(messages)
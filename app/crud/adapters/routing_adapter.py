@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Optional
+
+from crud.adapters.admission import ADMISSION_REJECTED, BUSY_MESSAGE
+from utils.deadline import cap_timeout, current_deadline
+from utils.metrics import LLM_ROUTING_EVENTS
+from utils.result import Result
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderStats:
+    """
+    Janela móvel de latências e resultados das chamadas a um provedor.
+
+    Attributes:
+        latencies (deque): Latências, em segundos, das últimas chamadas bem-sucedidas.
+        outcomes (deque): Resultado (True para sucesso) das últimas chamadas.
+        last_failure_at (float): Instante (time.monotonic()) da última falha.
+    """
+
+    def __init__(self, window_size: int = 100):
+        self.latencies = deque(maxlen=window_size)
+        self.outcomes = deque(maxlen=window_size)
+        self.last_failure_at = 0.0
+
+    def record(self, success: bool, latency: Optional[float]):
+        self.outcomes.append(success)
+        if success and latency is not None:
+            self.latencies.append(latency)
+        else:
+            self.last_failure_at = time.monotonic()
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def p95(self, min_samples: int) -> Optional[float]:
+        """
+        Retorna o percentil 95 das latências, ou None se ainda não houver amostras suficientes.
+        """
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class ProviderRoute:
+    """
+    Provedor de LLM participante do roteamento.
+
+    Attributes:
+        name (str): Nome do provedor, usado nos logs e métricas (ex.: 'openai:gpt-4o').
+        adapter (LangChainLLMAdapter): Adaptador do provedor.
+        stats (ProviderStats): Latências e resultados recentes do provedor.
+    """
+
+    def __init__(self, name: str, adapter, window_size: int = 100):
+        self.name = name
+        self.adapter = adapter
+        self.stats = ProviderStats(window_size)
+
+
+class RoutingLLMAdapter:
+    """
+    Adaptador que distribui as chamadas entre uma lista ordenada de provedores de LLM.
+
+    Os provedores são tentados na ordem configurada, com os que estão acima da taxa de erro
+    tolerada movidos para o fim da fila até ficarem um período sem falhar. Um erro ou estouro
+    do tempo limite de uma tentativa passa a chamada para o próximo provedor. Com
+    `hedge_enabled`, se o provedor principal
+    demorar mais que o seu p95 recente, uma segunda chamada é disparada no próximo provedor
+    e vale a primeira resposta bem-sucedida.
+
+    Expõe a mesma interface de `LangChainLLMAdapter`, podendo ser usado no lugar dele.
+
+    Attributes:
+        routes (list[ProviderRoute]): Provedores na ordem de preferência.
+    """
+
+    def __init__(
+        self,
+        providers: list,
+        attempt_timeout_seconds: float = 60,
+        hedge_enabled: bool = False,
+        hedge_min_samples: int = 20,
+        window_size: int = 100,
+        error_rate_threshold: float = 0.5,
+        degraded_cooldown_seconds: float = 30,
+    ):
+        """
+        Inicializa o roteador.
+
+        Args:
+            providers (list): Pares (nome, adaptador) em ordem de preferência.
+            attempt_timeout_seconds (float, opcional): Tempo máximo de cada tentativa. Padrão é 60.
+            hedge_enabled (bool, opcional): Dispara uma segunda chamada quando o provedor principal
+                passa do seu p95. Padrão é False.
+            hedge_min_samples (int, opcional): Quantidade de latências necessárias antes de usar o p95.
+                Padrão é 20.
+            window_size (int, opcional): Tamanho da janela móvel de estatísticas. Padrão é 100.
+            error_rate_threshold (float, opcional): Taxa de erro a partir da qual o provedor vai para
+                o fim da fila. Padrão é 0.5.
+            degraded_cooldown_seconds (float, opcional): Tempo sem falhas após o qual um provedor
+                rebaixado volta à sua posição original e é tentado de novo. Padrão é 30.
+        """
+        if not providers:
+            raise ValueError('Ao menos um provedor deve ser informado.')
+        self.routes = [ProviderRoute(name, adapter, window_size) for name, adapter in providers]
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_samples = hedge_min_samples
+        self.error_rate_threshold = error_rate_threshold
+        self.degraded_cooldown_seconds = degraded_cooldown_seconds
+
+    @property
+    def adapters(self) -> list:
+        return [route.adapter for route in self.routes]
+
+    @property
+    def tools(self):
+        return self.routes[0].adapter.tools
+
+    def warmup(self, system_prompt: str):
+        """
+        Compila o agente de todos os provedores.
+
+        Args:
+            system_prompt (str): Prompt de sistema do agente.
+        """
+        for adapter in self.adapters:
+            adapter.warmup(system_prompt)
+
+    def _is_degraded(self, route: ProviderRoute) -> bool:
+        return (
+            route.stats.error_rate() >= self.error_rate_threshold
+            and time.monotonic() - route.stats.last_failure_at < self.degraded_cooldown_seconds
+        )
+
+    def _ordered_routes(self) -> list:
+        healthy = [route for route in self.routes if not self._is_degraded(route)]
+        degraded = [route for route in self.routes if self._is_degraded(route)]
+        return healthy + degraded
+
+    def _record(
+        self,
+        route: ProviderRoute,
+        result: Result,
+        started_at: float,
+        event: Optional[str] = None,
+        track_latency: bool = True,
+    ):
+        latency = time.perf_counter() - started_at if track_latency else None
+        route.stats.record(result.success, latency)
+        LLM_ROUTING_EVENTS.labels(route.name, event or ('success' if result.success else 'error')).inc()
+        if not result.success:
+            logger.warning(f'Falha no provedor {route.name}: {result.error_message}')
+
+    async def _attempt(self, route: ProviderRoute, call, track_latency: bool = True) -> Result:
+        """
+        Chama um provedor respeitando o tempo limite (e o prazo da requisição) e registra a latência
+        e o resultado.
+
+        Args:
+            route (ProviderRoute): Provedor chamado.
+            call: Função que recebe o adaptador do provedor e retorna a corrotina da chamada.
+            track_latency (bool, opcional): Se a latência entra no p95 usado pelo hedge. Padrão é True.
+        """
+        started_at = time.perf_counter()
+        timeout = cap_timeout(self.attempt_timeout_seconds)
+        try:
+            result = await asyncio.wait_for(call(route.adapter), timeout=timeout)
+        except asyncio.TimeoutError:
+            if timeout < self.attempt_timeout_seconds:
+                # Quem esgotou foi o prazo da requisição, não o provedor: não conta como falha dele.
+                LLM_ROUTING_EVENTS.labels(route.name, 'deadline').inc()
+                return Result.fail(error_message=BUSY_MESSAGE)
+            result = Result.fail(error_message=f'Tempo limite excedido no provedor {route.name}')
+            self._record(route, result, started_at, event='timeout', track_latency=track_latency)
+            return result
+        except asyncio.CancelledError:
+            # Chamada perdedora de um hedge: não conta como erro do provedor.
+            LLM_ROUTING_EVENTS.labels(route.name, 'cancelled').inc()
+            raise
+        if result.error_code == ADMISSION_REJECTED:
+            # Recusada pelo controle de admissão local (fila cheia ou prazo): o provedor não foi chamado.
+            LLM_ROUTING_EVENTS.labels(route.name, 'rejected').inc()
+            return result
+        self._record(route, result, started_at, track_latency=track_latency)
+        return result
+
+    async def _hedged_attempt(self, primary: ProviderRoute, backup: ProviderRoute, call) -> tuple:
+        """
+        Chama o provedor principal e, se ele passar do seu p95, também o reserva.
+
+        A chamada que perder é cancelada.
+
+        Returns:
+            tuple: A primeira resposta bem-sucedida (ou a última falha) e se o reserva foi acionado.
+        """
+        pending = {asyncio.create_task(self._attempt(primary, call))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=primary.stats.p95(self.hedge_min_samples))
+            if done:
+                return done.pop().result(), False
+
+            logger.info(f'Provedor {primary.name} acima do p95, disparando chamada paralela em {backup.name}')
+            LLM_ROUTING_EVENTS.labels(backup.name, 'hedge').inc()
+            hedge_task = asyncio.create_task(self._attempt(backup, call))
+            pending.add(hedge_task)
+
+            result = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result.success:
+                        if task is hedge_task:
+                            LLM_ROUTING_EVENTS.labels(backup.name, 'hedge_win').inc()
+                        return result, True
+            return result, True
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _route(self, call, hedge: bool = True) -> Result:
+        """
+        Tenta os provedores em ordem até uma chamada ser bem-sucedida.
+
+        Args:
+            call: Função que recebe o adaptador do provedor e retorna a corrotina da chamada.
+            hedge (bool, opcional): Se o hedge pode ser usado (quando habilitado). Padrão é True.
+
+        Returns:
+            Result: Resultado do primeiro provedor bem-sucedido, ou o erro do último.
+        """
+        routes = self._ordered_routes()
+        result = Result.fail(error_message='Nenhum provedor LLM disponível')
+        index = 0
+        while index < len(routes):
+            route = routes[index]
+            backup = routes[index + 1] if index + 1 < len(routes) else None
+            if (
+                hedge
+                and self.hedge_enabled
+                and backup is not None
+                and route.stats.p95(self.hedge_min_samples) is not None
+            ):
+                result, hedged = await self._hedged_attempt(route, backup, call)
+                # Se o hedge foi disparado, o reserva já foi tentado junto com o principal.
+                index += 2 if hedged else 1
+            else:
+                result = await self._attempt(route, call, track_latency=hedge)
+                index += 1
+            if result.success:
+                return result
+            deadline = current_deadline()
+            if deadline is not None and deadline.expired:
+                logger.warning('Prazo da requisição esgotado, sem tentar os demais provedores')
+                return Result.fail(error_message=BUSY_MESSAGE)
+        return result
+
+    def generate_response(self, input_text: str, chat_history: list, context: dict) -> Result:
+        """
+        Gera uma resposta passando para o próximo provedor em caso de erro.
+
+        O caminho síncrono não aplica tempo limite nem hedge, pois não há como interromper a chamada.
+
+        Args:
+            input_text (str): Texto de entrada do usuário.
+            chat_history (list): Histórico do chat.
+            context (dict): Contexto adicional, como prompts ou data.
+
+        Returns:
+            Result: Resposta do primeiro provedor bem-sucedido, ou o erro do último.
+        """
+        result = Result.fail(error_message='Nenhum provedor LLM disponível')
+        for route in self._ordered_routes():
+            started_at = time.perf_counter()
+            result = route.adapter.generate_response(input_text, chat_history, context)
+            self._record(route, result, started_at)
+            if result.success:
+                return result
+        return result
+
+    async def agenerate_response(self, input_text: str, chat_history: list, context: dict) -> Result:
+        """
+        Gera uma resposta de forma assíncrona, com failover entre provedores e hedge opcional.
+
+        Args:
+            input_text (str): Texto de entrada do usuário.
+            chat_history (list): Histórico do chat.
+            context (dict): Contexto adicional, como prompts ou data.
+
+        Returns:
+            Result: Resposta do primeiro provedor bem-sucedido, ou o erro do último.
+        """
+        return await self._route(lambda adapter: adapter.agenerate_response(input_text, chat_history, context))
+
+    async def asummarize(self, messages: list) -> Result:
+        """
+        Faz uma chamada simples ao modelo (ex.: resumo do histórico), com failover entre provedores.
+
+        Não usa hedge, e a latência dessas chamadas, mais curtas que um turno do agente, fica fora do
+        p95 usado por ele.
+
+        Args:
+            messages (list): Mensagens LangChain enviadas ao modelo.
+
+        Returns:
+            Result: Texto do primeiro provedor bem-sucedido, ou o erro do último.
+        """
+        return await self._route(lambda adapter: adapter.asummarize(messages), hedge=False)
@@ -1,52 +1,121 @@
-import redis
+import asyncio
 import json
+import logging
+import uuid
+from contextlib import nullcontext
+from typing import Optional
+
+import redis.asyncio as redis
+from redis.exceptions import WatchError
 
 from datetime import date
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from utils.deadline import Deadline, without_deadline
 from utils.prompts import PROMPT_190
 from utils.result import Result
+from utils.timing import stage, timed_stage, untimed
 from crud.adapters.adapter import LangChainLLMAdapter
+from crud.managers.history_manager import HistoryShaper
 from crud.managers.llm_manager import LLMManager
+from crud.managers.session_cache import SessionHistoryCache
+from crud.managers.session_codec import decode_message, encode_message, normalize_message
+from crud.managers.session_lock import RedisSessionLock
+from crud.tools.get_person_data import find_cpf
+
+logger = logging.getLogger(__name__)
+
+_background_tasks = set()
+
+
+def create_redis_pool(
+    host: str,
+    port: int,
+    password: str,
+    ssl: bool = True,
+    max_connections: int = 50,
+    pool_timeout: float = 5.0,
+    socket_timeout: float = 5.0,
+    socket_connect_timeout: float = 5.0,
+    health_check_interval: int = 30,
+) -> redis.BlockingConnectionPool:
+    """
+    Cria um pool de conexões assíncronas com o Redis, para ser compartilhado por toda a aplicação.
+
+    O pool é bloqueante: quando todas as conexões estão em uso, a requisição aguarda até
+    `pool_timeout` segundos por uma conexão livre em vez de abrir conexões sem limite.
+
+    Args:
+        host (str): Endereço do servidor Redis.
+        port (int): Porta do servidor Redis.
+        password (str): Senha para autenticação no Redis.
+        ssl (bool, opcional): Se deve usar SSL na conexão. Padrão é True.
+        max_connections (int, opcional): Número máximo de conexões no pool. Padrão é 50.
+        pool_timeout (float, opcional): Tempo máximo de espera por uma conexão livre, em segundos.
+        socket_timeout (float, opcional): Timeout de leitura/escrita no socket, em segundos.
+        socket_connect_timeout (float, opcional): Timeout para estabelecer a conexão, em segundos.
+        health_check_interval (int, opcional): Intervalo, em segundos, para verificar conexões ociosas.
+
+    Returns:
+        redis.BlockingConnectionPool: Pool de conexões configurado.
+    """
+    connection_class = redis.SSLConnection if ssl else redis.Connection
+    return redis.BlockingConnectionPool(
+        connection_class=connection_class,
+        host=host,
+        port=port,
+        password=password,
+        max_connections=max_connections,
+        timeout=pool_timeout,
+        socket_timeout=socket_timeout,
+        socket_connect_timeout=socket_connect_timeout,
+        health_check_interval=health_check_interval,
+    )
 
 
 class RedisSessionManager:
     """
     Gerenciador de sessões utilizando Redis como armazenamento.
 
-    Esta classe fornece métodos para persistir e recuperar históricos de conversas
-    entre sessões, utilizando o Redis como backend de armazenamento.
+    Esta classe fornece métodos assíncronos para persistir e recuperar históricos de conversas
+    entre sessões, utilizando o Redis como backend de armazenamento. Todas as operações usam
+    o cliente `redis.asyncio`, de modo que o event loop nunca fica bloqueado aguardando o Redis.
+    Cada mensagem é gravada no formato compacto de `session_codec`; mensagens gravadas em JSON
+    por versões anteriores continuam sendo lidas.
 
     Attributes:
-        client (redis.Redis): Cliente Redis para interação com o servidor.
+        client (redis.Redis): Cliente Redis assíncrono para interação com o servidor.
         key_prefix (str): Prefixo utilizado nas chaves Redis para organização.
         expiry_seconds (int): Tempo de expiração em segundos para as sessões.
+        cache (SessionHistoryCache): Cache write-through dos históricos recentes (opcional).
     """
 
     def __init__(
         self,
-        host: str,
-        port: int,
-        password: str,
-        ssl: bool = True,
+        client: redis.Redis,
         key_prefix: str = 'session_history:',
         expiry_seconds: int = 86400,
+        cache: Optional[SessionHistoryCache] = None,
+        compress_threshold: int = 1024,
     ):
         """
         Inicializa o gerenciador de sessões Redis.
 
         Args:
-            host (str): Endereço do servidor Redis.
-            port (int): Porta do servidor Redis.
-            password (str): Senha para autenticação no Redis.
-            ssl (bool, opcional): Se deve usar SSL na conexão. Padrão é True.
+            client (redis.Redis): Cliente Redis assíncrono, normalmente ligado a um pool compartilhado.
             key_prefix (str, opcional): Prefixo para as chaves no Redis. Padrão é 'session_history:'.
             expiry_seconds (int, opcional): Tempo de vida dos dados em segundos. Padrão é 86400 (24 horas).
+            cache (SessionHistoryCache, opcional): Cache em memória, compartilhado pelo worker, dos
+                históricos recentes. Se None, toda leitura vai ao Redis.
+            compress_threshold (int, opcional): Tamanho, em bytes, a partir do qual cada mensagem
+                é comprimida antes de ser gravada. Padrão é 1024.
         """
-        self.client = redis.Redis(host=host, port=port, password=password, ssl=ssl)
+        self.client = client
         self.key_prefix = key_prefix
         self.expiry_seconds = expiry_seconds
+        self.cache = cache
+        self.compress_threshold = compress_threshold
 
-    def test_connection(self) -> Result:
+    async def test_connection(self) -> Result:
         """
         Testa a conexão com o servidor Redis.
 
@@ -54,17 +123,90 @@ class RedisSessionManager:
             Result: Objeto indicando sucesso ou falha na conexão.
         """
         try:
-            self.client.ping()
+            await self.client.ping()
             return Result.ok()
         except Exception as e:
             return Result.fail(error_message=f'Erro ao conectar ao Redis: {str(e)}')
 
-    def get_session_history(self, session_id: str) -> Result:
+    def _history_key(self, session_id: str) -> str:
+        """Chave da lista Redis (append-only) com as mensagens da sessão."""
+        return f'{self.key_prefix}{session_id}:messages'
+
+    def _legacy_key(self, session_id: str) -> str:
+        """Chave do formato antigo, em que o histórico inteiro era salvo como um único JSON."""
+        return f'{self.key_prefix}{session_id}'
+
+    def _version_key(self, session_id: str) -> str:
+        """Chave do contador incrementado a cada escrita no histórico da sessão."""
+        return f'{self.key_prefix}{session_id}:version'
+
+    def _summary_key(self, session_id: str) -> str:
+        """Chave do hash Redis com o resumo contínuo da sessão."""
+        return f'{self.key_prefix}{session_id}:summary'
+
+    def _encode_message(self, message) -> bytes:
+        return encode_message(message, compress_threshold=self.compress_threshold)
+
+    @staticmethod
+    def _decode_message(data) -> dict:
+        return decode_message(data)
+
+    async def _migrate_legacy_history(self, session_id: str) -> list:
+        """
+        Converte uma sessão gravada no formato antigo (blob JSON) para a lista append-only.
+
+        A cópia é atômica: a chave antiga e a lista são observadas (WATCH), e a transação só é
+        aplicada se nenhuma das duas mudou desde a leitura. Se outra réplica migrar a sessão (ou
+        gravar nela) ao mesmo tempo, a transação é descartada e o histórico é lido da lista.
+
+        Args:
+            session_id (str): Identificador único da sessão.
+
+        Returns:
+            list: Mensagens da sessão, ou lista vazia se não houver sessão no formato antigo.
+        """
+        legacy_key = self._legacy_key(session_id)
+        history_key = self._history_key(session_id)
+        raced = False
+        async with self.client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(legacy_key, history_key)
+                    data = await pipe.get(legacy_key)
+                    if data is None and not raced:
+                        return []
+                    if data is None or await pipe.llen(history_key):
+                        # Outra réplica migrou a sessão ou gravou nela depois da leitura de quem chamou.
+                        return [self._decode_message(item) for item in await pipe.lrange(history_key, 0, -1)]
+
+                    history = [normalize_message(item) for item in json.loads(data)]
+                    pipe.multi()
+                    if history:
+                        pipe.rpush(history_key, *[self._encode_message(item) for item in history])
+                        pipe.expire(history_key, self.expiry_seconds)
+                        pipe.incr(self._version_key(session_id))
+                        pipe.expire(self._version_key(session_id), self.expiry_seconds)
+                    pipe.delete(legacy_key)
+                    await pipe.execute()
+                    break
+                except WatchError:
+                    raced = True
+        if self.cache is not None:
+            self.cache.invalidate(session_id)
+        return history
+
+    async def get_session_history(self, session_id: str, start: int = 0, limit: Optional[int] = None) -> Result:
         """
         Recupera o histórico de uma sessão pelo ID.
 
+        A leitura é feita por faixa (LRANGE), de modo que apenas as mensagens necessárias
+        trafegam pela rede.
+
         Args:
             session_id (str): Identificador único da sessão.
+            start (int, opcional): Índice da primeira mensagem a considerar. Padrão é 0.
+            limit (int, opcional): Quantidade máxima de mensagens mais recentes a retornar.
+                Se None, retorna todas as mensagens a partir de `start`.
 
         Returns:
             Result: Objeto contendo o histórico da sessão ou erro.
@@ -72,20 +214,146 @@ class RedisSessionManager:
         if not session_id:
             return Result.fail(error_message='ID de sessão inválido')
 
-        key = f'{self.key_prefix}{session_id}'
+        key = self._history_key(session_id)
         try:
-            data = self.client.get(key)
-            if data is None:
-                history = []
-            else:
-                history = json.loads(data)
+            if self.cache is not None:
+                return Result.ok(data=await self._get_cached_history(session_id, start, limit))
+
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.llen(key)
+                if limit is None:
+                    pipe.lrange(key, start, -1)
+                else:
+                    pipe.lrange(key, -limit, -1)
+                length, items = await pipe.execute()
+
+            if length == 0:
+                history = await self._migrate_legacy_history(session_id)
+                if limit is not None:
+                    history = history[max(len(history) - limit, start) :]
+                else:
+                    history = history[start:]
+                return Result.ok(data=history)
+
+            if limit is not None:
+                first_index = max(length - limit, 0)
+                items = items[max(start - first_index, 0) :]
+
+            history = [self._decode_message(item) for item in items]
             return Result.ok(data=history)
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             return Result.fail(error_message=f'Erro ao decodificar histórico: {str(e)}')
         except Exception as e:
             return Result.fail(error_message=f'Erro ao recuperar histórico: {str(e)}')
 
-    def update_session_history(self, session_id: str, message) -> Result:
+    async def _get_cached_history(self, session_id: str, start: int, limit: Optional[int]) -> list:
+        """
+        Lê o histórico usando o cache em memória.
+
+        Uma única ida ao Redis obtém a versão e o tamanho do histórico. Se a entrada em cache
+        estiver na mesma versão, nenhuma mensagem trafega pela rede; se outra réplica tiver
+        escrito na sessão, apenas as mensagens novas são buscadas.
+
+        Args:
+            session_id (str): Identificador único da sessão.
+            start (int): Índice da primeira mensagem a considerar.
+            limit (int, opcional): Quantidade máxima de mensagens mais recentes a retornar.
+
+        Returns:
+            list: Mensagens decodificadas.
+        """
+        key = self._history_key(session_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.get(self._version_key(session_id))
+            pipe.llen(key)
+            version, length = await pipe.execute()
+        version = int(version or 0)
+
+        if length == 0:
+            self.cache.invalidate(session_id)
+            history = await self._migrate_legacy_history(session_id)
+            first = start if limit is None else max(len(history) - limit, start)
+            return history[first:]
+
+        first = start if limit is None else max(length - limit, start)
+        entry = self.cache.get(session_id)
+
+        if entry is not None and entry.base <= first and entry.version == version and entry.end == length:
+            self.cache.record('hit')
+        elif entry is not None and entry.base <= first and entry.version < version and entry.end <= length:
+            self.cache.record('stale')
+            items = await self.client.lrange(key, entry.end, -1)
+            self.cache.put(
+                session_id,
+                version,
+                entry.base,
+                entry.messages + [self._decode_message(item) for item in items],
+                entry.sizes + [len(item) for item in items],
+            )
+        else:
+            self.cache.record('miss')
+            items = await self.client.lrange(key, first, -1)
+            self.cache.put(
+                session_id,
+                version,
+                first,
+                [self._decode_message(item) for item in items],
+                [len(item) for item in items],
+            )
+
+        self.cache.trim(session_id, first)
+        entry = self.cache.get(session_id)
+        if entry is None:
+            return await self._fetch_range(key, first)
+        return entry.messages[first - entry.base :]
+
+    async def _fetch_range(self, key: str, first: int) -> list:
+        items = await self.client.lrange(key, first, -1)
+        return [self._decode_message(item) for item in items]
+
+    async def append_messages(self, session_id: str, messages: list) -> Result:
+        """
+        Acrescenta mensagens ao histórico de uma sessão em uma única operação atômica.
+
+        As mensagens são enviadas em um pipeline transacional (RPUSH + EXPIRE), então um turno
+        completo da conversa custa uma ida ao Redis e move apenas os bytes das novas mensagens.
+
+        Args:
+            session_id (str): Identificador único da sessão.
+            messages (list): Mensagens a serem adicionadas, na ordem em que ocorreram.
+
+        Returns:
+            Result: Objeto indicando sucesso ou falha na operação.
+        """
+        if not session_id:
+            return Result.fail(error_message='ID de sessão inválido')
+        if not messages:
+            return Result.ok()
+
+        key = self._history_key(session_id)
+        version_key = self._version_key(session_id)
+        encoded = [self._encode_message(message) for message in messages]
+        try:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.rpush(key, *encoded)
+                pipe.expire(key, self.expiry_seconds)
+                pipe.expire(self._summary_key(session_id), self.expiry_seconds)
+                pipe.incr(version_key)
+                pipe.expire(version_key, self.expiry_seconds)
+                results = await pipe.execute()
+
+            if self.cache is not None:
+                self.cache.append(
+                    session_id,
+                    results[3],
+                    [self._decode_message(item) for item in encoded],
+                    [len(item) for item in encoded],
+                )
+            return Result.ok()
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao atualizar histórico: {str(e)}')
+
+    async def update_session_history(self, session_id: str, message) -> Result:
         """
         Atualiza o histórico de uma sessão adicionando uma nova mensagem.
 
@@ -96,44 +364,213 @@ class RedisSessionManager:
         Returns:
             Result: Objeto indicando sucesso ou falha na operação.
         """
+        return await self.append_messages(session_id, [message])
+
+    async def get_session_summary(self, session_id: str) -> Result:
+        """
+        Recupera o resumo contínuo da sessão.
+
+        Args:
+            session_id (str): Identificador único da sessão.
+
+        Returns:
+            Result: Objeto contendo um dicionário com o texto do resumo (`text`) e a quantidade
+                de mensagens do histórico já incorporadas a ele (`upto`).
+        """
         if not session_id:
             return Result.fail(error_message='ID de sessão inválido')
 
-        key = f'{self.key_prefix}{session_id}'
-        history_result = self.get_session_history(session_id)
-        if not history_result.success:
-            return Result.fail(error_message='Erro ao obter histórico da sessão')
+        try:
+            data = await self.client.hgetall(self._summary_key(session_id))
+            text = data.get(b'text', b'').decode()
+            upto = int(data.get(b'upto', 0))
+            return Result.ok(data={'text': text, 'upto': upto})
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao recuperar resumo da sessão: {str(e)}')
+
+    async def set_session_summary(self, session_id: str, text: str, upto: int, expected_upto: int) -> Result:
+        """
+        Grava o resumo contínuo da sessão, desde que ninguém o tenha alterado desde a leitura.
 
-        history = history_result.data
-        message_data = message.dict() if hasattr(message, 'dict') else str(message)
-        history.append(message_data)
+        Args:
+            session_id (str): Identificador único da sessão.
+            text (str): Novo texto do resumo.
+            upto (int): Quantidade de mensagens do histórico incorporadas ao novo resumo.
+            expected_upto (int): Valor de `upto` lido antes de gerar o resumo.
 
+        Returns:
+            Result: Objeto cujo `data` indica se o resumo foi gravado (False se outro processo
+                atualizou o resumo antes).
+        """
+        if not session_id:
+            return Result.fail(error_message='ID de sessão inválido')
+
+        key = self._summary_key(session_id)
         try:
-            self.client.set(key, json.dumps(history), ex=self.expiry_seconds)
-            return Result.ok()
+            async with self.client.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                current_upto = int(await pipe.hget(key, 'upto') or 0)
+                if current_upto != expected_upto:
+                    await pipe.reset()
+                    return Result.ok(data=False)
+                pipe.multi()
+                pipe.hset(key, mapping={'text': text, 'upto': upto})
+                pipe.expire(key, self.expiry_seconds)
+                await pipe.execute()
+            return Result.ok(data=True)
+        except redis.WatchError:
+            return Result.ok(data=False)
         except Exception as e:
-            return Result.fail(error_message=f'Erro ao atualizar histórico: {str(e)}')
+            return Result.fail(error_message=f'Erro ao gravar resumo da sessão: {str(e)}')
 
 
 class Agent190:
-    def __init__(self, session_manager: RedisSessionManager, llm_adapter: LangChainLLMAdapter):
+    def __init__(
+        self,
+        session_manager: RedisSessionManager,
+        llm_adapter: LangChainLLMAdapter,
+        history_limit: Optional[int] = None,
+        history_shaper: Optional[HistoryShaper] = None,
+        session_lock: Optional[RedisSessionLock] = None,
+        speculative_lookup: bool = False,
+    ):
         """
         Inicializa uma instância do agente de atendimento 190.
 
         Args:
             session_manager (SessionManager): Gerenciador para manter o histórico das sessões.
             llm_adapter (LangChainLLMAdapter): Adaptador para o modelo de linguagem.
+            history_limit (int, opcional): Quantidade máxima de mensagens recentes lidas do histórico.
+                Se None, o histórico completo é lido.
+            history_shaper (HistoryShaper, opcional): Modelador que limita o histórico a um orçamento
+                de tokens e resume as mensagens antigas. Se None, o histórico é enviado sem alterações.
+            session_lock (RedisSessionLock, opcional): Fila que serializa os turnos de uma mesma sessão.
+                Se None, turnos concorrentes não são ordenados.
+            speculative_lookup (bool, opcional): Se True, um CPF presente na mensagem é consultado
+                antes da chamada ao modelo e entregue a ele como resultado da ferramenta. Padrão é False.
         """
         self.session_manager = session_manager
+        self.history_limit = history_limit
+        self.history_shaper = history_shaper
+        self.session_lock = session_lock
+        self.speculative_lookup = speculative_lookup
         self.llm_manager = LLMManager(llm_adapter)
 
-    async def generate_text_response(self, input_text: str, session_id: str) -> Result:
+    @timed_stage('session_history')
+    async def _load_chat_history(self, session_id: str) -> Result:
+        """
+        Carrega o histórico que será enviado ao modelo.
+
+        Com um modelador de histórico configurado, lê o resumo da sessão e apenas as mensagens
+        ainda não resumidas, ajustando-as ao orçamento de tokens.
+
+        Args:
+            session_id (str): Identificador da sessão.
+
+        Returns:
+            Result: Objeto contendo o histórico pronto para o prompt ou erro.
+        """
+        if self.history_shaper is None:
+            return await self.session_manager.get_session_history(session_id, limit=self.history_limit)
+
+        summary_result = await self.session_manager.get_session_summary(session_id)
+        if not summary_result.success:
+            return summary_result
+
+        history_result = await self.session_manager.get_session_history(
+            session_id, start=summary_result.data['upto'], limit=self.history_limit
+        )
+        if not history_result.success:
+            return history_result
+
+        return Result.ok(data=self.history_shaper.build_chat_history(summary_result.data['text'], history_result.data))
+
+    def _schedule_history_fold(self, session_id: str):
+        """
+        Agenda, fora do caminho da resposta, a atualização do resumo contínuo da sessão.
+
+        Args:
+            session_id (str): Identificador da sessão.
+        """
+        if self.history_shaper is None:
+            return
+
+        # O resumo não faz parte da resposta: não conta nos tempos nem fica preso ao prazo da requisição.
+        with untimed(), without_deadline():
+            task = asyncio.create_task(self.history_shaper.fold(self.session_manager, session_id))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    def _start_cpf_lookup(self, input_text: str) -> Optional[tuple]:
+        """
+        Inicia a consulta do CPF presente na mensagem, sem esperar pelo modelo decidir chamar a ferramenta.
+
+        Args:
+            input_text (str): Texto de entrada do usuário.
+
+        Returns:
+            Optional[tuple]: Ferramenta, argumentos e tarefa da consulta em andamento, ou None se a
+                mensagem não contiver um CPF válido.
+        """
+        if not self.speculative_lookup:
+            return None
+
+        cpf = find_cpf(input_text)
+        if cpf is None:
+            return None
+
+        tool = self.llm_manager.llm_adapter.tools.get('get_person_data')
+        tool_args = {'cpf': cpf}
+        return tool, tool_args, asyncio.create_task(tool.ainvoke(tool_args))
+
+    async def _prefetched_messages(self, lookup: Optional[tuple]) -> list:
+        """
+        Converte a consulta antecipada em uma chamada de ferramenta já resolvida, no formato que
+        o agente produziria (mensagem do modelo com a chamada seguida do resultado).
+
+        Args:
+            lookup (tuple, opcional): Retorno de `_start_cpf_lookup`.
+
+        Returns:
+            list: Mensagens a serem inseridas após a entrada do usuário, ou lista vazia se não houver
+                consulta ou se ela falhar.
+        """
+        if lookup is None:
+            return []
+
+        tool, tool_args, task = lookup
+        try:
+            observation = await task
+        except Exception as e:
+            logger.warning(f'Consulta antecipada de CPF falhou: {e}')
+            return []
+
+        if not isinstance(observation, str):
+            observation = json.dumps(observation, ensure_ascii=False, default=str)
+
+        tool_call_id = f'prefetch_{uuid.uuid4().hex}'
+        return [
+            AIMessage(content='', tool_calls=[{'name': tool.name, 'args': tool_args, 'id': tool_call_id}]),
+            ToolMessage(content=observation, tool_call_id=tool_call_id),
+        ]
+
+    async def generate_text_response(
+        self, input_text: str, session_id: str, deadline: Optional[Deadline] = None
+    ) -> Result:
         """
         Gera uma resposta de texto com base na entrada do usuário e no histórico da sessão.
 
+        Com uma fila por sessão configurada, turnos concorrentes da mesma sessão são
+        processados estritamente na ordem de chegada.
+
+        Com a consulta antecipada habilitada, um CPF presente na mensagem começa a ser consultado
+        imediatamente, em paralelo com a espera pela vez da sessão e a leitura do histórico.
+
         Args:
             input_text (str): Texto de entrada do usuário.
             session_id (str): Identificador da sessão.
+            deadline (Deadline, opcional): Prazo da requisição. Limita a espera pela vez da sessão e,
+                por meio do prazo ativo, as chamadas ao modelo e às ferramentas.
 
         Returns:
             Result: Objeto contendo sucesso/falha e a resposta gerada.
@@ -141,33 +578,65 @@ class Agent190:
         if not input_text or not session_id:
             return Result.fail(error_message='Input inválido.')
 
+        with deadline.activate() if deadline is not None else nullcontext():
+            return await self._generate_text_response(input_text, session_id, deadline)
+
+    async def _generate_text_response(self, input_text: str, session_id: str, deadline: Optional[Deadline]) -> Result:
+        lookup = self._start_cpf_lookup(input_text)
+        try:
+            if self.session_lock is None:
+                return await self._run_turn(input_text, session_id, lookup)
+
+            with stage('session_lock'):
+                lock_result = await self.session_lock.acquire(
+                    session_id, timeout=deadline.remaining() if deadline is not None else None
+                )
+            if not lock_result.success:
+                return Result.fail(error_message='Não foi possível processar sua mensagem agora. Envie-a novamente.')
+
+            async with self.session_lock.hold(session_id, lock_result.data):
+                return await self._run_turn(input_text, session_id, lookup)
+        finally:
+            if lookup is not None and not lookup[2].done():
+                lookup[2].cancel()
+
+    async def _run_turn(self, input_text: str, session_id: str, lookup: Optional[tuple] = None) -> Result:
+        """
+        Executa um turno da conversa: lê o histórico, gera a resposta e persiste o turno.
+
+        Args:
+            input_text (str): Texto de entrada do usuário.
+            session_id (str): Identificador da sessão.
+            lookup (tuple, opcional): Consulta antecipada de CPF iniciada para este turno.
+
+        Returns:
+            Result: Objeto contendo sucesso/falha e a resposta gerada.
+        """
         try:
-            history_result = self.session_manager.get_session_history(session_id)
-            if not history_result.success:
+            chat_history_result = await self._load_chat_history(session_id)
+            if not chat_history_result.success:
                 return Result.fail(error_message='Erro ao obter histórico da sessão')
 
-            chat_history = history_result.data
+            chat_history = chat_history_result.data
 
             context = {
                 'date': date.today(),
                 'system_prompt': PROMPT_190,
+                'prefetched_messages': await self._prefetched_messages(lookup),
             }
 
-            response_result = self.llm_manager.generate_response(input_text, chat_history, context)
+            response_result = await self.llm_manager.agenerate_response(input_text, chat_history, context)
             if not response_result.success:
                 return Result.fail(error_message=response_result.error_message)
 
-            user_update_result = self.session_manager.update_session_history(
-                session_id, HumanMessage(content=input_text)
-            )
-            if not user_update_result.success:
-                return Result.fail(error_message='Erro ao atualizar histórico com a mensagem do usuário')
+            with stage('session_save'):
+                update_result = await self.session_manager.append_messages(
+                    session_id, [HumanMessage(content=input_text), AIMessage(content=response_result.data)]
+                )
+            if not update_result.success:
+                return Result.fail(error_message='Erro ao atualizar histórico da sessão')
 
-            ai_update_result = self.session_manager.update_session_history(
-                session_id, AIMessage(content=response_result.data)
-            )
-            if not ai_update_result.success:
-                return Result.fail(error_message='Erro ao atualizar histórico com a resposta da IA')
+            self._schedule_history_fold(session_id)
 
             return Result.ok(data=response_result.data)
 
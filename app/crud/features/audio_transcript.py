@@ -1,13 +1,14 @@
+import asyncio
 import tempfile
 import uuid
 import os
 from dotenv import load_dotenv
 from base64 import b64encode
-import requests
+import httpx
 import soundfile as sf
-import speech_recognition as sr
 from google.cloud import storage
 from utils.result import Result
+from utils.timing import timed_stage
 
 
 load_dotenv()
@@ -20,12 +21,14 @@ class AudioDownloader:
     """Classe responsável por baixar áudio de uma URL protegida por autenticação."""
 
     @staticmethod
-    async def download_audio(media_url: str) -> Result:
+    @timed_stage('audio_download')
+    async def download_audio(media_url: str, timeout: float = 10.0) -> Result:
         """
         Faz o download do áudio de uma URL protegida.
 
         Args:
             media_url (str): URL do arquivo de mídia.
+            timeout (float, opcional): Tempo limite do download, em segundos. Padrão é 10.
 
         Returns:
             Result: Objeto contendo sucesso/falha e o caminho do arquivo baixado.
@@ -35,13 +38,17 @@ class AudioDownloader:
             encoded_credentials = b64encode(credentials.encode()).decode()
             headers = {'Authorization': f'Basic {encoded_credentials}'}
 
-            response = requests.get(media_url, headers=headers)
+            # A URL de mídia do Twilio redireciona para o armazenamento do arquivo.
+            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+                response = await client.get(media_url, headers=headers)
             response.raise_for_status()
 
             with tempfile.NamedTemporaryFile(suffix='.ogg', delete=False) as temp_file:
                 temp_file.write(response.content)
                 return Result.ok(data=temp_file.name)
-        except requests.RequestException as e:
+        except httpx.TimeoutException:
+            return Result.fail(error_message='Tempo esgotado ao fazer download do áudio.')
+        except httpx.HTTPError as e:
             return Result.fail(error_message=f'Erro ao fazer download do áudio: {e}')
 
 
@@ -49,6 +56,7 @@ class AudioConverter:
     """Classe responsável pela conversão de formatos de áudio."""
 
     @staticmethod
+    @timed_stage('audio_convert')
     async def convert_ogg_to_wav(ogg_path: str) -> Result:
         """
         Converte um arquivo OGG para WAV.
@@ -76,13 +84,15 @@ class CloudUploader:
         self.bucket_name = bucket_name
         self.storage_client = storage.Client()
 
-    async def upload_to_cloud_storage(self, file_path: str, folder: str) -> Result:
+    @timed_stage('audio_upload')
+    async def upload_to_cloud_storage(self, file_path: str, folder: str, timeout: float = 60.0) -> Result:
         """
         Faz o upload de um arquivo para o Google Cloud Storage.
 
         Args:
             file_path (str): Caminho do arquivo local.
             folder (str): Pasta no bucket onde o arquivo será armazenado.
+            timeout (float, opcional): Tempo limite do upload, em segundos. Padrão é 60.
 
         Returns:
             Result: Objeto contendo sucesso/falha e o nome do arquivo armazenado.
@@ -90,33 +100,7 @@ class CloudUploader:
         try:
             bucket = self.storage_client.bucket(self.bucket_name)
             blob = bucket.blob(f'{folder}/{uuid.uuid1()}')
-            blob.upload_from_filename(file_path)
+            await asyncio.to_thread(blob.upload_from_filename, file_path, timeout=timeout)
             return Result.ok(data=blob.name)
         except Exception as e:
             return Result.fail(error_message=f'Erro ao enviar arquivo para o Cloud Storage: {e}')
-
-
-class AudioTranscriber:
-    """Classe responsável pela transcrição de áudio de arquivos WAV."""
-
-    @staticmethod
-    async def transcribe_audio(wav_path: str) -> Result:
-        """
-        Transcreve áudio de um arquivo WAV.
-
-        Args:
-            wav_path (str): Caminho do arquivo WAV.
-
-        Returns:
-            Result: Objeto contendo sucesso/falha e o texto transcrito.
-        """
-        try:
-            recognizer = sr.Recognizer()
-            with sr.AudioFile(wav_path) as source:
-                audio_text = recognizer.record(source)
-                text = recognizer.recognize_google(audio_text, language='pt-BR')
-                return Result.ok(data=text)
-        except sr.UnknownValueError:
-            return Result.fail(error_message='Não foi possível reconhecer o áudio.')
-        except sr.RequestError as e:
-            return Result.fail(error_message=f'Erro ao usar o serviço de reconhecimento de fala: {e}')
@@ -1,13 +1,15 @@
+import asyncio
 import os
-import requests
 import vertexai
 import base64
+import httpx
 
 from dotenv import load_dotenv
 from vertexai.generative_models import GenerativeModel, Part, SafetySetting
 
 from utils.result import Result
 from utils.prompts import PROMPT_GEMINI_VISION
+from utils.timing import timed_stage
 
 
 load_dotenv()
@@ -69,12 +71,14 @@ class GeminiVision:
             cls._gemini_model = GenerativeModel('gemini-1.5-flash-002')
             cls._gemini_initialized = True
 
-    async def fetch_image(self, media_url: str) -> Result:
+    @timed_stage('image_download')
+    async def fetch_image(self, media_url: str, timeout: float = 10.0) -> Result:
         """
         Faz o download da imagem a partir de uma URL.
 
         Args:
             media_url (str): URL do arquivo de mídia.
+            timeout (float, opcional): Tempo limite do download, em segundos. Padrão é 10.
 
         Returns:
             Result: Objeto contendo sucesso/falha e o conteúdo da imagem em bytes.
@@ -84,18 +88,24 @@ class GeminiVision:
             encoded_credentials = base64.b64encode(credentials.encode()).decode()
             headers = {'Authorization': f'Basic {encoded_credentials}'}
 
-            response = requests.get(media_url, headers=headers)
+            # A URL de mídia do Twilio redireciona para o armazenamento do arquivo.
+            async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+                response = await client.get(media_url, headers=headers)
             response.raise_for_status()
             return Result.ok(data=response.content)
-        except requests.RequestException as e:
+        except httpx.TimeoutException:
+            return Result.fail(error_message='Tempo esgotado ao baixar a imagem.')
+        except httpx.HTTPError as e:
             return Result.fail(error_message=f'Erro ao baixar a imagem: {e}')
 
-    async def perform_gemini(self, image_content: bytes) -> Result:
+    @timed_stage('gemini')
+    async def perform_gemini(self, image_content: bytes, timeout: float = 30.0) -> Result:
         """
         Interpreta a imagem usando o modelo Gemini do Vertex AI.
 
         Args:
             image_content (bytes): Conteúdo da imagem em bytes.
+            timeout (float, opcional): Tempo limite da interpretação, em segundos. Padrão é 30.
 
         Returns:
             Result: Objeto contendo sucesso/falha e o texto (ou conteúdo) extraído da imagem.
@@ -107,15 +117,20 @@ class GeminiVision:
 
             image_part = Part.from_data(mime_type=mime_type, data=image_content)
 
-            response = self._gemini_model.generate_content(
-                [image_part, PROMPT_GEMINI_VISION],
-                generation_config=self._generation_config,
-                safety_settings=self._safety_settings,
-                stream=False,
+            response = await asyncio.wait_for(
+                self._gemini_model.generate_content_async(
+                    [image_part, PROMPT_GEMINI_VISION],
+                    generation_config=self._generation_config,
+                    safety_settings=self._safety_settings,
+                    stream=False,
+                ),
+                timeout=timeout,
             )
 
             return Result.ok(data=response.text)
 
+        except asyncio.TimeoutError:
+            return Result.fail(error_message='Tempo esgotado ao interpretar a imagem com Gemini.')
         except Exception as e:
             return Result.fail(error_message=f'Erro ao interpretar a imagem com Gemini: {e}')
 
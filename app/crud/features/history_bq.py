@@ -1,15 +1,245 @@
+import asyncio
+import json
+import logging
+import threading
 from datetime import datetime
+from typing import Optional
+
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
+from utils.metrics import HISTORY_QUERY_BYTES
 from utils.result import Result
 
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('write_api', 'legacy')
+
+# Definição da tabela do histórico. As consultas filtram sempre por `timestamp` (partição diária),
+# e o agrupamento por sessão e tipo de mensagem reduz o volume lido dentro de cada partição.
+# `row_id` é a chave de deduplicação de cada turno: um reenvio do spool pode gravar a mesma linha
+# mais de uma vez, e as consultas de leitura consideram só uma linha por `row_id`.
+HISTORY_SCHEMA = [
+    bigquery.SchemaField('session_id', 'STRING'),
+    bigquery.SchemaField('input', 'STRING'),
+    bigquery.SchemaField('timestamp', 'TIMESTAMP'),
+    bigquery.SchemaField('response', 'STRING'),
+    bigquery.SchemaField('response_time', 'FLOAT'),
+    bigquery.SchemaField('message_type', 'STRING'),
+    bigquery.SchemaField('stage_timings', 'JSON'),
+    bigquery.SchemaField('row_id', 'STRING'),
+]
+PARTITION_FIELD = 'timestamp'
+CLUSTERING_FIELDS = ['session_id', 'message_type']
+
+# Linhas da tabela a partir de `@since`, sem as duplicadas por reenvio (mesmo `row_id`). As linhas
+# repetidas têm o mesmo `timestamp`, definido ao entrar no buffer, e ficam na mesma partição.
+DEDUPED_ROWS_SQL = """
+    SELECT * FROM `{table}`
+    WHERE timestamp >= @since{condition}
+    QUALIFY row_id IS NULL OR ROW_NUMBER() OVER (PARTITION BY row_id) = 1
+"""
+
 
 class BigQueryStorage:
     """
     Classe responsável por interagir com o BigQuery para armazenamento de dados.
+
+    As linhas são gravadas pelo Storage Write API (`backend='write_api'`), em lotes serializados
+    em protobuf sobre um stream de longa duração por tabela (ver `HistoryWriteStream`), ou pela
+    API legada de streaming (`backend='legacy'`, `insert_rows_json`). Os metadados das tabelas são
+    consultados uma única vez e mantidos em cache.
+
+    A definição da tabela do histórico (`HISTORY_SCHEMA`, partição e agrupamento) também fica aqui:
+    `ensure_table` a cria ou migra, e as consultas de leitura filtram sempre pela partição.
+
+    Com `row_ids`, cada linha é gravada com a sua chave na coluna `row_id`, nos dois backends. O
+    Storage Write API não deduplica linhas reenviadas em outro stream (ex.: o reenvio do spool de
+    um lote gravado pouco antes de uma queda), e as consultas de leitura descartam essas cópias.
     """
 
-    def __init__(self):
-        self.client = bigquery.Client()
+    def __init__(
+        self,
+        backend: str = 'write_api',
+        client: Optional[bigquery.Client] = None,
+        write_client=None,
+        append_timeout_seconds: float = 30,
+        stream_factory=None,
+    ):
+        """
+        Inicializa o armazenamento.
+
+        Args:
+            backend (str, opcional): 'write_api' ou 'legacy'. Padrão é 'write_api'.
+            client (bigquery.Client, opcional): Cliente do BigQuery. Se omitido, é criado um.
+            write_client (BigQueryWriteClient, opcional): Cliente do Storage Write API. Se omitido,
+                é criado no primeiro lote.
+            append_timeout_seconds (float, opcional): Tempo limite da confirmação de cada lote no
+                Storage Write API. Padrão é 30.
+            stream_factory (Callable, opcional): Cria as conexões do Storage Write API (ver `HistoryWriteStream`).
+
+        Raises:
+            ValueError: Se o backend for desconhecido.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f'Backend do BigQuery desconhecido: {backend}')
+        self.backend = backend
+        self.client = client or bigquery.Client()
+        self.append_timeout_seconds = append_timeout_seconds
+        self.stream_factory = stream_factory
+        self._write_client = write_client
+        self._tables = {}
+        self._write_streams = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build_row(
+        session_id: str,
+        user_input: str,
+        response: str,
+        response_time: float,
+        message_type: str = 'text',
+        stage_timings: Optional[dict] = None,
+    ) -> dict:
+        """
+        Monta a linha do histórico de um turno, com o instante atual como `timestamp`.
+
+        Args:
+            session_id (str): ID da sessão do usuário.
+            user_input (str): Texto de entrada fornecido pelo usuário.
+            response (str): Resposta gerada pelo agente.
+            response_time (float): Tempo de resposta medido.
+            message_type (str): Tipo da mensagem enviada pelo usuário (texto, imagem, audio, location).
+            stage_timings (dict, opcional): Milissegundos gastos em cada etapa do turno (ver `StageTimings`).
+
+        Returns:
+            dict: Linha no formato da tabela de histórico.
+        """
+        row = {
+            'session_id': session_id,
+            'input': user_input,
+            'timestamp': datetime.utcnow().isoformat(),
+            'response': response,
+            'response_time': response_time,
+            'message_type': message_type,
+        }
+        if stage_timings is not None:
+            # Colunas JSON são enviadas como texto, tanto pela API legada quanto pelo Storage Write API.
+            row['stage_timings'] = json.dumps(stage_timings)
+        return row
+
+    def _ensure_table(self, dataset_id: str, table_id: str) -> list:
+        table_ref = f'{self.client.project}.{dataset_id}.{table_id}'
+        try:
+            table = self.client.get_table(table_ref)
+        except NotFound:
+            table = bigquery.Table(table_ref, schema=HISTORY_SCHEMA)
+            table.time_partitioning = bigquery.TimePartitioning(
+                type_=bigquery.TimePartitioningType.DAY, field=PARTITION_FIELD
+            )
+            table.clustering_fields = CLUSTERING_FIELDS
+            self._tables[table_ref] = self.client.create_table(table)
+            return ['created']
+
+        changes = []
+        existing = {field.name for field in table.schema}
+        missing = [field for field in HISTORY_SCHEMA if field.name not in existing]
+        if missing:
+            table.schema = list(table.schema) + missing
+            changes.append('schema')
+        if table.clustering_fields != CLUSTERING_FIELDS:
+            table.clustering_fields = CLUSTERING_FIELDS
+            changes.append('clustering_fields')
+        if changes:
+            table = self.client.update_table(table, changes)
+        if table.time_partitioning is None or table.time_partitioning.field != PARTITION_FIELD:
+            # A partição de uma tabela existente não pode ser alterada: é preciso recriá-la
+            # (ex.: CREATE TABLE ... PARTITION BY DATE(timestamp) AS SELECT * FROM a tabela atual).
+            logger.warning(f'Tabela {table_ref} sem partição por {PARTITION_FIELD}: as consultas leem a tabela toda')
+        self._tables[table_ref] = table
+        return changes
+
+    async def ensure_table(self, dataset_id: str, table_id: str) -> Result:
+        """
+        Cria a tabela do histórico, particionada por dia em `timestamp` e agrupada por `session_id`
+        e `message_type`, ou migra uma tabela existente (colunas que faltam e agrupamento).
+
+        Args:
+            dataset_id (str): ID do dataset no BigQuery.
+            table_id (str): ID da tabela no BigQuery.
+
+        Returns:
+            Result: Objeto Result com a lista das alterações feitas ('created', 'schema',
+            'clustering_fields'), vazia se a tabela já estava atualizada, ou erro.
+        """
+        try:
+            return Result.ok(data=await asyncio.to_thread(self._ensure_table, dataset_id, table_id))
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao criar ou migrar a tabela {dataset_id}.{table_id}: {e}')
+
+    def _get_table(self, dataset_id: str, table_id: str) -> bigquery.Table:
+        table_ref = f'{self.client.project}.{dataset_id}.{table_id}'
+        table = self._tables.get(table_ref)
+        if table is None:
+            table = self._tables[table_ref] = self.client.get_table(table_ref)
+        return table
+
+    def _get_write_stream(self, dataset_id: str, table_id: str):
+        # Importado sob demanda: a API legada não depende do google-cloud-bigquery-storage.
+        from google.cloud.bigquery_storage_v1 import BigQueryWriteClient
+
+        from crud.features.history_write_api import HistoryWriteStream
+
+        with self._lock:
+            key = (dataset_id, table_id)
+            if key not in self._write_streams:
+                if self._write_client is None:
+                    self._write_client = BigQueryWriteClient()
+                self._write_streams[key] = HistoryWriteStream(
+                    self._write_client,
+                    self._get_table(dataset_id, table_id),
+                    append_timeout_seconds=self.append_timeout_seconds,
+                    stream_factory=self.stream_factory,
+                )
+            return self._write_streams[key]
+
+    def _insert_rows(self, dataset_id: str, table_id: str, rows: list, row_ids: Optional[list]) -> list:
+        table = self._get_table(dataset_id, table_id)
+        if row_ids is not None and any(field.name == 'row_id' for field in table.schema):
+            # Sem a coluna (tabela ainda não migrada), só a API legada deduplica, pelo `insertId`.
+            rows = [{**row, 'row_id': row_id} for row_id, row in zip(row_ids, rows, strict=True)]
+
+        if self.backend == 'write_api':
+            self._get_write_stream(dataset_id, table_id).append(rows)
+            return []
+
+        if row_ids is None:
+            return self.client.insert_rows_json(table, rows)
+        return self.client.insert_rows_json(table, rows, row_ids=row_ids)
+
+    async def insert_rows(self, dataset_id: str, table_id: str, rows: list, row_ids: Optional[list] = None) -> Result:
+        """
+        Insere um lote de linhas em uma única chamada, sem bloquear o event loop.
+
+        Args:
+            dataset_id (str): ID do dataset no BigQuery.
+            table_id (str): ID da tabela no BigQuery.
+            rows (list): Linhas a serem inseridas (ver `build_row`).
+            row_ids (list, opcional): Chave de deduplicação de cada linha, gravada na coluna `row_id`
+                e enviada como `insertId` na API legada. Reenviar uma linha com a mesma chave não a
+                duplica nas consultas de leitura. Se omitido, as linhas não têm chave.
+
+        Returns:
+            Result: Objeto Result contendo sucesso ou erro.
+        """
+        try:
+            errors = await asyncio.to_thread(self._insert_rows, dataset_id, table_id, rows, row_ids)
+            if errors:
+                return Result.fail(error_message=f'Erro ao inserir linhas no BigQuery: {errors}')
+
+            return Result.ok(data='Dados inseridos com sucesso.')
+
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao armazenar resposta no BigQuery: {e}')
 
     async def store_response(
         self,
@@ -24,6 +254,9 @@ class BigQueryStorage:
         """
         Salva a resposta do agente no BigQuery.
 
+        Grava imediatamente uma única linha. No caminho das requisições, use o `HistoryWriter`,
+        que agrupa as linhas e grava em segundo plano.
+
         Args:
             dataset_id (str): ID do dataset no BigQuery.
             table_id (str): ID da tabela no BigQuery.
@@ -36,28 +269,115 @@ class BigQueryStorage:
         Returns:
             Result: Objeto Result contendo sucesso ou erro.
         """
-        try:
-            dataset_ref = f'{self.client.project}.{dataset_id}'
-            table_ref = f'{dataset_ref}.{table_id}'
+        row = self.build_row(session_id, user_input, response, response_time, message_type)
+        return await self.insert_rows(dataset_id, table_id, [row])
 
-            table = self.client.get_table(table_ref)
+    def _deduped_rows(self, dataset_id: str, table_id: str, condition: str = '') -> str:
+        return DEDUPED_ROWS_SQL.format(
+            table=f'{self.client.project}.{dataset_id}.{table_id}', condition=f' AND {condition}' if condition else ''
+        )
 
-            rows_to_insert = [
-                {
-                    'session_id': session_id,
-                    'input': user_input,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'response': response,
-                    'response_time': response_time,
-                    'message_type': message_type,
-                }
-            ]
-
-            errors = self.client.insert_rows_json(table, rows_to_insert)
-            if errors:
-                return Result.fail(error_message=f'Erro ao inserir linhas no BigQuery: {errors}')
+    def _query(self, name: str, sql: str, parameters: list, timeout: float) -> list:
+        job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+        job = self.client.query(sql, job_config=job_config)
+        rows = [dict(row.items()) for row in job.result(timeout=timeout)]
+        bytes_processed = job.total_bytes_processed or 0
+        HISTORY_QUERY_BYTES.labels(name).inc(bytes_processed)
+        logger.info(
+            f'Consulta {name}: {bytes_processed} bytes processados, {job.total_bytes_billed or 0} faturados '
+            f'(cache do BigQuery: {bool(job.cache_hit)}, {len(rows)} linhas)'
+        )
+        return rows
 
-            return Result.ok(data='Dados inseridos com sucesso.')
+    async def get_session_history(
+        self,
+        dataset_id: str,
+        table_id: str,
+        session_id: str,
+        since: datetime,
+        limit: int = 200,
+        timeout: float = 30,
+    ) -> Result:
+        """
+        Lê os turnos de uma sessão, do mais antigo para o mais recente, lendo apenas as partições
+        a partir de `since`. Linhas repetidas pelo reenvio do spool aparecem uma única vez.
 
+        Args:
+            dataset_id (str): ID do dataset no BigQuery.
+            table_id (str): ID da tabela no BigQuery.
+            session_id (str): ID da sessão do usuário.
+            since (datetime): Início do período consultado (UTC).
+            limit (int, opcional): Quantidade máxima de turnos (os mais recentes). Padrão é 200.
+            timeout (float, opcional): Tempo limite da consulta. Padrão é 30.
+
+        Returns:
+            Result: Objeto Result com a lista de turnos ou erro.
+        """
+        sql = f"""
+            SELECT * FROM (
+                SELECT session_id, input, timestamp, response, response_time, message_type, stage_timings
+                FROM ({self._deduped_rows(dataset_id, table_id, 'session_id = @session_id')})
+                ORDER BY timestamp DESC
+                LIMIT @limit
+            )
+            ORDER BY timestamp
+        """
+        parameters = [
+            bigquery.ScalarQueryParameter('since', 'TIMESTAMP', since),
+            bigquery.ScalarQueryParameter('session_id', 'STRING', session_id),
+            bigquery.ScalarQueryParameter('limit', 'INT64', limit),
+        ]
+        try:
+            return Result.ok(data=await asyncio.to_thread(self._query, 'session_history', sql, parameters, timeout))
         except Exception as e:
-            return Result.fail(error_message=f'Erro ao armazenar resposta no BigQuery: {e}')
+            return Result.fail(error_message=f'Erro ao consultar o histórico da sessão: {e}')
+
+    async def get_recent_sessions(
+        self, dataset_id: str, table_id: str, since: datetime, limit: int = 50, timeout: float = 30
+    ) -> Result:
+        """
+        Lista as sessões com mensagens a partir de `since`, da mais recente para a mais antiga.
+
+        Args:
+            dataset_id (str): ID do dataset no BigQuery.
+            table_id (str): ID da tabela no BigQuery.
+            since (datetime): Início do período consultado (UTC).
+            limit (int, opcional): Quantidade máxima de sessões. Padrão é 50.
+            timeout (float, opcional): Tempo limite da consulta. Padrão é 30.
+
+        Returns:
+            Result: Objeto Result com a lista de sessões (`session_id`, `first_message_at`,
+            `last_message_at`, `messages`, `message_types`) ou erro.
+        """
+        sql = f"""
+            SELECT
+                session_id,
+                MIN(timestamp) AS first_message_at,
+                MAX(timestamp) AS last_message_at,
+                COUNT(*) AS messages,
+                ARRAY_AGG(DISTINCT message_type IGNORE NULLS) AS message_types
+            FROM ({self._deduped_rows(dataset_id, table_id)})
+            GROUP BY session_id
+            ORDER BY last_message_at DESC
+            LIMIT @limit
+        """
+        parameters = [
+            bigquery.ScalarQueryParameter('since', 'TIMESTAMP', since),
+            bigquery.ScalarQueryParameter('limit', 'INT64', limit),
+        ]
+        try:
+            return Result.ok(data=await asyncio.to_thread(self._query, 'recent_sessions', sql, parameters, timeout))
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao consultar as sessões recentes: {e}')
+
+    def close(self):
+        """
+        Fecha os streams do Storage Write API e os clientes.
+        """
+        for stream in self._write_streams.values():
+            stream.close()
+        self._write_streams = {}
+        if self._write_client is not None:
+            self._write_client.transport.close()
+            self._write_client = None
+        self.client.close()
@@ -0,0 +1,117 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from crud.features.history_bq import BigQueryStorage
+from utils.metrics import HISTORY_QUERY_CACHE
+from utils.result import Result
+
+
+class HistoryReader:
+    """
+    Leitura do histórico de atendimentos no BigQuery para os supervisores.
+
+    Guarda os resultados das consultas em um cache TTL+LRU de curta duração, para que a mesma
+    sessão aberta por vários supervisores (ou atualizada em sequência) não repita a consulta.
+    Apenas resultados bem-sucedidos são guardados.
+
+    Attributes:
+        storage (BigQueryStorage): Armazenamento que executa as consultas.
+        dataset_id (str): ID do dataset do histórico.
+        table_id (str): ID da tabela do histórico.
+        cache_ttl_seconds (float): Validade de um resultado no cache.
+        cache_max_entries (int): Quantidade máxima de resultados no cache.
+        query_timeout_seconds (float): Tempo limite de cada consulta.
+    """
+
+    def __init__(
+        self,
+        storage: BigQueryStorage,
+        dataset_id: str,
+        table_id: str,
+        cache_ttl_seconds: float = 30,
+        cache_max_entries: int = 256,
+        query_timeout_seconds: float = 30,
+    ):
+        """
+        Inicializa o leitor.
+
+        Args:
+            storage (BigQueryStorage): Armazenamento que executa as consultas.
+            dataset_id (str): ID do dataset do histórico.
+            table_id (str): ID da tabela do histórico.
+            cache_ttl_seconds (float, opcional): Validade de um resultado no cache. Padrão é 30.
+            cache_max_entries (int, opcional): Quantidade máxima de resultados no cache. Padrão é 256.
+            query_timeout_seconds (float, opcional): Tempo limite de cada consulta. Padrão é 30.
+        """
+        self.storage = storage
+        self.dataset_id = dataset_id
+        self.table_id = table_id
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self.query_timeout_seconds = query_timeout_seconds
+        self._cache = OrderedDict()
+
+    def _get_cached(self, key: tuple) -> Optional[Result]:
+        entry = self._cache.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._cache.pop(key, None)
+            HISTORY_QUERY_CACHE.labels('miss').inc()
+            return None
+        self._cache.move_to_end(key)
+        HISTORY_QUERY_CACHE.labels('hit').inc()
+        return entry[1]
+
+    def _store(self, key: tuple, result: Result) -> Result:
+        if result.success:
+            self._cache[key] = (time.monotonic() + self.cache_ttl_seconds, result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    async def session_history(self, session_id: str, days: int = 7, limit: int = 200) -> Result:
+        """
+        Retorna os turnos de uma sessão nos últimos `days` dias.
+
+        Args:
+            session_id (str): ID da sessão (número do WhatsApp no formato Twilio).
+            days (int, opcional): Quantidade de dias consultados (partições lidas). Padrão é 7.
+            limit (int, opcional): Quantidade máxima de turnos (os mais recentes). Padrão é 200.
+
+        Returns:
+            Result: Objeto Result com a lista de turnos ou erro.
+        """
+        key = ('session', session_id, days, limit)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        result = await self.storage.get_session_history(
+            self.dataset_id, self.table_id, session_id, since, limit=limit, timeout=self.query_timeout_seconds
+        )
+        return self._store(key, result)
+
+    async def recent_sessions(self, hours: int = 24, limit: int = 50) -> Result:
+        """
+        Retorna as sessões com mensagens nas últimas `hours` horas, da mais recente para a mais antiga.
+
+        Args:
+            hours (int, opcional): Quantidade de horas consultadas. Padrão é 24.
+            limit (int, opcional): Quantidade máxima de sessões. Padrão é 50.
+
+        Returns:
+            Result: Objeto Result com a lista de sessões ou erro.
+        """
+        key = ('recent', hours, limit)
+        cached = self._get_cached(key)
+        if cached is not None:
+            return cached
+
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        result = await self.storage.get_recent_sessions(
+            self.dataset_id, self.table_id, since, limit=limit, timeout=self.query_timeout_seconds
+        )
+        return self._store(key, result)
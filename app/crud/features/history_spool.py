@@ -0,0 +1,215 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.ndjson'
+
+
+class SpoolSegment:
+    """
+    Segmento do spool reservado para reenvio.
+
+    Mantém o arquivo bloqueado (`flock`) enquanto estiver reservado, de modo que nenhum outro
+    processo o reenvie ao mesmo tempo. Deve ser encerrado com `remove` (após o reenvio) ou `release`.
+
+    Attributes:
+        path (str): Caminho do arquivo do segmento.
+        records (list): Registros do segmento, na ordem em que foram gravados.
+        discarded (int): Linhas ilegíveis ignoradas (ex.: a última linha de uma gravação interrompida).
+    """
+
+    def __init__(self, path: str, handle, records: list, discarded: int):
+        self.path = path
+        self.records = records
+        self.discarded = discarded
+        self._handle = handle
+
+    def remove(self):
+        """Apaga o segmento já reenviado e libera a reserva."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.release()
+
+    def release(self):
+        """Libera a reserva, mantendo o segmento para uma nova tentativa."""
+        if not self._handle.closed:
+            fcntl.flock(self._handle, fcntl.LOCK_UN)
+            self._handle.close()
+
+
+class HistorySpool:
+    """
+    Spool local, somente de acréscimo, das linhas do histórico que não puderam ser gravadas no BigQuery.
+
+    Os registros são gravados em segmentos NDJSON (um registro JSON por linha) no diretório do spool.
+    Cada processo grava no seu próprio segmento ativo, que troca por um novo ao atingir
+    `segment_max_bytes`. As gravações vão para o sistema operacional na hora e são confirmadas
+    em disco (`fsync`) em lote, por `sync`, em vez de uma a uma.
+
+    Os segmentos são reenviados do mais antigo para o mais novo, por qualquer processo que
+    consiga reservá-los (ver `claim`), inclusive os deixados por processos já encerrados.
+    Cada registro leva a chave `row_id`, gravada com a linha na coluna `row_id` (e enviada como
+    `insertId` na API legada), de modo que reenviar um segmento parcialmente gravado não duplica
+    as linhas nas consultas do histórico (ver `BigQueryStorage`).
+
+    Attributes:
+        directory (str): Diretório do spool.
+        max_bytes (int): Tamanho máximo do spool; acima dele, novos registros são recusados.
+        segment_max_bytes (int): Tamanho a partir do qual o segmento ativo é trocado por um novo.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024, segment_max_bytes: int = 8 * 1024 * 1024):
+        """
+        Inicializa o spool, criando o diretório se necessário.
+
+        Args:
+            directory (str): Diretório do spool. Deve estar em um volume persistente.
+            max_bytes (int, opcional): Tamanho máximo do spool. Padrão é 512 MiB.
+            segment_max_bytes (int, opcional): Tamanho máximo de cada segmento. Padrão é 8 MiB.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_max_bytes = segment_max_bytes
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_path: Optional[str] = None
+        self._active_bytes = 0
+        self._unsynced = 0
+        self._sequence = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_paths(self) -> list:
+        # O nome começa pelo instante de criação, em milissegundos: a ordem alfabética é a cronológica.
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _open_segment(self):
+        self._sequence += 1
+        name = f'{int(time.time() * 1000):013d}-{os.getpid()}-{self._sequence:06d}{SEGMENT_SUFFIX}'
+        self._active_path = os.path.join(self.directory, name)
+        self._active = open(self._active_path, 'ab')
+        fcntl.flock(self._active, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._active_bytes = 0
+
+    def _close_segment(self):
+        if self._active is None:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        fcntl.flock(self._active, fcntl.LOCK_UN)
+        self._active.close()
+        if self._active_bytes == 0:
+            os.remove(self._active_path)
+        self._active = None
+        self._active_path = None
+        self._unsynced = 0
+
+    def append(self, records: list) -> bool:
+        """
+        Acrescenta registros ao segmento ativo.
+
+        Args:
+            records (list): Registros a gravar (dicionários serializáveis em JSON).
+
+        Returns:
+            bool: False se o spool estiver cheio ou a gravação falhar; nesse caso nada é gravado.
+        """
+        data = b''.join(json.dumps(record, ensure_ascii=False).encode() + b'\n' for record in records)
+        with self._lock:
+            try:
+                if self.size_bytes() + len(data) > self.max_bytes:
+                    return False
+                if self._active is not None and self._active_bytes + len(data) > self.segment_max_bytes:
+                    self._close_segment()
+                if self._active is None:
+                    self._open_segment()
+                self._active.write(data)
+                self._active.flush()
+                self._active_bytes += len(data)
+                self._unsynced += len(records)
+                return True
+            except OSError as e:
+                logger.error(f'Falha ao gravar no spool do histórico: {e}')
+                return False
+
+    def sync(self):
+        """
+        Confirma em disco os registros acrescentados desde a última confirmação.
+        """
+        with self._lock:
+            if self._active is not None and self._unsynced:
+                os.fsync(self._active.fileno())
+                self._unsynced = 0
+
+    def rotate(self):
+        """
+        Fecha o segmento ativo deste processo, tornando-o disponível para reenvio.
+        """
+        with self._lock:
+            self._close_segment()
+
+    @property
+    def has_active_records(self) -> bool:
+        return self._active_bytes > 0 and self._active is not None
+
+    def size_bytes(self) -> int:
+        """Tamanho total dos segmentos no spool, em bytes."""
+        total = 0
+        for path in self._segment_paths():
+            try:
+                total += os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+        return total
+
+    def oldest_age_seconds(self) -> float:
+        """Idade do segmento mais antigo, em segundos (zero se o spool estiver vazio)."""
+        paths = self._segment_paths()
+        if not paths:
+            return 0.0
+        created_ms = int(os.path.basename(paths[0]).split('-', 1)[0])
+        return max(time.time() - created_ms / 1000, 0.0)
+
+    def claim(self):
+        """
+        Reserva, um por vez, os segmentos fechados que nenhum outro processo está gravando ou reenviando.
+
+        Yields:
+            SpoolSegment: Segmento reservado, do mais antigo para o mais novo.
+        """
+        for path in self._segment_paths():
+            try:
+                handle = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                continue
+            # Outro processo pode ter reenviado e apagado o segmento entre a listagem e a reserva.
+            if not os.path.exists(path) or os.stat(path).st_ino != os.fstat(handle.fileno()).st_ino:
+                handle.close()
+                continue
+
+            records = []
+            discarded = 0
+            for line in handle:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    discarded += 1
+            yield SpoolSegment(path, handle, records, discarded)
+
+    def close(self):
+        """Confirma em disco e fecha o segmento ativo."""
+        self.rotate()
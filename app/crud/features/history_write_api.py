@@ -0,0 +1,222 @@
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from google.api_core import exceptions
+from google.cloud import bigquery
+from google.cloud.bigquery_storage_v1 import BigQueryWriteClient, types, writer
+from google.cloud.bigquery_storage_v1.exceptions import StreamClosedError
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+logger = logging.getLogger(__name__)
+
+_FIELD = descriptor_pb2.FieldDescriptorProto
+
+# Tipo do campo protobuf correspondente a cada tipo de coluna do BigQuery.
+PROTO_TYPES = {
+    'STRING': _FIELD.TYPE_STRING,
+    'JSON': _FIELD.TYPE_STRING,
+    'DATE': _FIELD.TYPE_STRING,
+    'DATETIME': _FIELD.TYPE_STRING,
+    'TIME': _FIELD.TYPE_STRING,
+    'INTEGER': _FIELD.TYPE_INT64,
+    'INT64': _FIELD.TYPE_INT64,
+    'TIMESTAMP': _FIELD.TYPE_INT64,
+    'FLOAT': _FIELD.TYPE_DOUBLE,
+    'FLOAT64': _FIELD.TYPE_DOUBLE,
+    'BOOLEAN': _FIELD.TYPE_BOOL,
+    'BOOL': _FIELD.TYPE_BOOL,
+}
+
+# Erros após os quais a mesma requisição pode ser reenviada com o mesmo offset.
+RETRYABLE_ERRORS = (StreamClosedError, exceptions.ServiceUnavailable, exceptions.DeadlineExceeded, exceptions.Aborted)
+
+
+def _timestamp_micros(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp() * 1_000_000)
+    return int(value)
+
+
+class RowSerializer:
+    """
+    Converte as linhas do histórico (dicionários, como em `insert_rows_json`) em mensagens protobuf
+    montadas a partir do esquema da tabela.
+
+    Attributes:
+        descriptor (DescriptorProto): Descrição da mensagem, enviada como esquema do stream.
+    """
+
+    def __init__(self, schema: list, message_name: str = 'HistoryRow'):
+        """
+        Args:
+            schema (list): Colunas da tabela (`bigquery.SchemaField`).
+            message_name (str, opcional): Nome da mensagem protobuf. Padrão é 'HistoryRow'.
+
+        Raises:
+            ValueError: Se a tabela tiver uma coluna de tipo não suportado (ex.: RECORD).
+        """
+        file_proto = descriptor_pb2.FileDescriptorProto(name=f'{message_name}.proto', package='history')
+        message_proto = file_proto.message_type.add(name=message_name)
+        self._types = {}
+        for number, field in enumerate(schema, start=1):
+            proto_type = PROTO_TYPES.get(field.field_type)
+            if proto_type is None:
+                raise ValueError(f'Tipo de coluna não suportado: {field.name} ({field.field_type})')
+            label = _FIELD.LABEL_REPEATED if field.mode == 'REPEATED' else _FIELD.LABEL_OPTIONAL
+            message_proto.field.add(name=field.name, number=number, type=proto_type, label=label)
+            self._types[field.name] = field.field_type
+
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        self._message_class = message_factory.GetMessageClass(pool.FindMessageTypeByName(f'history.{message_name}'))
+        self.descriptor = message_proto
+
+    def _convert(self, field_type: str, value):
+        if field_type == 'TIMESTAMP':
+            return _timestamp_micros(value)
+        if field_type == 'JSON' and not isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def serialize(self, row: dict) -> bytes:
+        """
+        Serializa uma linha.
+
+        Raises:
+            ValueError: Se a linha tiver uma coluna que não existe na tabela.
+        """
+        message = self._message_class()
+        for name, value in row.items():
+            if value is None:
+                continue
+            field_type = self._types.get(name)
+            if field_type is None:
+                raise ValueError(f'Coluna inexistente na tabela: {name}')
+            if isinstance(value, (list, tuple)):
+                getattr(message, name).extend(self._convert(field_type, item) for item in value)
+            else:
+                setattr(message, name, self._convert(field_type, value))
+        return message.SerializeToString()
+
+
+class HistoryWriteStream:
+    """
+    Stream de longa duração do Storage Write API para uma tabela do histórico.
+
+    Usa um stream do tipo COMMITTED (as linhas ficam visíveis assim que confirmadas) e envia cada
+    lote com o offset esperado no stream. Se a conexão cair antes da confirmação, o mesmo lote é
+    reenviado com o mesmo offset, e uma resposta ALREADY_EXISTS indica que a primeira tentativa
+    já tinha sido gravada: cada lote é gravado exatamente uma vez no stream. Quando o resultado de
+    um lote fica indefinido, o stream é abandonado e um novo é criado no próximo lote, para que
+    nenhum lote seguinte seja confundido com ele.
+
+    Os envios são serializados (um lote por vez), como exige a ordem dos offsets.
+
+    Attributes:
+        table_path (str): Caminho da tabela ('projects/.../datasets/.../tables/...').
+    """
+
+    def __init__(
+        self,
+        write_client: BigQueryWriteClient,
+        table: bigquery.Table,
+        append_timeout_seconds: float = 30,
+        max_attempts: int = 3,
+        stream_factory: Optional[Callable] = None,
+    ):
+        """
+        Args:
+            write_client (BigQueryWriteClient): Cliente do Storage Write API.
+            table (bigquery.Table): Tabela de destino, com o esquema.
+            append_timeout_seconds (float, opcional): Tempo limite da confirmação de cada lote. Padrão é 30.
+            max_attempts (int, opcional): Tentativas de envio de cada lote. Padrão é 3.
+            stream_factory (Callable, opcional): Cria a conexão de envio a partir da requisição inicial
+                (ex.: um dublê local nos benchmarks). Se omitido, usa `AppendRowsStream`.
+        """
+        self.write_client = write_client
+        self.table_path = f'projects/{table.project}/datasets/{table.dataset_id}/tables/{table.table_id}'
+        self.append_timeout_seconds = append_timeout_seconds
+        self.max_attempts = max_attempts
+        self.stream_factory = stream_factory or (lambda template: writer.AppendRowsStream(write_client, template))
+        self.serializer = RowSerializer(table.schema)
+        self._lock = threading.Lock()
+        self._write_stream: Optional[str] = None
+        self._connection = None
+        self._offset = 0
+
+    def _connect(self):
+        if self._write_stream is None:
+            write_stream = self.write_client.create_write_stream(
+                parent=self.table_path, write_stream=types.WriteStream(type_=types.WriteStream.Type.COMMITTED)
+            )
+            self._write_stream = write_stream.name
+            self._offset = 0
+        if self._connection is None:
+            template = types.AppendRowsRequest(
+                write_stream=self._write_stream,
+                proto_rows=types.AppendRowsRequest.ProtoData(
+                    writer_schema=types.ProtoSchema(proto_descriptor=self.serializer.descriptor)
+                ),
+            )
+            self._connection = self.stream_factory(template)
+        return self._connection
+
+    def _disconnect(self, abandon_stream: bool = False):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception as e:
+                logger.debug(f'Erro ao fechar a conexão do stream {self._write_stream}: {e}')
+            self._connection = None
+        if abandon_stream:
+            self._write_stream = None
+
+    def append(self, rows: list):
+        """
+        Grava um lote de linhas no stream (chamada bloqueante).
+
+        Args:
+            rows (list): Linhas no formato de `insert_rows_json`.
+
+        Raises:
+            ValueError: Se alguma linha não corresponder ao esquema da tabela.
+            GoogleAPICallError: Se o lote for recusado ou não for confirmado após `max_attempts` tentativas.
+        """
+        rows_data = types.ProtoRows(serialized_rows=[self.serializer.serialize(row) for row in rows])
+        with self._lock:
+            request = types.AppendRowsRequest(
+                offset=self._offset, proto_rows=types.AppendRowsRequest.ProtoData(rows=rows_data)
+            )
+            for attempt in range(1, self.max_attempts + 1):
+                connection = self._connect()
+                try:
+                    connection.send(request).result(timeout=self.append_timeout_seconds)
+                except exceptions.AlreadyExists:
+                    if attempt == 1:
+                        # O offset não corresponde ao stream: recomeça em um stream novo.
+                        self._disconnect(abandon_stream=True)
+                        raise
+                except RETRYABLE_ERRORS as e:
+                    self._disconnect()
+                    if attempt == self.max_attempts:
+                        self._disconnect(abandon_stream=True)
+                        raise
+                    logger.warning(f'Reenviando lote ao stream {self._write_stream} (tentativa {attempt}): {e}')
+                    continue
+                except Exception:
+                    self._disconnect(abandon_stream=True)
+                    raise
+                self._offset += len(rows)
+                return
+
+    def close(self):
+        """Fecha a conexão do stream."""
+        with self._lock:
+            self._disconnect()
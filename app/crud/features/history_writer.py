@@ -0,0 +1,383 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+from crud.features.history_bq import BigQueryStorage
+from crud.features.history_spool import HistorySpool
+from utils.metrics import (
+    HISTORY_BATCH_ROWS,
+    HISTORY_BUFFER_ROWS,
+    HISTORY_FLUSH_SECONDS,
+    HISTORY_REPLAY_ROWS_PER_SECOND,
+    HISTORY_ROWS,
+    HISTORY_ROWS_DROPPED,
+    HISTORY_SPOOL_BYTES,
+    HISTORY_SPOOL_OLDEST_SECONDS,
+    HISTORY_SPOOL_ROWS,
+)
+from utils.result import Result
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+
+
+class HistoryWriter:
+    """
+    Grava o histórico de atendimentos no BigQuery em lotes, fora do caminho das respostas.
+
+    `enqueue` apenas coloca a linha em um buffer em memória e retorna imediatamente. Uma tarefa
+    em segundo plano grava o buffer quando ele atinge `batch_size` linhas ou quando a linha mais
+    antiga espera há `flush_interval_seconds`, agrupando as linhas por tabela em uma única chamada
+    cada. `aclose` grava o que restou no buffer antes de a aplicação encerrar.
+
+    Com um `HistorySpool`, as linhas de um lote que o BigQuery recusou, as que não cabem no buffer
+    cheio e as que não foram gravadas a tempo no encerramento vão para o spool local, e uma segunda
+    tarefa as reenvia em lote a cada `replay_interval_seconds`. Cada linha recebe um `row_id` ao
+    entrar no buffer, gravado com ela em todas as tentativas, nos dois backends do BigQuery. Um
+    reenvio de linhas que já tinham chegado ao BigQuery pode gravá-las de novo (no Storage Write
+    API, sempre que o lote original foi gravado em outro stream), mas as consultas de leitura
+    consideram uma única linha por `row_id`.
+
+    `enqueue` não grava no spool: as linhas do buffer cheio (ou recebidas depois do encerramento)
+    entram em uma fila gravada no spool por uma tarefa em segundo plano, em uma thread, para não
+    bloquear o event loop com E/S de disco justamente quando o BigQuery está lento. A fila tem no
+    máximo `max_buffer_rows` linhas; as que o spool recusar depois de aceitas são descartadas.
+
+    Sem spool (ou com a fila dele cheia), as linhas excedentes do buffer são descartadas conforme
+    `overflow_policy`, e todas as linhas perdidas são contadas em `history_rows_dropped_total`.
+
+    Attributes:
+        storage (BigQueryStorage): Armazenamento usado para gravar os lotes.
+        spool (HistorySpool): Spool local das linhas não gravadas, ou None.
+        max_buffer_rows (int): Quantidade máxima de linhas aguardando gravação.
+        batch_size (int): Quantidade de linhas que dispara uma gravação e limita cada lote.
+        flush_interval_seconds (float): Tempo máximo de espera de uma linha no buffer.
+        overflow_policy (str): 'drop_oldest' descarta a linha mais antiga para aceitar a nova;
+            'drop_newest' recusa a nova linha.
+        sync_interval_seconds (float): Intervalo entre as confirmações em disco do spool.
+        replay_interval_seconds (float): Intervalo entre as tentativas de reenvio do spool.
+    """
+
+    def __init__(
+        self,
+        storage: BigQueryStorage,
+        max_buffer_rows: int = 10000,
+        batch_size: int = 500,
+        flush_interval_seconds: float = 2.0,
+        overflow_policy: str = 'drop_oldest',
+        spool: Optional[HistorySpool] = None,
+        sync_interval_seconds: float = 1.0,
+        replay_interval_seconds: float = 10.0,
+    ):
+        """
+        Inicializa o gravador.
+
+        Args:
+            storage (BigQueryStorage): Armazenamento usado para gravar os lotes.
+            max_buffer_rows (int, opcional): Quantidade máxima de linhas no buffer. Padrão é 10000.
+            batch_size (int, opcional): Linhas por lote. Padrão é 500.
+            flush_interval_seconds (float, opcional): Espera máxima de uma linha no buffer. Padrão é 2.
+            overflow_policy (str, opcional): 'drop_oldest' ou 'drop_newest'. Padrão é 'drop_oldest'.
+            spool (HistorySpool, opcional): Spool local das linhas não gravadas. Se omitido, elas são descartadas.
+            sync_interval_seconds (float, opcional): Intervalo entre as confirmações em disco do spool. Padrão é 1.
+            replay_interval_seconds (float, opcional): Intervalo entre os reenvios do spool. Padrão é 10.
+
+        Raises:
+            ValueError: Se a política de transbordo for desconhecida.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f'Política de transbordo desconhecida: {overflow_policy}')
+        self.storage = storage
+        self.spool = spool
+        self.max_buffer_rows = max_buffer_rows
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.overflow_policy = overflow_policy
+        self.sync_interval_seconds = sync_interval_seconds
+        self.replay_interval_seconds = replay_interval_seconds
+        self._buffer = deque()
+        self._inflight = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._replay_task: Optional[asyncio.Task] = None
+        self._replay_ok = True
+        self._closed = False
+        self._spill_queue = []
+        self._spill_task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """Linhas aguardando gravação."""
+        return len(self._buffer)
+
+    def start(self):
+        """
+        Inicia as tarefas de gravação e de reenvio do spool em segundo plano, se ainda não estiverem em execução.
+        """
+        if self._task is None or self._task.done():
+            self._closed = False
+            self._task = asyncio.create_task(self._run())
+        if self.spool is not None and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.create_task(self._replay_loop())
+
+    def enqueue(
+        self,
+        dataset_id: str,
+        table_id: str,
+        session_id: str,
+        user_input: str,
+        response: str,
+        response_time: float,
+        message_type: str = 'text',
+        stage_timings: Optional[dict] = None,
+    ) -> Result:
+        """
+        Coloca o turno no buffer de gravação, sem aguardar o BigQuery.
+
+        Args:
+            dataset_id (str): ID do dataset no BigQuery.
+            table_id (str): ID da tabela no BigQuery.
+            session_id (str): ID da sessão do usuário.
+            user_input (str): Texto de entrada fornecido pelo usuário.
+            response (str): Resposta gerada pelo agente.
+            response_time (float): Tempo de resposta medido.
+            message_type (str): Tipo da mensagem enviada pelo usuário (texto, imagem, audio, location).
+            stage_timings (dict, opcional): Milissegundos gastos em cada etapa do turno (ver `StageTimings`).
+
+        Returns:
+            Result: Sucesso se a linha foi aceita (no buffer ou na fila do spool), ou erro se foi descartada.
+        """
+        record = {
+            'dataset_id': dataset_id,
+            'table_id': table_id,
+            'row_id': uuid.uuid4().hex,
+            'row': BigQueryStorage.build_row(
+                session_id, user_input, response, response_time, message_type, stage_timings
+            ),
+        }
+
+        if self._closed:
+            if self._spill_later(record, 'shutdown'):
+                return Result.ok(data=None)
+            HISTORY_ROWS_DROPPED.labels('shutdown').inc()
+            return Result.fail(error_message='Gravador do histórico encerrado; linha descartada.')
+
+        if len(self._buffer) >= self.max_buffer_rows:
+            if self._spill_later(record, 'overflow'):
+                return Result.ok(data=None)
+            HISTORY_ROWS_DROPPED.labels('overflow').inc()
+            if self.overflow_policy == 'drop_newest':
+                return Result.fail(error_message='Buffer do histórico cheio; linha descartada.')
+            self._buffer.popleft()
+
+        self._buffer.append((time.monotonic(), record))
+        HISTORY_BUFFER_ROWS.set(len(self._buffer))
+        self.start()
+        # A primeira linha inicia a contagem do intervalo; um lote completo é gravado na hora.
+        if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return Result.ok(data=None)
+
+    def _spill(self, records: list) -> bool:
+        """
+        Grava as linhas no spool (a confirmação em disco fica para o próximo `sync`).
+
+        Returns:
+            bool: False se não houver spool ou se ele recusar as linhas.
+        """
+        if self.spool is None or not self.spool.append(records):
+            return False
+        HISTORY_SPOOL_ROWS.labels('spooled').inc(len(records))
+        return True
+
+    def _spill_later(self, record: dict, reason: str) -> bool:
+        """
+        Coloca a linha na fila do spool, gravada em segundo plano por `_drain_spill_queue`.
+
+        Args:
+            record (dict): Linha a gravar no spool.
+            reason (str): Motivo contado em `history_rows_dropped_total` se o spool a recusar.
+
+        Returns:
+            bool: False se não houver spool ou se a fila estiver cheia.
+        """
+        if self.spool is None or len(self._spill_queue) >= self.max_buffer_rows:
+            return False
+        self._spill_queue.append((reason, record))
+        if self._spill_task is None or self._spill_task.done():
+            self._spill_task = asyncio.create_task(self._drain_spill_queue())
+        return True
+
+    async def _drain_spill_queue(self):
+        while self._spill_queue:
+            queued, self._spill_queue = self._spill_queue, []
+            if not await asyncio.to_thread(self._spill, [record for _, record in queued]):
+                for reason, _ in queued:
+                    HISTORY_ROWS_DROPPED.labels(reason).inc()
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                if self._closed:
+                    return
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            wait = self._buffer[0][0] + self.flush_interval_seconds - time.monotonic()
+            if self._closed or wait <= 0 or len(self._buffer) >= self.batch_size:
+                await self.flush()
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def flush(self):
+        """
+        Grava as linhas do buffer em lotes de até `batch_size`, até esvaziá-lo.
+
+        As linhas de um lote com falha vão para o spool; sem ele, são descartadas para não travar o buffer.
+        """
+        while self._buffer:
+            self._inflight = [self._buffer.popleft()[1] for _ in range(min(self.batch_size, len(self._buffer)))]
+            HISTORY_BUFFER_ROWS.set(len(self._buffer))
+
+            for (dataset_id, table_id), records in _group_by_table(self._inflight).items():
+                if not await self._write(dataset_id, table_id, records):
+                    if not await asyncio.to_thread(self._spill, records):
+                        HISTORY_ROWS_DROPPED.labels('write_error').inc(len(records))
+            self._inflight = []
+
+    async def _write(self, dataset_id: str, table_id: str, records: list) -> bool:
+        start = time.perf_counter()
+        rows = [record['row'] for record in records]
+        row_ids = [record['row_id'] for record in records]
+        result = await self.storage.insert_rows(dataset_id, table_id, rows, row_ids=row_ids)
+        outcome = 'success' if result.success else 'error'
+        HISTORY_FLUSH_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+        HISTORY_BATCH_ROWS.observe(len(records))
+        if result.success:
+            HISTORY_ROWS.labels('written').inc(len(records))
+        else:
+            HISTORY_ROWS.labels('failed').inc(len(records))
+            logger.error(f'Falha ao gravar {len(records)} linhas em {dataset_id}.{table_id}: {result.error_message}')
+        return result.success
+
+    async def _replay_loop(self):
+        next_replay = time.monotonic()
+        while True:
+            await asyncio.sleep(self.sync_interval_seconds)
+            try:
+                await asyncio.to_thread(self.spool.sync)
+                if time.monotonic() >= next_replay:
+                    await self.replay()
+                    next_replay = time.monotonic() + self.replay_interval_seconds
+                HISTORY_SPOOL_BYTES.set(await asyncio.to_thread(self.spool.size_bytes))
+                HISTORY_SPOOL_OLDEST_SECONDS.set(await asyncio.to_thread(self.spool.oldest_age_seconds))
+            except Exception as e:
+                logger.exception(f'Erro no reenvio do spool do histórico: {e}')
+
+    async def replay(self) -> bool:
+        """
+        Reenvia ao BigQuery os segmentos do spool, do mais antigo para o mais novo.
+
+        O segmento ativo só é fechado para reenvio depois de uma passagem sem falhas, para que,
+        durante uma indisponibilidade, as linhas continuem se acumulando nele em vez de gerarem
+        um segmento novo a cada tentativa. A passagem para no primeiro lote recusado; o segmento
+        permanece no spool e é reenviado por inteiro na próxima.
+
+        Returns:
+            bool: True se todos os segmentos disponíveis foram reenviados.
+        """
+        if self._replay_ok and self.spool.has_active_records:
+            await asyncio.to_thread(self.spool.rotate)
+
+        replayed = 0
+        start = time.perf_counter()
+        self._replay_ok = True
+        segments = self.spool.claim()
+        try:
+            while self._replay_ok:
+                segment = await asyncio.to_thread(next, segments, None)
+                if segment is None:
+                    break
+                replayed_segment = False
+                try:
+                    replayed_segment = await self._replay_segment(segment)
+                finally:
+                    if replayed_segment:
+                        await asyncio.to_thread(segment.remove)
+                    else:
+                        segment.release()
+                if not replayed_segment:
+                    self._replay_ok = False
+                    break
+                replayed += len(segment.records)
+                HISTORY_SPOOL_ROWS.labels('replayed').inc(len(segment.records))
+                HISTORY_SPOOL_ROWS.labels('discarded').inc(segment.discarded)
+        finally:
+            segments.close()
+
+        if replayed:
+            elapsed = time.perf_counter() - start
+            HISTORY_REPLAY_ROWS_PER_SECOND.set(replayed / elapsed if elapsed else 0.0)
+            logger.info(f'Histórico: {replayed} linhas reenviadas do spool em {elapsed:.2f}s')
+        return self._replay_ok
+
+    async def _replay_segment(self, segment) -> bool:
+        for (dataset_id, table_id), records in _group_by_table(segment.records).items():
+            for first in range(0, len(records), self.batch_size):
+                if not await self._write(dataset_id, table_id, records[first : first + self.batch_size]):
+                    return False
+        return True
+
+    async def aclose(self, timeout: Optional[float] = 10):
+        """
+        Deixa de aceitar linhas e grava o que restou no buffer.
+
+        Args:
+            timeout (float, opcional): Tempo máximo para esvaziar o buffer. As linhas ainda
+                pendentes ao fim do prazo vão para o spool (ou são descartadas, sem ele). Padrão é 10.
+        """
+        self._closed = True
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+            self._replay_task = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            # Inclui o lote interrompido no meio da gravação: se ele tiver chegado ao BigQuery,
+            # o reenvio do spool é descartado pela chave de deduplicação.
+            records = self._inflight + [record for _, record in self._buffer]
+            self._buffer.clear()
+            self._inflight = []
+            HISTORY_BUFFER_ROWS.set(0)
+            if await asyncio.to_thread(self._spill, records):
+                logger.warning(f'Histórico: {len(records)} linhas enviadas ao spool no encerramento')
+            else:
+                HISTORY_ROWS_DROPPED.labels('shutdown').inc(len(records))
+                logger.warning(f'Histórico: {len(records)} linhas descartadas no encerramento')
+        self._task = None
+        if self._spill_task is not None:
+            await asyncio.gather(self._spill_task, return_exceptions=True)
+            self._spill_task = None
+        if self.spool is not None:
+            await asyncio.to_thread(self.spool.close)
+
+
+def _group_by_table(records: list) -> dict:
+    tables = {}
+    for record in records:
+        tables.setdefault((record['dataset_id'], record['table_id']), []).append(record)
+    return tables
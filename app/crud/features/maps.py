@@ -2,6 +2,7 @@ import httpx
 import os
 from dotenv import load_dotenv
 from utils.result import Result
+from utils.timing import timed_stage
 
 
 load_dotenv()
@@ -9,13 +10,15 @@ load_dotenv()
 GOOGLE_MAPS_API_KEY = os.getenv('GOOGLE_MAPS_API_KEY')
 
 
-async def geocode_reverse(latitude, longitude):
+@timed_stage('geocode')
+async def geocode_reverse(latitude, longitude, timeout: float = 5.0):
     """
     Realiza geocodificação reversa para obter o endereço a partir das coordenadas.
 
     Args:
         latitude (str): Latitude da localização.
         longitude (str): Longitude da localização.
+        timeout (float, opcional): Tempo limite da consulta, em segundos. Padrão é 5.
 
     Returns:
         Result: Objeto contendo sucesso/falha e o endereço ou mensagem de erro.
@@ -24,7 +27,7 @@ async def geocode_reverse(latitude, longitude):
         url = (
             f'https://maps.googleapis.com/maps/api/geocode/json?latlng={latitude},{longitude}&key={GOOGLE_MAPS_API_KEY}'
         )
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=timeout) as client:
             response = await client.get(url)
             response.raise_for_status()
             data = response.json()
@@ -34,5 +37,7 @@ async def geocode_reverse(latitude, longitude):
             return Result.ok(data=address)
         else:
             return Result.fail(error_message='Endereço não encontrado para as coordenadas fornecidas.')
+    except httpx.TimeoutException:
+        return Result.fail(error_message='Tempo esgotado ao buscar o endereço.')
     except Exception as e:
         return Result.fail(error_message=f'Erro inesperado ao buscar o endereço: {e}')
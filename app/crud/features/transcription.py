@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import speech_recognition as sr
+
+from utils.result import Result
+from utils.timing import timed_stage
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBER_BACKENDS = ('google_web', 'faster_whisper')
+
+
+class TranscriptionError(Exception):
+    """
+    Falha da transcrição com a mensagem devolvida no Result (ex.: áudio sem fala reconhecível).
+    """
+
+
+class Transcriber(ABC):
+    """
+    Transcreve os áudios recebidos (arquivos WAV) para texto.
+
+    Cada backend implementa `_recognize`, síncrono, que roda em uma thread separada sem bloquear
+    o event loop. `transcribe_audio` aplica o tempo limite e converte as falhas em Result.
+
+    Attributes:
+        name (str): Nome do backend (ver `TRANSCRIBER_BACKENDS`).
+        language (str): Idioma dos áudios, no formato BCP 47 (ex.: 'pt-BR').
+    """
+
+    name = ''
+
+    def __init__(self, language: str = 'pt-BR'):
+        self.language = language
+
+    def load(self):
+        """
+        Prepara o backend (ex.: carrega o modelo). Chamado no aquecimento da aplicação e, se
+        ainda não tiver sido, na primeira transcrição.
+        """
+        # Por padrão não há o que preparar (ex.: o serviço web do Google).
+        return None
+
+    @abstractmethod
+    def _recognize(self, wav_path: str, deadline: float) -> str:
+        """
+        Transcreve o arquivo WAV. Executado em uma thread separada.
+
+        A thread continua depois que `transcribe_audio` desiste por tempo esgotado; `deadline`
+        (instante de `time.monotonic()`) permite a ela não começar um trabalho já abandonado.
+
+        Raises:
+            TranscriptionError: Se o áudio não puder ser transcrito.
+        """
+
+    @timed_stage('transcription')
+    async def transcribe_audio(self, wav_path: str, timeout: float = 30.0) -> Result:
+        """
+        Transcreve áudio de um arquivo WAV.
+
+        Args:
+            wav_path (str): Caminho do arquivo WAV.
+            timeout (float, opcional): Tempo limite da transcrição, em segundos. Padrão é 30.
+
+        Returns:
+            Result: Objeto contendo sucesso/falha e o texto transcrito.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            text = await asyncio.wait_for(asyncio.to_thread(self._recognize, wav_path, deadline), timeout=timeout)
+            return Result.ok(data=text)
+        except asyncio.TimeoutError:
+            return Result.fail(error_message='Tempo esgotado ao transcrever o áudio.')
+        except TranscriptionError as e:
+            return Result.fail(error_message=str(e))
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao transcrever o áudio ({self.name}): {e}')
+
+
+class GoogleWebTranscriber(Transcriber):
+    """
+    Transcrição pelo serviço web gratuito do Google, via `speech_recognition`.
+
+    Não tem SLA e envia o áudio pela rede; o tempo limite vale para a requisição HTTP.
+    """
+
+    name = 'google_web'
+
+    def _recognize(self, wav_path: str, deadline: float) -> str:
+        recognizer = sr.Recognizer()
+        recognizer.operation_timeout = max(deadline - time.monotonic(), 0.1)
+        try:
+            with sr.AudioFile(wav_path) as source:
+                audio_text = recognizer.record(source)
+            return recognizer.recognize_google(audio_text, language=self.language)
+        except sr.UnknownValueError:
+            raise TranscriptionError('Não foi possível reconhecer o áudio.') from None
+        except sr.RequestError as e:
+            raise TranscriptionError(f'Erro ao usar o serviço de reconhecimento de fala: {e}') from e
+
+
+class WhisperTranscriber(Transcriber):
+    """
+    Transcrição local, na CPU, com um modelo Whisper executado pelo `faster-whisper` (CTranslate2).
+
+    O modelo é carregado uma única vez por processo (cada worker do uvicorn tem a sua cópia na
+    memória) e mantido carregado entre as requisições. Com `compute_type='int8'`, os pesos são
+    quantizados em 8 bits, o que reduz a memória e acelera a inferência na CPU.
+
+    No máximo `num_workers` transcrições rodam ao mesmo tempo; as demais aguardam uma vaga dentro
+    do próprio tempo limite. Uma transcrição que estoura o tempo limite durante a inferência
+    continua ocupando a vaga até terminar, já que a inferência não pode ser interrompida; uma que
+    estoura antes de começar (aguardando a vaga ou o carregamento do modelo) não é executada.
+
+    Attributes:
+        model_size (str): Nome do modelo (ex.: 'small', 'medium') ou caminho de um modelo convertido.
+        compute_type (str): Precisão dos pesos na inferência (ex.: 'int8', 'int8_float32', 'float32').
+        cpu_threads (int): Threads de CPU por transcrição (0 usa o padrão do CTranslate2).
+        num_workers (int): Transcrições simultâneas.
+        beam_size (int): Largura do beam search (1 é a decodificação gulosa, a mais rápida).
+        vad_filter (bool): Se True, trechos sem fala são removidos antes da inferência.
+        download_root (str): Diretório dos modelos baixados, ou None para o cache padrão.
+    """
+
+    name = 'faster_whisper'
+
+    def __init__(
+        self,
+        language: str = 'pt-BR',
+        model_size: str = 'small',
+        compute_type: str = 'int8',
+        cpu_threads: int = 0,
+        num_workers: int = 1,
+        beam_size: int = 1,
+        vad_filter: bool = True,
+        download_root: Optional[str] = None,
+    ):
+        """
+        Inicializa o transcritor, sem carregar o modelo (ver `load`).
+
+        Args:
+            language (str, opcional): Idioma dos áudios, no formato BCP 47. Padrão é 'pt-BR'.
+            model_size (str, opcional): Nome ou caminho do modelo. Padrão é 'small'.
+            compute_type (str, opcional): Precisão dos pesos na inferência. Padrão é 'int8'.
+            cpu_threads (int, opcional): Threads de CPU por transcrição. Padrão é 0 (padrão do CTranslate2).
+            num_workers (int, opcional): Transcrições simultâneas. Padrão é 1.
+            beam_size (int, opcional): Largura do beam search. Padrão é 1.
+            vad_filter (bool, opcional): Se True, remove os trechos sem fala. Padrão é True.
+            download_root (str, opcional): Diretório dos modelos baixados. Padrão é o cache do Hugging Face.
+        """
+        super().__init__(language)
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self.beam_size = beam_size
+        self.vad_filter = vad_filter
+        self.download_root = download_root
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(num_workers)
+
+    def load(self):
+        """
+        Carrega o modelo, se ainda não estiver carregado, e faz uma inferência curta para
+        alocar os buffers antes da primeira requisição.
+        """
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+
+            # Importados sob demanda: o backend do Google não depende do faster-whisper.
+            import numpy as np
+            from faster_whisper import WhisperModel
+
+            model = WhisperModel(
+                self.model_size,
+                device='cpu',
+                compute_type=self.compute_type,
+                cpu_threads=self.cpu_threads,
+                num_workers=self.num_workers,
+                download_root=self.download_root,
+            )
+            segments, _ = model.transcribe(
+                np.zeros(16000, dtype=np.float32), language=self.language.split('-')[0], beam_size=1
+            )
+            list(segments)
+            self._model = model
+            logger.info(f'Modelo de transcrição {self.model_size} ({self.compute_type}) carregado')
+
+    def _recognize(self, wav_path: str, deadline: float) -> str:
+        self.load()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not self._slots.acquire(timeout=remaining):
+            raise TranscriptionError('Transcrição local ocupada; tempo esgotado aguardando uma vaga.')
+        try:
+            # Quem pediu a transcrição já desistiu: a vaga fica livre para o próximo áudio.
+            if time.monotonic() >= deadline:
+                raise TranscriptionError('Tempo esgotado antes de iniciar a transcrição.')
+            segments, _ = self._model.transcribe(
+                wav_path,
+                language=self.language.split('-')[0],
+                beam_size=self.beam_size,
+                vad_filter=self.vad_filter,
+                condition_on_previous_text=False,
+            )
+            # Os segmentos são decodificados sob demanda, durante a iteração.
+            text = ' '.join(segment.text.strip() for segment in segments).strip()
+        finally:
+            self._slots.release()
+
+        if not text:
+            raise TranscriptionError('Não foi possível reconhecer o áudio.')
+        return text
+
+
+def create_transcriber(backend: str, **config) -> Transcriber:
+    """
+    Cria o transcritor do backend informado.
+
+    Args:
+        backend (str): 'google_web' (serviço web do Google) ou 'faster_whisper' (modelo local na CPU).
+        **config: Parâmetros do construtor do backend (ver `GoogleWebTranscriber` e `WhisperTranscriber`).
+
+    Returns:
+        Transcriber: Transcritor, ainda não carregado.
+
+    Raises:
+        ValueError: Se o backend for desconhecido.
+    """
+    if backend == 'google_web':
+        return GoogleWebTranscriber(**config)
+    if backend == 'faster_whisper':
+        return WhisperTranscriber(**config)
+    raise ValueError(f'Backend de transcrição desconhecido: {backend} (opções: {", ".join(TRANSCRIBER_BACKENDS)})')
@@ -0,0 +1,237 @@
+import logging
+from typing import Optional
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately
+
+from crud.tools.get_person_data import CPF_PATTERN
+from utils.prompts import PROMPT_HISTORY_SUMMARY
+from utils.result import Result
+
+logging.basicConfig(
+    level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+LOCATION_PREFIX = 'Localização recebida'
+LOCATION_FACT_LABEL = 'Localização enviada'
+
+ROLE_LABELS = {'human': 'Cidadão', 'ai': 'Assistente'}
+
+
+class HistoryShaper:
+    """
+    Molda o histórico da sessão para caber em um orçamento de tokens.
+
+    As mensagens mais recentes são mantidas literalmente; as mais antigas são incorporadas
+    a um resumo contínuo, que é atualizado de forma incremental (apenas as mensagens que
+    saíram da janela são enviadas ao modelo, junto com o resumo anterior).
+
+    Attributes:
+        llm_adapter: Adaptador de LLM usado para gerar o resumo.
+        token_budget (int): Orçamento aproximado de tokens para o histórico enviado ao modelo.
+        min_recent_messages (int): Quantidade mínima de mensagens recentes mantidas literalmente.
+    """
+
+    def __init__(self, llm_adapter, token_budget: int = 3000, min_recent_messages: int = 4):
+        """
+        Inicializa o modelador de histórico.
+
+        Args:
+            llm_adapter: Adaptador de LLM (ex.: RoutingLLMAdapter) usado para resumir as mensagens antigas.
+                As chamadas passam pelo seu `asummarize`, com o controle de admissão e o failover
+                entre provedores.
+            token_budget (int, opcional): Orçamento de tokens do histórico. Padrão é 3000.
+            min_recent_messages (int, opcional): Mensagens recentes nunca resumidas. Padrão é 4.
+        """
+        self.llm_adapter = llm_adapter
+        self.token_budget = token_budget
+        self.min_recent_messages = min_recent_messages
+
+    @staticmethod
+    def count_tokens(messages: list) -> int:
+        """
+        Estima a quantidade de tokens de uma lista de mensagens.
+
+        Args:
+            messages (list): Mensagens no formato armazenado na sessão.
+
+        Returns:
+            int: Quantidade aproximada de tokens.
+        """
+        if not messages:
+            return 0
+        return count_tokens_approximately(messages)
+
+    def build_chat_history(self, summary: str, history: list) -> list:
+        """
+        Monta o histórico enviado ao modelo: o resumo (se houver) seguido das mensagens recentes.
+
+        Se a janela recente ainda não foi resumida e excede o orçamento, as mensagens mais
+        antigas são omitidas até que o histórico caiba no orçamento.
+
+        Args:
+            summary (str): Resumo contínuo das mensagens antigas.
+            history (list): Mensagens ainda não resumidas, da mais antiga para a mais recente.
+
+        Returns:
+            list: Histórico pronto para o prompt.
+        """
+        budget = self.token_budget
+        prefix = []
+        if summary:
+            summary_message = {'type': 'system', 'content': f'Resumo do atendimento até aqui:\n{summary}'}
+            prefix.append(summary_message)
+            budget -= self.count_tokens(prefix)
+
+        recent = []
+        used = 0
+        for message in reversed(history):
+            tokens = self.count_tokens([message])
+            if recent and used + tokens > budget and len(recent) >= self.min_recent_messages:
+                break
+            recent.append(message)
+            used += tokens
+
+        return prefix + list(reversed(recent))
+
+    def plan_fold(self, history: list) -> int:
+        """
+        Calcula quantas das mensagens mais antigas devem ser incorporadas ao resumo.
+
+        O resumo só é atualizado quando a janela recente excede o orçamento; nesse caso,
+        mensagens são retiradas até que a janela ocupe no máximo metade do orçamento, para
+        que a sumarização não ocorra a cada turno. O corte é sempre feito no início de um
+        turno (mensagem do cidadão), para não separar pergunta e resposta.
+
+        Args:
+            history (list): Mensagens ainda não resumidas, da mais antiga para a mais recente.
+
+        Returns:
+            int: Quantidade de mensagens a resumir (0 se nada precisa ser resumido).
+        """
+        if self.count_tokens(history) <= self.token_budget:
+            return 0
+
+        target = self.token_budget // 2
+        max_fold = len(history) - self.min_recent_messages
+        fold = 0
+        remaining = self.count_tokens(history)
+        while fold < max_fold and remaining > target:
+            remaining -= self.count_tokens([history[fold]])
+            fold += 1
+
+        while 0 < fold < max_fold and history[fold].get('type') != 'human':
+            fold += 1
+
+        return max(fold, 0)
+
+    @staticmethod
+    def extract_facts(messages: list) -> list:
+        """
+        Extrai de forma determinística os fatos que não podem se perder no resumo (CPF e localização).
+
+        Args:
+            messages (list): Mensagens a serem resumidas.
+
+        Returns:
+            list: Pares (rótulo, valor) dos fatos encontrados nas mensagens.
+        """
+        facts = []
+        for message in messages:
+            if message.get('type') != 'human':
+                continue
+            content = str(message.get('content', ''))
+            for cpf in CPF_PATTERN.findall(content):
+                facts.append(('CPF informado', cpf))
+            if content.startswith(LOCATION_PREFIX):
+                address = content.split('Endereço:', 1)[-1].strip()
+                facts.append((LOCATION_FACT_LABEL, address))
+        return facts
+
+    async def summarize(self, summary: str, messages: list) -> Result:
+        """
+        Incorpora mensagens antigas ao resumo contínuo.
+
+        Fatos extraídos deterministicamente (CPF e localização) das novas mensagens e do resumo
+        anterior que o modelo não tenha incluído no novo resumo são acrescentados ao final,
+        garantindo que nunca se percam.
+
+        Args:
+            summary (str): Resumo atual (pode ser vazio).
+            messages (list): Mensagens que estão saindo da janela recente.
+
+        Returns:
+            Result: Objeto contendo o novo resumo ou erro.
+        """
+        if not messages:
+            return Result.ok(data=summary)
+
+        transcript = '\n'.join(
+            f'{ROLE_LABELS.get(message.get("type"), message.get("type"))}: {message.get("content", "")}'
+            for message in messages
+        )
+        response_result = await self.llm_adapter.asummarize(
+            [
+                SystemMessage(content=PROMPT_HISTORY_SUMMARY),
+                HumanMessage(content=f'Resumo atual:\n{summary or "(vazio)"}\n\nNovas mensagens:\n{transcript}'),
+            ]
+        )
+        if not response_result.success:
+            return Result.fail(error_message=f'Erro ao resumir histórico: {response_result.error_message}')
+
+        new_summary = response_result.data.strip()
+
+        facts = self.extract_facts(messages)
+        facts += [('CPF informado', cpf) for cpf in CPF_PATTERN.findall(summary or '')]
+        for line in (summary or '').splitlines():
+            label, _, value = line.partition(': ')
+            if label == LOCATION_FACT_LABEL:
+                facts.append((label, value))
+        missing_facts = list(
+            dict.fromkeys(f'{label}: {value}' for label, value in facts if value and value not in new_summary)
+        )
+        if missing_facts:
+            new_summary = '\n'.join([new_summary, *missing_facts])
+
+        return Result.ok(data=new_summary)
+
+    async def fold(self, session_manager, session_id: str) -> Optional[int]:
+        """
+        Atualiza o resumo da sessão com as mensagens que saíram da janela recente.
+
+        Args:
+            session_manager (RedisSessionManager): Gerenciador de sessões onde o resumo é armazenado.
+            session_id (str): Identificador da sessão.
+
+        Returns:
+            Optional[int]: Quantidade de mensagens resumidas, ou None em caso de falha.
+        """
+        summary_result = await session_manager.get_session_summary(session_id)
+        if not summary_result.success:
+            logger.warning(f'Falha ao ler resumo da sessão {session_id}: {summary_result.error_message}')
+            return None
+
+        summary, upto = summary_result.data['text'], summary_result.data['upto']
+        history_result = await session_manager.get_session_history(session_id, start=upto)
+        if not history_result.success:
+            logger.warning(f'Falha ao ler histórico da sessão {session_id}: {history_result.error_message}')
+            return None
+
+        fold_count = self.plan_fold(history_result.data)
+        if fold_count == 0:
+            return 0
+
+        new_summary_result = await self.summarize(summary, history_result.data[:fold_count])
+        if not new_summary_result.success:
+            logger.warning(new_summary_result.error_message)
+            return None
+
+        save_result = await session_manager.set_session_summary(
+            session_id, new_summary_result.data, upto=upto + fold_count, expected_upto=upto
+        )
+        if not save_result.success:
+            logger.warning(f'Falha ao salvar resumo da sessão {session_id}: {save_result.error_message}')
+            return None
+
+        return fold_count
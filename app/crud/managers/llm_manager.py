@@ -58,3 +58,20 @@ class LLMManager:
             return Result.fail(error_message='Nenhum adaptador LLM configurado')
 
         return self.llm_adapter.generate_response(input_text, chat_history, context)
+
+    async def agenerate_response(self, input_text: str, chat_history: list, context: dict) -> Result:
+        """
+        Gera uma resposta de forma assíncrona usando o adaptador atual.
+
+        Args:
+            input_text (str): Texto de entrada
+            chat_history (list): Histórico da conversa
+            context (dict): Contexto adicional
+
+        Returns:
+            Result: Resultado contendo a resposta ou mensagem de erro
+        """
+        if not self.llm_adapter:
+            return Result.fail(error_message='Nenhum adaptador LLM configurado')
+
+        return await self.llm_adapter.agenerate_response(input_text, chat_history, context)
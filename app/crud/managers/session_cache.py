@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from typing import Optional
+
+from utils.metrics import SESSION_CACHE_BYTES, SESSION_CACHE_ENTRIES, SESSION_CACHE_EVICTIONS, SESSION_CACHE_LOOKUPS
+
+
+class CachedHistory:
+    """
+    Trecho do histórico de uma sessão mantido em memória.
+
+    Attributes:
+        version (int): Versão do histórico no Redis quando o trecho foi lido ou escrito.
+        base (int): Índice, na lista do Redis, da primeira mensagem do trecho.
+        messages (list): Mensagens decodificadas a partir de `base`.
+        sizes (list): Tamanho em bytes de cada mensagem, como armazenada no Redis.
+    """
+
+    __slots__ = ('version', 'base', 'messages', 'sizes', 'size')
+
+    def __init__(self, version: int, base: int, messages: list, sizes: list):
+        self.version = version
+        self.base = base
+        self.messages = messages
+        self.sizes = sizes
+        self.size = sum(sizes)
+
+    @property
+    def end(self) -> int:
+        """Índice seguinte à última mensagem do trecho."""
+        return self.base + len(self.messages)
+
+
+class SessionHistoryCache:
+    """
+    Cache LRU em memória dos históricos de sessões recentes.
+
+    O cache é compartilhado por todas as requisições do worker. Cada entrada guarda a versão
+    do histórico no Redis; o gerenciador de sessões compara essa versão com a do Redis antes
+    de usar a entrada, de modo que escritas feitas por outras réplicas são detectadas.
+
+    Attributes:
+        max_entries (int): Quantidade máxima de sessões mantidas em memória.
+        max_bytes (int): Tamanho máximo total, em bytes, das mensagens mantidas em memória.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Inicializa o cache.
+
+        Args:
+            max_entries (int, opcional): Quantidade máxima de sessões. Padrão é 1024.
+            max_bytes (int, opcional): Tamanho máximo total em bytes. Padrão é 64 MiB.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        """Tamanho total, em bytes, das mensagens em memória."""
+        return self._bytes
+
+    def get(self, session_id: str) -> Optional[CachedHistory]:
+        """
+        Retorna a entrada de uma sessão, marcando-a como usada recentemente.
+
+        Args:
+            session_id (str): Identificador da sessão.
+
+        Returns:
+            Optional[CachedHistory]: Entrada da sessão ou None se não estiver em cache.
+        """
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            self._entries.move_to_end(session_id)
+        return entry
+
+    def record(self, result: str):
+        """
+        Contabiliza o resultado de uma consulta ao cache.
+
+        Args:
+            result (str): 'hit', 'stale' (entrada desatualizada, completada com o delta) ou 'miss'.
+        """
+        SESSION_CACHE_LOOKUPS.labels(result=result).inc()
+
+    def put(self, session_id: str, version: int, base: int, messages: list, sizes: list):
+        """
+        Armazena (ou substitui) o trecho do histórico de uma sessão.
+
+        Args:
+            session_id (str): Identificador da sessão.
+            version (int): Versão do histórico no Redis.
+            base (int): Índice da primeira mensagem do trecho.
+            messages (list): Mensagens decodificadas.
+            sizes (list): Tamanho em bytes de cada mensagem.
+        """
+        self.invalidate(session_id)
+        entry = CachedHistory(version, base, messages, sizes)
+        if entry.size > self.max_bytes:
+            return
+
+        self._entries[session_id] = entry
+        self._bytes += entry.size
+        self._evict()
+        self._update_gauges()
+
+    def append(self, session_id: str, version: int, messages: list, sizes: list):
+        """
+        Acrescenta mensagens recém-escritas no Redis à entrada da sessão (write-through).
+
+        A entrada só é atualizada se estava na versão imediatamente anterior; caso contrário,
+        outra réplica escreveu na sessão e a entrada é descartada.
+
+        Args:
+            session_id (str): Identificador da sessão.
+            version (int): Nova versão do histórico, retornada pelo Redis após a escrita.
+            messages (list): Mensagens acrescentadas, já decodificadas.
+            sizes (list): Tamanho em bytes de cada mensagem.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        if entry.version != version - 1:
+            self.invalidate(session_id)
+            return
+
+        self.put(session_id, version, entry.base, entry.messages + messages, entry.sizes + sizes)
+
+    def trim(self, session_id: str, first: int):
+        """
+        Descarta da entrada as mensagens anteriores a `first`, que não serão mais lidas.
+
+        Args:
+            session_id (str): Identificador da sessão.
+            first (int): Índice da primeira mensagem a manter.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None or first <= entry.base:
+            return
+
+        offset = first - entry.base
+        removed = sum(entry.sizes[:offset])
+        entry.messages = entry.messages[offset:]
+        entry.sizes = entry.sizes[offset:]
+        entry.base = first
+        entry.size -= removed
+        self._bytes -= removed
+        self._update_gauges()
+
+    def invalidate(self, session_id: str):
+        """
+        Remove a entrada de uma sessão.
+
+        Args:
+            session_id (str): Identificador da sessão.
+        """
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            self._update_gauges()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._pop_oldest(reason='entries')
+        while self._bytes > self.max_bytes and self._entries:
+            self._pop_oldest(reason='bytes')
+
+    def _pop_oldest(self, reason: str):
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry.size
+        SESSION_CACHE_EVICTIONS.labels(reason=reason).inc()
+
+    def _update_gauges(self):
+        SESSION_CACHE_ENTRIES.set(len(self._entries))
+        SESSION_CACHE_BYTES.set(self._bytes)
@@ -0,0 +1,121 @@
+import json
+import zlib
+
+import msgpack
+
+# Primeiro byte de cada mensagem armazenada. Mensagens no formato antigo (JSON de `message.dict()`)
+# começam com '{' e continuam sendo lidas normalmente.
+FORMAT_MSGPACK = 0x01
+FORMAT_MSGPACK_ZLIB = 0x02
+
+LEGACY_JSON_PREFIX = ord('{')
+
+
+def _message_fields(message) -> dict:
+    """
+    Extrai apenas os campos necessários para reconstruir a mensagem.
+
+    Args:
+        message: Mensagem LangChain, dicionário no formato de `message.dict()` ou texto.
+
+    Returns:
+        dict: Campos compactos ('t' tipo, 'c' conteúdo e, se houver, chamadas de ferramenta).
+    """
+    if isinstance(message, dict):
+        data = message
+    elif hasattr(message, 'type') and hasattr(message, 'content'):
+        data = {
+            'type': message.type,
+            'content': message.content,
+            'tool_calls': getattr(message, 'tool_calls', None),
+            'tool_call_id': getattr(message, 'tool_call_id', None),
+            'name': getattr(message, 'name', None),
+        }
+    else:
+        data = {'type': 'human', 'content': str(message)}
+
+    fields = {'t': data.get('type', 'human'), 'c': data.get('content', '')}
+    tool_calls = data.get('tool_calls')
+    if tool_calls:
+        fields['tc'] = [{'n': call['name'], 'a': call['args'], 'i': call.get('id')} for call in tool_calls]
+    if data.get('tool_call_id'):
+        fields['ti'] = data['tool_call_id']
+    if data.get('type') == 'tool' and data.get('name'):
+        fields['n'] = data['name']
+    return fields
+
+
+def _fields_to_message(fields: dict) -> dict:
+    message = {'type': fields['t'], 'content': fields['c']}
+    if 'tc' in fields:
+        message['tool_calls'] = [
+            {'name': call['n'], 'args': call['a'], 'id': call['i'], 'type': 'tool_call'} for call in fields['tc']
+        ]
+    if 'ti' in fields:
+        message['tool_call_id'] = fields['ti']
+    if 'n' in fields:
+        message['name'] = fields['n']
+    return message
+
+
+def normalize_message(message) -> dict:
+    """
+    Converte uma mensagem para o formato de dicionário retornado por `decode_message`.
+
+    Args:
+        message: Mensagem LangChain, dicionário no formato de `message.dict()` ou texto.
+
+    Returns:
+        dict: Mensagem com as chaves 'type' e 'content' (e campos de ferramenta, se houver).
+    """
+    return _fields_to_message(_message_fields(message))
+
+
+def encode_message(message, compress_threshold: int = 1024) -> bytes:
+    """
+    Codifica uma mensagem no formato compacto de armazenamento.
+
+    Apenas o tipo, o conteúdo e os campos de chamada de ferramenta são mantidos, serializados
+    com MessagePack. Mensagens maiores que `compress_threshold` bytes são comprimidas com zlib.
+
+    Args:
+        message: Mensagem LangChain, dicionário no formato de `message.dict()` ou texto.
+        compress_threshold (int, opcional): Tamanho a partir do qual a mensagem é comprimida.
+            Padrão é 1024. Use 0 para nunca comprimir.
+
+    Returns:
+        bytes: Mensagem codificada, prefixada pelo byte de formato.
+    """
+    payload = msgpack.packb(_message_fields(message), use_bin_type=True)
+    if compress_threshold and len(payload) > compress_threshold:
+        compressed = zlib.compress(payload)
+        if len(compressed) < len(payload):
+            return bytes([FORMAT_MSGPACK_ZLIB]) + compressed
+    return bytes([FORMAT_MSGPACK]) + payload
+
+
+def decode_message(data: bytes) -> dict:
+    """
+    Decodifica uma mensagem armazenada, em qualquer um dos formatos suportados.
+
+    Args:
+        data (bytes): Mensagem como lida do Redis.
+
+    Returns:
+        dict: Mensagem com as chaves 'type' e 'content' (e campos de ferramenta, se houver),
+            aceita diretamente pelos prompts do LangChain.
+
+    Raises:
+        ValueError: Se o formato da mensagem for desconhecido.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+
+    header = data[0]
+    if header == LEGACY_JSON_PREFIX:
+        return normalize_message(json.loads(data))
+    if header == FORMAT_MSGPACK:
+        return _fields_to_message(msgpack.unpackb(data[1:], raw=False))
+    if header == FORMAT_MSGPACK_ZLIB:
+        return _fields_to_message(msgpack.unpackb(zlib.decompress(data[1:]), raw=False))
+    raise ValueError(f'Formato de mensagem desconhecido: {header}')
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import redis.asyncio as redis
+
+from utils.metrics import SESSION_LOCK_WAIT_SECONDS
+from utils.result import Result
+
+logger = logging.getLogger(__name__)
+
+# Emite uma senha (ticket) e, se a fila estiver livre, já concede a vez na mesma operação.
+# KEYS: next, serving, holder | ARGV: lease_ms, key_ttl
+TAKE_TICKET_SCRIPT = """
+local ticket = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+local serving = tonumber(redis.call('GET', KEYS[2]) or '0')
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    redis.call('SET', KEYS[2], serving)
+end
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+if serving + 1 == ticket then
+    local holder = redis.call('GET', KEYS[3])
+    if not holder or tonumber(holder) == ticket then
+        redis.call('SET', KEYS[3], ticket, 'PX', ARGV[1])
+        return {ticket, 1}
+    end
+end
+return {ticket, 0}
+"""
+
+# Verifica se chegou a vez da senha. Senhas abandonadas são puladas; se a senha da vez não
+# se apresentou dentro do prazo (holder expirado), ela também é pulada.
+# KEYS: serving, holder, abandoned | ARGV: ticket, lease_ms, grace_ms
+POLL_TICKET_SCRIPT = """
+local ticket = tonumber(ARGV[1])
+local serving = tonumber(redis.call('GET', KEYS[1]) or '0')
+local skipped = false
+while redis.call('SREM', KEYS[3], serving + 1) == 1 do
+    serving = redis.call('INCR', KEYS[1])
+    skipped = true
+end
+if skipped and serving + 1 ~= ticket then
+    redis.call('SET', KEYS[2], serving + 1, 'PX', ARGV[3])
+end
+if serving + 1 == ticket then
+    redis.call('SET', KEYS[2], ticket, 'PX', ARGV[2])
+    return 1
+end
+if serving + 1 > ticket then
+    return -1
+end
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    serving = redis.call('INCR', KEYS[1])
+    redis.call('SET', KEYS[2], serving + 1, 'PX', ARGV[3])
+end
+return 0
+"""
+
+# Libera a vez e reserva a próxima senha por `grace_ms`.
+# KEYS: serving, holder | ARGV: ticket, grace_ms
+RELEASE_TICKET_SCRIPT = """
+local ticket = tonumber(ARGV[1])
+local serving = tonumber(redis.call('GET', KEYS[1]) or '0')
+if serving + 1 ~= ticket then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('SET', KEYS[2], ticket + 1, 'PX', ARGV[2])
+return 1
+"""
+
+# Renova a concessão da senha que está com a vez. Retorna 0 se a vez já não é dela (ex.: a
+# concessão expirou e a senha foi pulada).
+# KEYS: holder | ARGV: ticket, lease_ms
+RENEW_TICKET_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[1]) or '-1') ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class RedisSessionLock:
+    """
+    Fila distribuída por sessão (ticket lock) que garante o processamento dos turnos em ordem.
+
+    Cada mensagem recebida retira uma senha sequencial no Redis e só é processada quando todas
+    as senhas anteriores da mesma sessão tiverem sido liberadas. Sessões diferentes usam chaves
+    diferentes e, portanto, seguem em paralelo. Uma senha cujo processo caiu é pulada quando sua
+    concessão (lease) expira, para que a sessão nunca fique travada.
+
+    Enquanto o turno está em andamento (ver `hold`), a concessão é renovada a cada terço de
+    `lease_seconds`, de modo que um turno longo não perde a vez para o seguinte. A concessão só
+    expira se o processo parar de renová-la (ex.: caiu ou perdeu a conexão com o Redis).
+
+    Attributes:
+        client (redis.Redis): Cliente Redis assíncrono.
+        key_prefix (str): Prefixo das chaves da fila.
+        lease_seconds (float): Validade da concessão sem renovação; é quanto tempo a sessão fica
+            parada se o processo com a vez cair.
+        wait_timeout_seconds (float): Tempo máximo de espera pela vez.
+        grace_seconds (float): Tempo que a próxima senha tem para assumir a vez após a liberação.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        key_prefix: str = 'session_history:',
+        lease_seconds: float = 120,
+        wait_timeout_seconds: float = 60,
+        grace_seconds: float = 5,
+        key_ttl_seconds: int = 86400,
+        poll_interval: float = 0.05,
+        max_poll_interval: float = 0.25,
+    ):
+        """
+        Inicializa a fila por sessão.
+
+        Args:
+            client (redis.Redis): Cliente Redis assíncrono.
+            key_prefix (str, opcional): Prefixo das chaves no Redis. Padrão é 'session_history:'.
+            lease_seconds (float, opcional): Validade da concessão sem renovação. Padrão é 120.
+            wait_timeout_seconds (float, opcional): Espera máxima pela vez. Padrão é 60.
+            grace_seconds (float, opcional): Prazo para a próxima senha assumir a vez. Padrão é 5.
+            key_ttl_seconds (int, opcional): Tempo de vida das chaves da fila. Padrão é 86400.
+            poll_interval (float, opcional): Intervalo inicial entre verificações, em segundos.
+            max_poll_interval (float, opcional): Intervalo máximo entre verificações, em segundos.
+        """
+        self.client = client
+        self.key_prefix = key_prefix
+        self.lease_seconds = lease_seconds
+        self.wait_timeout_seconds = wait_timeout_seconds
+        self.grace_seconds = grace_seconds
+        self.key_ttl_seconds = key_ttl_seconds
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._take_ticket = client.register_script(TAKE_TICKET_SCRIPT)
+        self._poll_ticket = client.register_script(POLL_TICKET_SCRIPT)
+        self._release_ticket = client.register_script(RELEASE_TICKET_SCRIPT)
+        self._renew_ticket = client.register_script(RENEW_TICKET_SCRIPT)
+
+    def _keys(self, session_id: str) -> dict:
+        base = f'{self.key_prefix}{session_id}:lock'
+        return {
+            'next': f'{base}:next',
+            'serving': f'{base}:serving',
+            'holder': f'{base}:holder',
+            'abandoned': f'{base}:abandoned',
+        }
+
+    async def acquire(self, session_id: str, timeout: Optional[float] = None) -> Result:
+        """
+        Aguarda a vez da sessão para processar um turno.
+
+        Args:
+            session_id (str): Identificador da sessão.
+            timeout (float, opcional): Tempo máximo de espera desta chamada (ex.: o que resta do
+                prazo da requisição), limitado a `wait_timeout_seconds`.
+
+        Returns:
+            Result: Objeto contendo a senha obtida (necessária para `release`) ou erro, caso a
+                vez não chegue dentro do tempo de espera.
+        """
+        wait_timeout = self.wait_timeout_seconds if timeout is None else min(timeout, self.wait_timeout_seconds)
+        keys = self._keys(session_id)
+        lease_ms = int(self.lease_seconds * 1000)
+        grace_ms = int(self.grace_seconds * 1000)
+        start = time.perf_counter()
+
+        try:
+            ticket, granted = await self._take_ticket(
+                keys=[keys['next'], keys['serving'], keys['holder']], args=[lease_ms, self.key_ttl_seconds]
+            )
+            ticket = int(ticket)
+
+            interval = self.poll_interval
+            while not granted:
+                if time.perf_counter() - start > wait_timeout:
+                    await self._abandon(keys, ticket)
+                    SESSION_LOCK_WAIT_SECONDS.labels(outcome='timeout').observe(time.perf_counter() - start)
+                    return Result.fail(error_message='Tempo de espera pela vez da sessão esgotado')
+
+                await asyncio.sleep(interval)
+                interval = min(interval * 2, self.max_poll_interval)
+
+                status = await self._poll_ticket(
+                    keys=[keys['serving'], keys['holder'], keys['abandoned']], args=[ticket, lease_ms, grace_ms]
+                )
+                if status == -1:
+                    SESSION_LOCK_WAIT_SECONDS.labels(outcome='skipped').observe(time.perf_counter() - start)
+                    return Result.fail(error_message='A vez da sessão expirou antes de ser assumida')
+                granted = status == 1
+        except Exception as e:
+            SESSION_LOCK_WAIT_SECONDS.labels(outcome='error').observe(time.perf_counter() - start)
+            return Result.fail(error_message=f'Erro ao aguardar a vez da sessão: {str(e)}')
+
+        SESSION_LOCK_WAIT_SECONDS.labels(outcome='acquired').observe(time.perf_counter() - start)
+        return Result.ok(data=ticket)
+
+    async def _abandon(self, keys: dict, ticket: int):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.sadd(keys['abandoned'], ticket)
+            pipe.expire(keys['abandoned'], self.key_ttl_seconds)
+            await pipe.execute()
+
+    async def _keep_alive(self, session_id: str, ticket: int):
+        holder_key = self._keys(session_id)['holder']
+        lease_ms = int(self.lease_seconds * 1000)
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self._renew_ticket(keys=[holder_key], args=[ticket, lease_ms]):
+                    logger.warning(f'Sessão {session_id}: a vez do turno expirou antes do fim do processamento')
+                    return
+            except Exception as e:
+                # Uma falha isolada não perde a vez: a concessão ainda vale por dois terços do prazo.
+                logger.warning(f'Erro ao renovar a vez da sessão {session_id}: {e}')
+
+    @asynccontextmanager
+    async def hold(self, session_id: str, ticket: int):
+        """
+        Mantém a vez da sessão durante o bloco, renovando a concessão em segundo plano, e a
+        libera ao final.
+
+        Args:
+            session_id (str): Identificador da sessão.
+            ticket (int): Senha retornada por `acquire`.
+        """
+        keep_alive = asyncio.create_task(self._keep_alive(session_id, ticket))
+        try:
+            yield
+        finally:
+            keep_alive.cancel()
+            await asyncio.gather(keep_alive, return_exceptions=True)
+            await self.release(session_id, ticket)
+
+    async def release(self, session_id: str, ticket: int) -> Result:
+        """
+        Libera a vez da sessão, permitindo que o próximo turno seja processado.
+
+        Args:
+            session_id (str): Identificador da sessão.
+            ticket (int): Senha retornada por `acquire`.
+
+        Returns:
+            Result: Objeto indicando sucesso ou falha na operação.
+        """
+        keys = self._keys(session_id)
+        try:
+            await self._release_ticket(
+                keys=[keys['serving'], keys['holder']], args=[ticket, int(self.grace_seconds * 1000)]
+            )
+            return Result.ok()
+        except Exception as e:
+            return Result.fail(error_message=f'Erro ao liberar a vez da sessão: {str(e)}')
@@ -2,24 +2,88 @@ import os
 import re
 import requests
 import logging
+from typing import Optional
 
 from dotenv import load_dotenv
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
+
+from crud.tools.lupa_client import NOT_FOUND_MESSAGE, LupaClient
+from utils.result import Result
+from utils.timing import timed_stage
 
 load_dotenv()
 
 LUPA_API_KEY = os.getenv('LUPA_API_KEY')
 BASE_URL = os.getenv('BASE_URL')
 
+LUPA_TIMEOUT_SECONDS = float(os.getenv('LUPA_TIMEOUT_SECONDS', '10'))
+LUPA_CONNECT_TIMEOUT_SECONDS = float(os.getenv('LUPA_CONNECT_TIMEOUT_SECONDS', '3'))
+
+CPF_PATTERN = re.compile(r'\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b')
+
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(
     level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler()]
 )
 
+lupa_client = LupaClient(
+    base_url=BASE_URL,
+    api_key=LUPA_API_KEY,
+    timeout_seconds=LUPA_TIMEOUT_SECONDS,
+    connect_timeout_seconds=LUPA_CONNECT_TIMEOUT_SECONDS,
+    max_connections=int(os.getenv('LUPA_MAX_CONNECTIONS', '20')),
+    cache_ttl_seconds=float(os.getenv('LUPA_CACHE_TTL_SECONDS', '900')),
+    negative_ttl_seconds=float(os.getenv('LUPA_NEGATIVE_TTL_SECONDS', '60')),
+    cache_max_entries=int(os.getenv('LUPA_CACHE_MAX_ENTRIES', '2048')),
+)
+_session = requests.Session()
+
+
+def is_valid_cpf(cpf: str) -> bool:
+    """
+    Verifica os dígitos verificadores de um CPF.
+
+    Args:
+        cpf (str): CPF com ou sem pontuação.
+
+    Returns:
+        bool: True se o CPF tiver 11 dígitos, não repetidos, e dígitos verificadores corretos.
+    """
+    digits = [int(d) for d in re.sub(r'\D', '', cpf)]
+    if len(digits) != 11 or len(set(digits)) == 1:
+        return False
+    for position in (9, 10):
+        total = sum(digit * (position + 1 - index) for index, digit in enumerate(digits[:position]))
+        if (total * 10) % 11 % 10 != digits[position]:
+            return False
+    return True
+
+
+def find_cpf(text: str) -> Optional[str]:
+    """
+    Procura no texto o primeiro CPF válido (números de telefone com 11 dígitos são descartados
+    pelos dígitos verificadores).
+
+    Args:
+        text (str): Texto enviado pelo cidadão.
+
+    Returns:
+        Optional[str]: CPF encontrado, somente dígitos, ou None.
+    """
+    for candidate in CPF_PATTERN.findall(text or ''):
+        if is_valid_cpf(candidate):
+            return re.sub(r'\D', '', candidate)
+    return None
+
+
+def _to_observation(result: Result):
+    return result.data if result.success else result.error_message
+
 
-@tool
-def get_person_data(cpf: str):
+# Versão síncrona, usada apenas quando o agente é executado com `invoke`. Compartilha o cache
+# do cliente assíncrono.
+def _get_person_data(cpf: str):
     """
     Retorna os dados do cidadão a partir do CPF fornecido.
 
@@ -29,23 +93,75 @@ def get_person_data(cpf: str):
     Returns:
         dict: Dicionário contendo os dados da pessoa ou mensagem de erro.
     """
-    try:
-        cpf_clean = re.sub(r'\D', '', cpf)
+    cpf_clean = re.sub(r'\D', '', cpf)
+
+    if len(cpf_clean) != 11:
+        return 'CPF inválido. Verifique se digitou corretamente.'
 
-        if len(cpf_clean) != 11:
-            return 'CPF inválido. Verifique se digitou corretamente.'
+    cached = lupa_client.get_cached(cpf_clean)
+    if cached is not None:
+        return _to_observation(cached)
 
-        response = requests.get(
+    try:
+        response = _session.get(
             f'{BASE_URL}/ibioseg/pessoa',
             params={'cpf': cpf_clean},
             headers={'Authorization': f'Api-Key {LUPA_API_KEY}'},
             verify=False,
+            timeout=(LUPA_CONNECT_TIMEOUT_SECONDS, LUPA_TIMEOUT_SECONDS),
         )
         logger.info(f'GET {response.url} - Status: {response.status_code}')
+        if response.status_code == 404 or (response.ok and not response.json()):
+            lupa_client.store(cpf_clean, Result.fail(error_message=NOT_FOUND_MESSAGE), found=False)
+            return NOT_FOUND_MESSAGE
         response.raise_for_status()
         person_data = response.json()
         logger.info(f'Pessoa encontrada: {person_data}')
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         return 'Erro ao buscar dados da pessoa: ' + str(e)
 
+    lupa_client.store(cpf_clean, Result.ok(data=person_data), found=True)
     return person_data
+
+
+@timed_stage('lupa')
+async def _aget_person_data(cpf: str):
+    """
+    Versão assíncrona de `_get_person_data`, usada quando o agente é executado com `ainvoke`.
+
+    Usa o cliente LUPA compartilhado: conexões persistentes, cache por CPF e uma única chamada
+    à API para consultas simultâneas do mesmo CPF.
+
+    Args:
+        cpf (str): Número de CPF do cidadão (com ou sem pontuação).
+
+    Returns:
+        dict: Dicionário contendo os dados da pessoa ou mensagem de erro.
+    """
+    cpf_clean = re.sub(r'\D', '', cpf)
+
+    if len(cpf_clean) != 11:
+        return 'CPF inválido. Verifique se digitou corretamente.'
+
+    result = await lupa_client.get_person(cpf_clean)
+    if result.success:
+        logger.info(f'Pessoa encontrada: {result.data}')
+    return _to_observation(result)
+
+
+# Descrição enviada ao modelo no esquema da ferramenta. Explícita para que as docstrings das
+# versões síncrona e assíncrona fiquem livres para notas de implementação.
+PERSON_DATA_DESCRIPTION = """Retorna os dados do cidadão a partir do CPF fornecido.
+
+Args:
+    cpf (str): Número de CPF do cidadão (com ou sem pontuação).
+
+Returns:
+    dict: Dicionário contendo os dados da pessoa ou mensagem de erro."""
+
+get_person_data = StructuredTool.from_function(
+    func=_get_person_data,
+    coroutine=_aget_person_data,
+    name='get_person_data',
+    description=PERSON_DATA_DESCRIPTION,
+)
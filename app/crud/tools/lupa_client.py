@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+
+from utils.metrics import LUPA_LOOKUPS, LUPA_REQUEST_SECONDS
+from utils.result import Result
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_MESSAGE = 'CPF não localizado na base de dados.'
+
+
+class LupaClient:
+    """
+    Cliente assíncrono da API LUPA de consulta de pessoas por CPF.
+
+    Mantém um pool de conexões persistente, aplica tempos limite explícitos e guarda os
+    resultados em um cache TTL+LRU: CPFs encontrados ficam `cache_ttl_seconds` no cache e
+    CPFs não localizados, `negative_ttl_seconds`. Falhas transitórias (tempo limite, erros 5xx)
+    não são guardadas. Consultas simultâneas do mesmo CPF compartilham uma única chamada à API.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        timeout_seconds: float = 10,
+        connect_timeout_seconds: float = 3,
+        max_connections: int = 20,
+        cache_ttl_seconds: float = 900,
+        negative_ttl_seconds: float = 60,
+        cache_max_entries: int = 2048,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Inicializa o cliente.
+
+        Args:
+            base_url (str): URL base da API LUPA.
+            api_key (str): Chave de acesso à API.
+            timeout_seconds (float, opcional): Tempo limite de leitura de cada chamada. Padrão é 10.
+            connect_timeout_seconds (float, opcional): Tempo limite de conexão. Padrão é 3.
+            max_connections (int, opcional): Tamanho máximo do pool de conexões. Padrão é 20.
+            cache_ttl_seconds (float, opcional): Validade de um CPF encontrado no cache. Padrão é 900.
+            negative_ttl_seconds (float, opcional): Validade de um CPF não localizado no cache. Padrão é 60.
+            cache_max_entries (int, opcional): Quantidade máxima de CPFs no cache. Padrão é 2048.
+            transport (httpx.AsyncBaseTransport, opcional): Transporte HTTP alternativo (ex.: o dublê
+                local dos testes de carga). Se omitido, usa a rede.
+        """
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url or '',
+                headers={'Authorization': f'Api-Key {self.api_key}'},
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport,
+                verify=False,
+            )
+        return self._client
+
+    def get_cached(self, cpf: str) -> Optional[Result]:
+        """
+        Retorna o resultado em cache para o CPF, se ainda válido.
+
+        Args:
+            cpf (str): CPF somente com dígitos.
+
+        Returns:
+            Optional[Result]: Resultado guardado, ou None se ausente ou expirado.
+        """
+        entry = self._cache.get(cpf)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._cache[cpf]
+            return None
+        self._cache.move_to_end(cpf)
+        return result
+
+    def store(self, cpf: str, result: Result, found: bool):
+        """
+        Guarda o resultado de uma consulta concluída, removendo os CPFs menos usados se necessário.
+
+        Args:
+            cpf (str): CPF somente com dígitos.
+            result (Result): Resultado da consulta.
+            found (bool): Se o CPF foi localizado (define a validade no cache).
+        """
+        ttl = self.cache_ttl_seconds if found else self.negative_ttl_seconds
+        self._cache[cpf] = (time.monotonic() + ttl, result)
+        self._cache.move_to_end(cpf)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, cpf: str) -> Result:
+        started_at = time.perf_counter()
+        try:
+            response = await self._get_client().get('/ibioseg/pessoa', params={'cpf': cpf})
+            logger.info(f'GET {response.url} - Status: {response.status_code}')
+            if response.status_code == 404:
+                outcome, result = 'not_found', Result.fail(error_message=NOT_FOUND_MESSAGE)
+            else:
+                response.raise_for_status()
+                person_data = response.json()
+                if person_data:
+                    outcome, result = 'found', Result.ok(data=person_data)
+                else:
+                    outcome, result = 'not_found', Result.fail(error_message=NOT_FOUND_MESSAGE)
+        except (httpx.HTTPError, ValueError) as e:
+            LUPA_REQUEST_SECONDS.labels('error').observe(time.perf_counter() - started_at)
+            return Result.fail(error_message='Erro ao buscar dados da pessoa: ' + str(e))
+
+        LUPA_REQUEST_SECONDS.labels(outcome).observe(time.perf_counter() - started_at)
+        self.store(cpf, result, found=outcome == 'found')
+        return result
+
+    async def get_person(self, cpf: str) -> Result:
+        """
+        Consulta os dados da pessoa pelo CPF, usando o cache e compartilhando consultas em andamento.
+
+        Args:
+            cpf (str): CPF somente com dígitos.
+
+        Returns:
+            Result: Dados da pessoa, ou falha com a mensagem de CPF não localizado ou de erro na consulta.
+        """
+        cached = self.get_cached(cpf)
+        if cached is not None:
+            LUPA_LOOKUPS.labels('hit' if cached.success else 'negative_hit').inc()
+            return cached
+
+        task = self._inflight.get(cpf)
+        if task is not None:
+            LUPA_LOOKUPS.labels('coalesced').inc()
+        else:
+            LUPA_LOOKUPS.labels('miss').inc()
+            task = asyncio.ensure_future(self._fetch(cpf))
+            self._inflight[cpf] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cpf, None))
+
+        # O cancelamento de quem aguarda (ex.: hedge perdedor) não interrompe a consulta compartilhada.
+        return await asyncio.shield(task)
+
+    async def aclose(self):
+        """
+        Encerra o pool de conexões. Deve ser chamada no desligamento da aplicação.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
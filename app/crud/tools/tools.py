@@ -1,13 +1,150 @@
-from crud.tools.get_person_data import get_person_data
+import asyncio
+import importlib
+import logging
+import pkgutil
+from typing import Optional
+
+from langchain_core.tools import StructuredTool
+
+from utils.deadline import cap_timeout
+from utils.metrics import TOOL_TIMEOUTS
+
+logger = logging.getLogger(__name__)
+
+TOOLS_PACKAGE = 'crud.tools'
+
+
+def parse_timeouts(value: str) -> dict:
+    """
+    Converte a lista de tempos limite por ferramenta das configurações em um dicionário.
+
+    Args:
+        value (str): Pares 'nome:segundos' separados por vírgula (ex.: 'get_person_data:8,validate_address:5').
+
+    Returns:
+        dict: Tempo limite, em segundos, por nome de ferramenta.
+    """
+    timeouts = {}
+    for entry in (value or '').split(','):
+        name, _, seconds = entry.strip().partition(':')
+        if name and seconds:
+            timeouts[name] = float(seconds)
+    return timeouts
 
 
 class Tools:
     """
-    Classe para agrupar e gerenciar as ferramentas (tools) disponíveis para os modelos LLM.
+    Registro das ferramentas (tools) disponíveis para os modelos LLM.
+
+    As ferramentas são descobertas nos módulos do pacote `crud.tools` (qualquer `StructuredTool`
+    definida no nível do módulo) ou registradas explicitamente com `register`. Cada ferramenta
+    registrada tem um tempo limite próprio na execução assíncrona, limitado também pelo prazo da
+    requisição em andamento: ao estourá-lo, o agente recebe uma mensagem de indisponibilidade como
+    resultado, em vez de aguardar indefinidamente.
+
+    Quando o modelo pede várias ferramentas na mesma resposta, o `AgentExecutor` as executa em
+    paralelo no event loop (`asyncio.gather`), de modo que a etapa dura o tempo da mais lenta.
 
     Attributes:
-        get_person_data_tool: Ferramenta para obter dados de pessoas a partir do CPF.
+        default_timeout_seconds (float): Tempo limite das ferramentas sem valor específico.
+        timeouts (dict): Tempo limite, em segundos, por nome de ferramenta.
     """
 
-    def __init__(self):
-        self.get_person_data_tool = get_person_data
+    def __init__(self, default_timeout_seconds: float = 15, timeouts: Optional[dict] = None, discover: bool = True):
+        """
+        Inicializa o registro.
+
+        Args:
+            default_timeout_seconds (float, opcional): Tempo limite padrão das ferramentas. Padrão é 15.
+            timeouts (dict, opcional): Tempo limite por nome de ferramenta, sobrepondo o padrão.
+            discover (bool, opcional): Registra as ferramentas encontradas no pacote `crud.tools`.
+                Padrão é True.
+        """
+        self.default_timeout_seconds = default_timeout_seconds
+        self.timeouts = dict(timeouts or {})
+        self._tools = {}
+        if discover:
+            self.discover()
+
+    def discover(self, package: str = TOOLS_PACKAGE):
+        """
+        Importa os módulos do pacote e registra as ferramentas definidas neles.
+
+        Os módulos são percorridos em ordem alfabética, para que a lista de ferramentas enviada ao
+        modelo (e, com ela, o prefixo do prompt) seja sempre a mesma.
+
+        Args:
+            package (str, opcional): Pacote onde procurar as ferramentas. Padrão é 'crud.tools'.
+        """
+        for module_info in sorted(pkgutil.iter_modules(importlib.import_module(package).__path__)):
+            module = importlib.import_module(f'{package}.{module_info.name}')
+            for value in vars(module).values():
+                if isinstance(value, StructuredTool) and value.name not in self._tools:
+                    self.register(value)
+
+    def register(self, tool: StructuredTool, timeout_seconds: Optional[float] = None) -> StructuredTool:
+        """
+        Registra uma ferramenta, aplicando o tempo limite à sua execução assíncrona.
+
+        Args:
+            tool (StructuredTool): Ferramenta a ser registrada.
+            timeout_seconds (float, opcional): Tempo limite da ferramenta. Se omitido, usa o valor
+                configurado para o nome dela ou o padrão.
+
+        Returns:
+            StructuredTool: Ferramenta registrada (cópia com o tempo limite aplicado).
+
+        Raises:
+            ValueError: Se já houver uma ferramenta registrada com o mesmo nome.
+        """
+        if tool.name in self._tools:
+            raise ValueError(f'Ferramenta já registrada: {tool.name}')
+        if timeout_seconds is not None:
+            self.timeouts[tool.name] = timeout_seconds
+
+        registered = tool.model_copy(update={'coroutine': self._with_timeout(tool)})
+        self._tools[tool.name] = registered
+        logger.info(f'Ferramenta registrada: {tool.name} (tempo limite {self.timeout_for(tool.name)}s)')
+        return registered
+
+    def _with_timeout(self, tool: StructuredTool):
+        name = tool.name
+        coroutine = tool.coroutine
+        func = tool.func
+
+        async def run(*args, **kwargs):
+            call = coroutine(*args, **kwargs) if coroutine is not None else asyncio.to_thread(func, *args, **kwargs)
+            timeout = cap_timeout(self.timeout_for(name))
+            try:
+                return await asyncio.wait_for(call, timeout=timeout)
+            except asyncio.TimeoutError:
+                TOOL_TIMEOUTS.labels(name).inc()
+                logger.warning(f'Ferramenta {name} excedeu o tempo limite de {timeout}s')
+                return f'A consulta {name} não respondeu a tempo e está indisponível no momento.'
+
+        return run
+
+    def timeout_for(self, name: str) -> float:
+        """
+        Retorna o tempo limite, em segundos, da ferramenta.
+        """
+        return self.timeouts.get(name, self.default_timeout_seconds)
+
+    def get(self, name: str) -> StructuredTool:
+        """
+        Retorna a ferramenta registrada com o nome informado.
+
+        Raises:
+            KeyError: Se a ferramenta não estiver registrada.
+        """
+        return self._tools[name]
+
+    @property
+    def names(self) -> list:
+        return list(self._tools)
+
+    def as_list(self) -> list:
+        """
+        Retorna as ferramentas registradas, na ordem de registro, para vincular ao modelo e ao agente.
+        """
+        return list(self._tools.values())
@@ -1,5 +1,7 @@
 import asyncio
+import logging
 import time
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,12 +9,30 @@ from fastapi.responses import JSONResponse
 from starlette.status import HTTP_504_GATEWAY_TIMEOUT
 
 from api.v1.api import api_router
+from api.v1.dependencies import clients, settings
 from schemas.healthcheck import HealthCheck
-from crud.features.history_bq import BigQueryStorage
+from utils.metrics import metrics_app
 
-REQUEST_TIMEOUT_ERROR = 300
+logger = logging.getLogger(__name__)
+
+# Limite de segurança: cada etapa do webhook já respeita o prazo da requisição (`Deadline`), então o
+# limite global fica um pouco acima do maior prazo configurado, sem poder ficar abaixo dele.
+REQUEST_TIMEOUT_MARGIN_SECONDS = 5
+REQUEST_TIMEOUT_ERROR = (
+    max(settings.twilio_webhook_deadline_seconds, settings.background_deadline_seconds) + REQUEST_TIMEOUT_MARGIN_SECONDS
+)
+
+# Rotas fora do limite global: as consultas do histórico têm o próprio tempo limite
+# (`history_query_timeout_seconds`) e devolvem o seu erro, e as métricas não dependem de serviços externos.
+REQUEST_TIMEOUT_EXEMPT_PATHS = ('/api/v1/history', '/metrics')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await clients.startup()
+    yield
+    await clients.shutdown()
 
-bq_storage = BigQueryStorage()
 
 app = FastAPI(
     title='API ChatBot Gen AI - SSP',
@@ -22,15 +42,18 @@ app = FastAPI(
     openapi_tags=[
         {'name': 'Healthcheck', 'description': 'Healthcheck Endpoint'},
         {'name': 'Agent Twilio 190', 'description': 'Agente Twilio para o serviço 190'},
+        {'name': 'History', 'description': 'Leitura do histórico de atendimentos'},
     ],
+    lifespan=lifespan,
 )
 
 
 @app.middleware('http')
 async def process_time_and_timeout_middleware(request: Request, call_next):
     start_time = time.time()
+    timeout = None if request.url.path.startswith(REQUEST_TIMEOUT_EXEMPT_PATHS) else REQUEST_TIMEOUT_ERROR
     try:
-        response = await asyncio.wait_for(call_next(request), timeout=REQUEST_TIMEOUT_ERROR)
+        response = await asyncio.wait_for(call_next(request), timeout=timeout)
     except asyncio.TimeoutError:
         process_time = time.time() - start_time
         return JSONResponse(
@@ -43,15 +66,18 @@ async def process_time_and_timeout_middleware(request: Request, call_next):
         bq_data = request.state.bq_data
         bq_data['response_time'] = process_time
 
-        await bq_storage.store_response(
-            dataset_id='history',
-            table_id='chats',
+        store_result = clients.history_writer.enqueue(
+            dataset_id=settings.history_dataset_id,
+            table_id=settings.history_table_id,
             session_id=bq_data['session_id'],
             user_input=bq_data['user_input'],
             response=bq_data['response'],
             response_time=bq_data['response_time'],
             message_type=bq_data.get('message_type', 'text'),
+            stage_timings=bq_data.get('stage_timings'),
         )
+        if not store_result.success:
+            logger.warning(store_result.error_message)
 
     return response
 
@@ -70,3 +96,4 @@ async def healthcheck(request: Request):
 
 
 app.include_router(api_router, prefix='/api/v1')
+app.mount('/metrics', metrics_app())
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class HistoryTurn(BaseModel):
+    session_id: str
+    input: Optional[str] = None
+    timestamp: datetime
+    response: Optional[str] = None
+    response_time: Optional[float] = None
+    message_type: Optional[str] = None
+    stage_timings: Optional[dict[str, float]] = None
+
+
+class SessionHistory(BaseModel):
+    session_id: str
+    turns: list[HistoryTurn]
+
+
+class SessionSummary(BaseModel):
+    session_id: str
+    first_message_at: datetime
+    last_message_at: datetime
+    messages: int
+    message_types: list[str]
+
+
+class RecentSessions(BaseModel):
+    sessions: list[SessionSummary]
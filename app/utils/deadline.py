@@ -0,0 +1,96 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Prazo da requisição em andamento, para as etapas que não o recebem como argumento
+# (chamadas ao modelo e ferramentas executadas pelo agente).
+_current_deadline: ContextVar[Optional['Deadline']] = ContextVar('request_deadline', default=None)
+
+
+class Deadline:
+    """
+    Prazo de uma requisição, criado na entrada do webhook e repassado a todas as etapas.
+
+    Cada etapa usa o tempo restante como limite das suas próprias chamadas de rede e, quando
+    ele se esgota, degrada deliberadamente (por exemplo, respondendo com as coordenadas em vez
+    do endereço) em vez de travar ou falhar o turno inteiro.
+
+    Attributes:
+        seconds (float): Duração total do prazo.
+        expires_at (float): Instante (time.monotonic()) em que o prazo se esgota.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """
+        Retorna os segundos restantes até o fim do prazo (zero se já esgotado).
+        """
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """
+        Calcula o tempo limite de uma etapa.
+
+        Args:
+            cap (float, opcional): Limite próprio da etapa, usado se for menor que o tempo disponível.
+            reserve (float, opcional): Tempo reservado às etapas seguintes (ex.: a resposta do agente
+                depois da transcrição de um áudio). Padrão é 0.
+
+        Returns:
+            float: Segundos disponíveis para a etapa (zero se não houver mais tempo).
+        """
+        budget = max(self.remaining() - reserve, 0.0)
+        return budget if cap is None else min(budget, cap)
+
+    @contextmanager
+    def activate(self):
+        """
+        Torna este o prazo da requisição em andamento dentro do bloco (ver `current_deadline`).
+        """
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+
+
+@contextmanager
+def without_deadline():
+    """
+    Remove o prazo da requisição em andamento dentro do bloco, para tarefas criadas nele que
+    continuam depois do turno (ex.: a atualização do resumo da sessão).
+    """
+    token = _current_deadline.set(None)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """
+    Retorna o prazo da requisição em andamento, ou None fora de uma requisição com prazo.
+    """
+    return _current_deadline.get()
+
+
+def cap_timeout(timeout: float) -> float:
+    """
+    Limita um tempo limite ao que resta do prazo da requisição em andamento, se houver um.
+
+    Args:
+        timeout (float): Tempo limite próprio da operação.
+
+    Returns:
+        float: O menor entre o tempo limite e o tempo restante do prazo.
+    """
+    deadline = current_deadline()
+    return timeout if deadline is None else deadline.timeout(cap=timeout)
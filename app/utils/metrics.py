@@ -0,0 +1,173 @@
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, make_asgi_app
+from prometheus_client import multiprocess
+
+SESSION_LOCK_WAIT_SECONDS = Histogram(
+    'session_lock_wait_seconds',
+    'Tempo de espera pela vez da sessão antes de processar um turno.',
+    ['outcome'],
+    buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+SESSION_CACHE_LOOKUPS = Counter(
+    'session_cache_lookups_total',
+    'Consultas ao cache em memória de históricos de sessão, por resultado (hit, stale, miss).',
+    ['result'],
+)
+SESSION_CACHE_EVICTIONS = Counter(
+    'session_cache_evictions_total',
+    'Entradas removidas do cache de históricos por falta de espaço, por limite atingido.',
+    ['reason'],
+)
+SESSION_CACHE_ENTRIES = Gauge('session_cache_entries', 'Sessões mantidas no cache de históricos.')
+SESSION_CACHE_BYTES = Gauge('session_cache_bytes', 'Bytes de mensagens mantidos no cache de históricos.')
+
+LLM_ROUTING_EVENTS = Counter(
+    'llm_routing_events_total',
+    'Eventos do roteamento entre provedores de LLM (success, error, timeout, hedge, hedge_win, cancelled, deadline, rejected).',
+    ['provider', 'event'],
+)
+
+LLM_REQUEST_SECONDS = Histogram(
+    'llm_request_seconds',
+    'Duração de cada chamada ao modelo de linguagem, por provedor, modelo e resultado.',
+    ['provider', 'model', 'outcome'],
+    buckets=(0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60),
+)
+LLM_TOKENS = Counter(
+    'llm_tokens_total',
+    'Tokens consumidos nas chamadas ao modelo, por tipo (prompt, completion).',
+    ['provider', 'model', 'type'],
+)
+LLM_PROMPT_TOKENS = Counter(
+    'llm_prompt_tokens_total',
+    'Tokens de entrada enviados aos modelos, por situação no cache do provedor (read, write, uncached).',
+    ['provider', 'model', 'cache'],
+)
+LLM_ERRORS = Counter(
+    'llm_errors_total',
+    'Erros durante a execução do agente, por etapa (llm, tool, agent) e tipo de exceção.',
+    ['provider', 'model', 'stage', 'error_type'],
+)
+AGENT_ITERATIONS = Histogram(
+    'agent_iterations',
+    'Quantidade de chamadas ao modelo feitas pelo agente para responder a um turno.',
+    ['provider', 'model'],
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15),
+)
+TOOL_CALL_SECONDS = Histogram(
+    'tool_call_seconds',
+    'Duração das chamadas de ferramentas do agente, por ferramenta e resultado.',
+    ['tool', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+TOOL_TIMEOUTS = Counter(
+    'tool_call_timeouts_total',
+    'Chamadas de ferramentas interrompidas pelo tempo limite da ferramenta.',
+    ['tool'],
+)
+
+LLM_ADMISSION_QUEUE_DEPTH = Gauge(
+    'llm_admission_queue_depth',
+    'Chamadas aguardando uma vaga no controle de admissão do provedor.',
+    ['provider'],
+)
+LLM_ADMISSION_IN_FLIGHT = Gauge(
+    'llm_admission_in_flight',
+    'Chamadas em andamento no provedor.',
+    ['provider'],
+)
+LLM_ADMISSION_WAIT_SECONDS = Histogram(
+    'llm_admission_wait_seconds',
+    'Tempo de espera por uma vaga no provedor, por resultado (admitted, queue_full, deadline).',
+    ['provider', 'outcome'],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+LLM_ADMISSION_RETRIES = Counter(
+    'llm_admission_retries_total',
+    'Novas tentativas de chamadas ao provedor, por motivo (código HTTP ou tipo de erro).',
+    ['provider', 'reason'],
+)
+
+LUPA_LOOKUPS = Counter(
+    'lupa_lookups_total',
+    'Consultas de CPF ao cliente LUPA, por resultado (hit, negative_hit, miss, coalesced).',
+    ['result'],
+)
+LUPA_REQUEST_SECONDS = Histogram(
+    'lupa_request_seconds',
+    'Duração das chamadas à API LUPA, por resultado (found, not_found, error).',
+    ['outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+)
+
+STAGE_SECONDS = Histogram(
+    'turn_stage_seconds',
+    'Duração de cada etapa de um turno (download de mídia, transcrição, Gemini, modelo, ...), por resultado.',
+    ['stage', 'outcome'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30),
+)
+
+HISTORY_BUFFER_ROWS = Gauge('history_buffer_rows', 'Linhas do histórico aguardando gravação no BigQuery.')
+HISTORY_ROWS = Counter(
+    'history_rows_total',
+    'Linhas do histórico processadas pelo gravador em lote, por resultado (written, failed).',
+    ['outcome'],
+)
+HISTORY_ROWS_DROPPED = Counter(
+    'history_rows_dropped_total',
+    'Linhas do histórico perdidas, por motivo (overflow, shutdown, write_error).',
+    ['reason'],
+)
+HISTORY_FLUSH_SECONDS = Histogram(
+    'history_flush_seconds',
+    'Duração de cada gravação em lote no BigQuery, por resultado (success, error).',
+    ['outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+HISTORY_BATCH_ROWS = Histogram(
+    'history_batch_rows',
+    'Quantidade de linhas por gravação em lote no BigQuery.',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+HISTORY_SPOOL_ROWS = Counter(
+    'history_spool_rows_total',
+    'Linhas do histórico no spool local, por evento (spooled, replayed, discarded).',
+    ['event'],
+)
+HISTORY_SPOOL_BYTES = Gauge('history_spool_bytes', 'Tamanho do spool local do histórico, em bytes.')
+HISTORY_SPOOL_OLDEST_SECONDS = Gauge(
+    'history_spool_oldest_seconds', 'Idade do segmento mais antigo do spool local do histórico.'
+)
+HISTORY_REPLAY_ROWS_PER_SECOND = Gauge(
+    'history_replay_rows_per_second', 'Vazão do último reenvio do spool do histórico ao BigQuery.'
+)
+HISTORY_QUERY_BYTES = Counter(
+    'history_query_bytes_total',
+    'Bytes processados pelas consultas de leitura do histórico no BigQuery, por consulta.',
+    ['query'],
+)
+HISTORY_QUERY_CACHE = Counter(
+    'history_query_cache_total',
+    'Leituras do histórico, por resultado no cache de consultas (hit, miss).',
+    ['result'],
+)
+
+
+def metrics_app():
+    """
+    Cria a aplicação ASGI que expõe as métricas no formato Prometheus.
+
+    Quando a variável PROMETHEUS_MULTIPROC_DIR está definida (uvicorn com vários workers),
+    as métricas de todos os processos são agregadas.
+
+    Returns:
+        ASGIApp: Aplicação a ser montada em `/metrics`.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return make_asgi_app(registry=registry)
+    return make_asgi_app()
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class Result:
     """
     Classe para encapsular resultados de operações com informações de sucesso/falha.
@@ -6,9 +9,10 @@ class Result:
         success (bool): Indica se a operação foi bem-sucedida.
         data: Dados retornados pela operação em caso de sucesso.
         error_message (str): Mensagem de erro em caso de falha.
+        error_code (str): Código que identifica o tipo de falha, quando quem chamou precisa distingui-lo.
     """
 
-    def __init__(self, success: bool, data=None, error_message: str = ''):
+    def __init__(self, success: bool, data=None, error_message: str = '', error_code: Optional[str] = None):
         """
         Inicializa um objeto Result.
 
@@ -16,10 +20,12 @@ class Result:
             success (bool): Indica se a operação foi bem-sucedida.
             data: Dados a serem retornados em caso de sucesso.
             error_message (str): Mensagem de erro em caso de falha.
+            error_code (str, opcional): Código do tipo de falha.
         """
         self.success = success
         self.data = data
         self.error_message = error_message
+        self.error_code = error_code
 
     @classmethod
     def ok(cls, data=None):
@@ -35,14 +41,15 @@ class Result:
         return cls(success=True, data=data)
 
     @classmethod
-    def fail(cls, error_message: str):
+    def fail(cls, error_message: str, error_code: Optional[str] = None):
         """
         Cria um objeto Result para uma operação que falhou.
 
         Args:
             error_message (str): Mensagem descrevendo o erro ocorrido.
+            error_code (str, opcional): Código do tipo de falha. Padrão é None.
 
         Returns:
             Result: Objeto Result indicando falha.
         """
-        return cls(success=False, error_message=error_message)
+        return cls(success=False, error_message=error_message, error_code=error_code)
@@ -0,0 +1,253 @@
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from utils.metrics import STAGE_SECONDS
+from utils.result import Result
+
+logger = logging.getLogger(__name__)
+
+# Tempos da requisição em andamento, para as etapas executadas longe do endpoint (recursos de mídia,
+# ferramentas e chamadas ao modelo feitas pelo agente).
+_current_timings: ContextVar[Optional['StageTimings']] = ContextVar('stage_timings', default=None)
+
+# Tracer do OpenTelemetry, definido por `configure_tracing`. Sem ele, os tempos não são exportados.
+_tracer = None
+_tracer_provider = None
+
+
+class StageTimings:
+    """
+    Tempos das etapas de um turno (download de mídia, transcrição, Gemini, geocodificação, consulta
+    LUPA, chamadas ao modelo, ...), criados na entrada do webhook junto com o prazo da requisição.
+
+    Cada etapa registra um intervalo. O mapa por etapa (`as_dict`) é gravado com o turno no
+    histórico, e os intervalos podem ser exportados a um coletor OpenTelemetry (`export`).
+
+    Attributes:
+        started_at (float): Instante (time.time()) de criação, início do turno.
+        spans (list): Intervalos registrados: (etapa, início, fim, resultado), com início e fim em
+            segundos desde `started_at`.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        """
+        Retorna os segundos decorridos desde o início do turno.
+        """
+        return time.perf_counter() - self._origin
+
+    def record(self, stage: str, duration: float, outcome: str = 'ok'):
+        """
+        Registra uma etapa que terminou agora.
+
+        Args:
+            stage (str): Nome da etapa.
+            duration (float): Duração da etapa, em segundos.
+            outcome (str, opcional): Resultado da etapa ('ok' ou 'error'). Padrão é 'ok'.
+        """
+        end = self.elapsed()
+        # Chamado também pelas threads dos callbacks do LangChain.
+        with self._lock:
+            self.spans.append((stage, max(end - duration, 0.0), end, outcome))
+        STAGE_SECONDS.labels(stage, outcome).observe(duration)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Mede o bloco como uma etapa. Uma exceção marca a etapa como 'error' e é propagada.
+
+        Args:
+            stage (str): Nome da etapa.
+        """
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            yield
+            outcome = 'ok'
+        finally:
+            self.record(stage, time.perf_counter() - start, outcome)
+
+    def as_dict(self) -> dict:
+        """
+        Retorna o tempo total de cada etapa, em milissegundos. Etapas repetidas no turno (ex.: várias
+        chamadas ao modelo) são somadas; etapas simultâneas (ex.: upload e transcrição do áudio)
+        aparecem cada uma com a sua duração.
+
+        Returns:
+            dict: Mapa etapa -> milissegundos, na ordem em que as etapas terminaram.
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for stage, start, end, _ in spans:
+            totals[stage] = totals.get(stage, 0.0) + (end - start) * 1000
+        return {stage: round(ms, 1) for stage, ms in totals.items()}
+
+    @contextmanager
+    def activate(self):
+        """
+        Torna estes os tempos da requisição em andamento dentro do bloco (ver `current_timings`).
+        """
+        token = _current_timings.set(self)
+        try:
+            yield self
+        finally:
+            _current_timings.reset(token)
+
+    def export(self, name: str, attributes: Optional[dict] = None):
+        """
+        Exporta o turno como um span do OpenTelemetry, com um span filho por etapa. Não faz nada se
+        o tracing não estiver configurado.
+
+        Os spans são criados com os instantes já medidos, ao final do turno: as etapas não dependem
+        da propagação do contexto do OpenTelemetry entre tarefas e threads.
+
+        Args:
+            name (str): Nome do span do turno.
+            attributes (dict, opcional): Atributos do span do turno (ex.: tipo da mensagem).
+        """
+        if _tracer is None:
+            return
+
+        from opentelemetry import trace
+
+        origin_ns = int(self.started_at * 1e9)
+        try:
+            root = _tracer.start_span(name, start_time=origin_ns, attributes=attributes)
+            parent = trace.set_span_in_context(root)
+            with self._lock:
+                spans = list(self.spans)
+            for stage, start, end, outcome in spans:
+                span = _tracer.start_span(
+                    stage, context=parent, start_time=origin_ns + int(start * 1e9), attributes={'outcome': outcome}
+                )
+                if outcome != 'ok':
+                    span.set_status(trace.StatusCode.ERROR)
+                span.end(end_time=origin_ns + int(end * 1e9))
+            root.end(end_time=origin_ns + int(self.elapsed() * 1e9))
+        except Exception as e:
+            logger.warning(f'Falha ao exportar os tempos do turno: {e}')
+
+
+def current_timings() -> Optional[StageTimings]:
+    """
+    Retorna os tempos da requisição em andamento, ou None fora de uma requisição medida.
+    """
+    return _current_timings.get()
+
+
+@contextmanager
+def untimed():
+    """
+    Desativa os tempos da requisição em andamento dentro do bloco, para tarefas criadas nele que
+    continuam depois do turno (ex.: a atualização do resumo da sessão).
+    """
+    token = _current_timings.set(None)
+    try:
+        yield
+    finally:
+        _current_timings.reset(token)
+
+
+def record_stage(stage: str, duration: float, outcome: str = 'ok'):
+    """
+    Registra uma etapa nos tempos da requisição em andamento, se houver uma.
+
+    Args:
+        stage (str): Nome da etapa.
+        duration (float): Duração da etapa, em segundos.
+        outcome (str, opcional): Resultado da etapa ('ok' ou 'error'). Padrão é 'ok'.
+    """
+    timings = current_timings()
+    if timings is not None:
+        timings.record(stage, duration, outcome)
+
+
+@contextmanager
+def stage(stage: str):
+    """
+    Mede o bloco como uma etapa da requisição em andamento, se houver uma (ver `StageTimings.stage`).
+
+    Args:
+        stage (str): Nome da etapa.
+    """
+    timings = current_timings()
+    if timings is None:
+        yield
+        return
+    with timings.stage(stage):
+        yield
+
+
+def timed_stage(stage: str):
+    """
+    Decorador que mede uma função assíncrona como uma etapa da requisição em andamento.
+
+    A etapa é marcada como 'error' se a função lançar uma exceção ou retornar um Result de falha.
+
+    Args:
+        stage (str): Nome da etapa.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if current_timings() is None:
+                return await func(*args, **kwargs)
+
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = await func(*args, **kwargs)
+                if not isinstance(result, Result) or result.success:
+                    outcome = 'ok'
+                return result
+            finally:
+                record_stage(stage, time.perf_counter() - start, outcome)
+
+        return wrapper
+
+    return decorator
+
+
+def configure_tracing(endpoint: str, service_name: str):
+    """
+    Configura a exportação dos tempos dos turnos para um coletor OpenTelemetry (OTLP sobre HTTP).
+
+    Args:
+        endpoint (str): URL do coletor para spans (ex.: 'http://otel-collector:4318/v1/traces').
+        service_name (str): Nome do serviço nos spans exportados.
+    """
+    global _tracer, _tracer_provider
+
+    # Importado sob demanda: sem coletor configurado, o OpenTelemetry não é carregado.
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    _tracer_provider = provider
+    _tracer = provider.get_tracer(__name__)
+
+
+def shutdown_tracing():
+    """
+    Envia os spans pendentes ao coletor e encerra a exportação.
+    """
+    global _tracer, _tracer_provider
+
+    if _tracer_provider is not None:
+        _tracer_provider.shutdown()
+    _tracer = _tracer_provider = None